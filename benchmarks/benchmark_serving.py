@@ -26,23 +26,42 @@ On the client side, run:
 import argparse
 import asyncio
 import base64
+import csv
 import gc
 import io
+import itertools
 import json
+import multiprocessing
 import os
+import queue
 import random
 import time
 import warnings
-from collections.abc import AsyncGenerator, Collection
+from collections.abc import (AsyncGenerator, Awaitable, Callable, Collection,
+                             Iterator)
 from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 from typing import Any, Optional
 
+import aiohttp
 import numpy as np
 import pandas as pd
-from backend_request_func import (ASYNC_REQUEST_FUNCS, RequestFuncInput,
-                                  RequestFuncOutput)
+from backend_request_func import (ASYNC_REQUEST_FUNCS,
+                                  DEFAULT_DNS_CACHE_TTL,
+                                  DEFAULT_KEEPALIVE_TIMEOUT,
+                                  NANOSECONDS_PER_SECOND, RequestFuncInput,
+                                  RequestFuncOutput, create_client_session,
+                                  warmup_client_session)
 from datasets import load_dataset
+from client_monitor import DEFAULT_LAG_THRESHOLD_MS, ClientMonitor
+from client_profiler import (PROFILE_MODES, ClientProfiler,
+                             default_profile_base_path)
+from live_dashboard import LiveDashboard, LiveStats
+from load_profile import LoadSegment, load_load_profile
+from quantile_sketch import MetricSketches
+from time_series import time_series_from_result, time_series_path
+from token_counter import count_tokens
 from PIL.Image import Image
 from tqdm.asyncio import tqdm
 from transformers import PreTrainedTokenizerBase
@@ -60,6 +79,8 @@ except ImportError:
 from benchmark_utils import convert_to_pytorch_benchmark_format, write_to_json
 
 MILLISECONDS_TO_SECONDS_CONVERSION = 1000
+CLIENT_DELAY_PERCENTILES = [50, 90, 99]
+SONNET_BASE_PROMPT = "Pick as many lines as you can from these poem lines:\n"
 
 
 @dataclass
@@ -69,6 +90,8 @@ class BenchmarkMetrics:
     total_output: int
     request_throughput: float
     request_goodput: float
+    # Percentage of the sent requests that completed within the SLOs.
+    goodput_attainment: float
     output_throughput: float
     total_token_throughput: float
     mean_ttft_ms: float
@@ -164,19 +187,105 @@ def sample_burstgpt_requests(
     return input_requests
 
 
-def sample_sonnet_requests(
+# Column names accepted for each field of a trace row, the first ones
+# being the native format and the others those of the BurstGPT CSV.
+TRACE_COLUMNS = {
+    "timestamp": ("timestamp", "Timestamp"),
+    "input_len": ("input_len", "Request tokens"),
+    "output_len": ("output_len", "Response tokens"),
+    "session_id": ("session_id", "Session ID"),
+}
+
+
+def _iter_trace_rows(dataset_path: str) -> Iterator[dict[str, Any]]:
+    # Stream the rows so that only the replayed part of a large trace is
+    # ever held in memory.
+    with open(dataset_path, encoding="utf-8", newline="") as f:
+        if dataset_path.endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _get_trace_field(row: dict[str, Any], field: str) -> Any:
+    for column in TRACE_COLUMNS[field]:
+        value = row.get(column)
+        if value is not None and value != "":
+            return value
+    return None
+
+
+def sample_trace_requests(
     dataset_path: str,
     num_requests: int,
-    input_len: int,
-    output_len: int,
-    prefix_len: int,
     tokenizer: PreTrainedTokenizerBase,
-) -> list[tuple[str, str, int, int, None]]:
-    assert (
-        input_len > prefix_len
-    ), "'args.sonnet-input-len' must be greater than 'args.prefix-input-len'."
+    time_scale: float = 1.0,
+) -> tuple[list[tuple[str, int, int, None]], np.ndarray]:
+    """
+    Read the first `num_requests` rows of a request trace with arrival
+    timestamps, and return synthetic requests matching the token lengths
+    of each row together with their arrival times.
+
+    The trace is a CSV or JSONL file with the fields `timestamp` (seconds),
+    `input_len`, `output_len` and optionally `session_id`; BurstGPT CSVs
+    are read as is. Arrival times are relative to the first request and
+    multiplied by `time_scale`, e.g. 0.5 replays the trace twice as fast.
+    Requests of the same session share their prompt prefix, so that prefix
+    caching behaves as it would for the traced conversations.
+    """
+    if time_scale <= 0:
+        raise ValueError(
+            f"Trace time scale must be positive, got {time_scale}.")
 
-    # Load the dataset.
+    timestamps = []
+    input_requests = []
+    session_offsets: dict[str, int] = {}
+    for row in _iter_trace_rows(dataset_path):
+        if len(input_requests) == num_requests:
+            break
+        timestamp = _get_trace_field(row, "timestamp")
+        input_len = _get_trace_field(row, "input_len")
+        output_len = _get_trace_field(row, "output_len")
+        if timestamp is None or input_len is None or output_len is None:
+            raise ValueError(
+                f"Trace row {len(input_requests)} of {dataset_path} needs a "
+                f"timestamp, input_len and output_len, got {row}.")
+        input_len, output_len = int(input_len), int(output_len)
+        if output_len <= 0:
+            # Skip failed requests, as for BurstGPT.
+            continue
+
+        session_id = _get_trace_field(row, "session_id")
+        if session_id is None:
+            offset = random.randrange(tokenizer.vocab_size)
+        else:
+            offset = session_offsets.setdefault(
+                str(session_id), random.randrange(tokenizer.vocab_size))
+        prompt = tokenizer.decode([(offset + j) % tokenizer.vocab_size
+                                   for j in range(input_len)])
+        timestamps.append(float(timestamp))
+        input_requests.append((prompt, input_len, output_len, None))
+
+    if not input_requests:
+        raise ValueError(f"Trace {dataset_path} contains no requests.")
+    timestamps = np.array(timestamps)
+    if np.any(np.diff(timestamps) < 0):
+        # Replay out-of-order traces in arrival order.
+        order = np.argsort(timestamps, kind="stable")
+        timestamps = timestamps[order]
+        input_requests = [input_requests[i] for i in order]
+    arrival_times = (timestamps - timestamps[0]) * time_scale
+    return input_requests, arrival_times
+
+
+@lru_cache(maxsize=8)
+def _tokenize_sonnet(
+    dataset_path: str, tokenizer: PreTrainedTokenizerBase
+) -> tuple[tuple[str, ...], float, int]:
+    # The poem lines and the chat template offset only depend on the file
+    # and the tokenizer, so a sweep tokenizes them once for all configs.
     with open(dataset_path, encoding='utf-8') as f:
         poem_lines = f.readlines()
 
@@ -185,15 +294,35 @@ def sample_sonnet_requests(
     average_poem_len = sum(
         len(token_ids) for token_ids in poem_token_ids) / len(poem_token_ids)
 
-    # Base prefix for all requests.
-    base_prompt = "Pick as many lines as you can from these poem lines:\n"
     base_message = [{
         "role": "user",
-        "content": base_prompt,
+        "content": SONNET_BASE_PROMPT,
     }]
     base_prompt_formatted = tokenizer.apply_chat_template(
         base_message, add_generation_prompt=True, tokenize=False)
     base_prompt_offset = len(tokenizer(base_prompt_formatted).input_ids)
+    return tuple(poem_lines), average_poem_len, base_prompt_offset
+
+
+def sample_sonnet_requests(
+    dataset_path: str,
+    num_requests: int,
+    input_len: int,
+    output_len: int,
+    prefix_len: int,
+    tokenizer: PreTrainedTokenizerBase,
+) -> list[tuple[str, str, int, int, None]]:
+    assert (
+        input_len > prefix_len
+    ), "'args.sonnet-input-len' must be greater than 'args.prefix-input-len'."
+
+    # Load and tokenize the dataset.
+    poem_lines, average_poem_len, base_prompt_offset = _tokenize_sonnet(
+        dataset_path, tokenizer)
+    poem_lines = list(poem_lines)
+
+    # Base prefix for all requests.
+    base_prompt = SONNET_BASE_PROMPT
 
     assert (
         input_len > base_prompt_offset
@@ -399,18 +528,20 @@ def sample_random_requests(
     return input_requests
 
 
-async def get_request(
-    input_requests: list[tuple[str, int, int]],
+def compute_arrival_times(
+    num_requests: int,
     request_rate: float,
     burstiness: float = 1.0,
-) -> AsyncGenerator[tuple[str, int, int], None]:
+    duration: Optional[float] = None,
+) -> Optional[np.ndarray]:
     """
-    Asynchronously generates requests at a specified rate
-    with OPTIONAL burstiness.
+    Precompute the arrival time of every request, in seconds relative to
+    the start of the benchmark, with a single draw of request intervals.
 
     Args:
-        input_requests:
-            A list of input requests, each represented as a tuple.
+        num_requests:
+            The number of requests to schedule. Ignored if `duration` is
+            given.
         request_rate:
             The rate at which requests are generated (requests/s).
         burstiness (optional):
@@ -421,96 +552,457 @@ async def get_request(
             A lower burstiness value (0 < burstiness < 1) results
             in more bursty requests, while a higher burstiness value
             (burstiness > 1) results in a more uniform arrival of requests.
+        duration (optional):
+            Schedule every arrival within the first `duration` seconds
+            instead of a fixed number of requests. With an infinite request
+            rate there is no schedule and None is returned: requests are
+            then sent back to back, as fast as the concurrency limit allows.
     """
-    input_requests = iter(input_requests)
+    if request_rate == float("inf"):
+        if duration is not None:
+            return None
+        # If the request rate is infinity, all requests are due at once.
+        return np.zeros(num_requests)
 
     # Calculate scale parameter theta to maintain the desired request_rate.
     assert burstiness > 0, (
         f"A positive burstiness factor is expected, but given {burstiness}.")
     theta = 1.0 / (request_rate * burstiness)
 
-    for request in input_requests:
-        yield request
+    # Sample the request intervals from the gamma distribution.
+    # If burstiness is 1, it follows exponential distribution.
+    # The first request is sent at time 0, each following one after the
+    # interval sampled for its predecessor.
+    if duration is None:
+        intervals = np.random.gamma(shape=burstiness,
+                                    scale=theta,
+                                    size=max(num_requests - 1, 0))
+        return np.concatenate(([0.0], np.cumsum(intervals)))[:num_requests]
+
+    # Draw a few more intervals than expected to fill the duration, and
+    # top up in the unlikely case they fall short. The first arrival is
+    # also one interval after the start, so that a duration holds
+    # `request_rate * duration` arrivals on average rather than one more.
+    chunk_size = int(request_rate * duration * 1.1) + 16
+    arrival_times = [np.zeros(0)]
+    last_arrival = 0.0
+    while last_arrival < duration:
+        chunk = last_arrival + np.cumsum(
+            np.random.gamma(shape=burstiness, scale=theta, size=chunk_size))
+        arrival_times.append(chunk)
+        last_arrival = chunk[-1]
+    arrival_times = np.concatenate(arrival_times)
+    return arrival_times[arrival_times < duration]
+
+
+def compute_segment_arrival_times(
+        segment: LoadSegment) -> Optional[np.ndarray]:
+    """
+    Precompute the arrival times within a load profile segment, relative to
+    the start of the segment. None for closed-loop segments.
+    """
+    if segment.final_request_rate is None:
+        return compute_arrival_times(0, segment.request_rate,
+                                     segment.burstiness, segment.duration)
+
+    # Linear ramp: draw the arrivals of a unit-rate process and map them
+    # back through the inverse of the cumulative rate, which keeps the
+    # burstiness of the intervals while the rate changes.
+    rate_start, rate_end = segment.request_rate, segment.final_request_rate
+    times = np.linspace(0.0, segment.duration, 1025)
+    cumulative_rate = (rate_start * times + (rate_end - rate_start) *
+                       times**2 / (2 * segment.duration))
+    unit_times = compute_arrival_times(0, 1.0, segment.burstiness,
+                                       cumulative_rate[-1])
+    return np.interp(unit_times, cumulative_rate, times)
 
-        if request_rate == float("inf"):
-            # If the request rate is infinity, then we don't need to wait.
-            continue
 
-        # Sample the request interval from the gamma distribution.
-        # If burstiness is 1, it follows exponential distribution.
-        interval = np.random.gamma(shape=burstiness, scale=theta)
-        # The next request will be sent after the interval.
-        await asyncio.sleep(interval)
+async def get_request(
+    input_requests: list[tuple[str, int, int]],
+    arrival_times: np.ndarray,
+    start_time: float,
+) -> AsyncGenerator[tuple[tuple[str, int, int], float], None]:
+    """
+    Asynchronously releases requests at their precomputed arrival times.
 
+    Every request is released against its absolute deadline
+    `start_time + arrival_time` on the `time.perf_counter()` clock, so
+    event loop latency delays individual requests but does not accumulate
+    as drift over the run.
 
-def calculate_metrics(
+    Args:
+        input_requests:
+            A list of input requests, each represented as a tuple. If there
+            are more arrival times than requests, the requests are reused
+            in order.
+        arrival_times:
+            The arrival time of each request in seconds relative to
+            `start_time`, see `compute_arrival_times`.
+        start_time:
+            The `time.perf_counter()` timestamp of the benchmark start.
+
+    Yields:
+        The request and its absolute scheduled `time.perf_counter()` time.
+    """
+    num_requests = len(input_requests)
+    for index, arrival_time in enumerate(arrival_times.tolist()):
+        scheduled_time = start_time + arrival_time
+        delay = scheduled_time - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield input_requests[index % num_requests], scheduled_time
+
+
+async def enumerate_arrivals(
     input_requests: list[tuple[str, int, int]],
+    arrival_times: np.ndarray,
+    start_time: float,
+) -> AsyncGenerator[tuple[int, tuple[str, int, int], float, float], None]:
+    """
+    Yields the index, request, scheduled time and the actual release time
+    of each request from `get_request`.
+    """
+    index = 0
+    async for request, scheduled_time in get_request(input_requests,
+                                                     arrival_times,
+                                                     start_time):
+        yield index, request, scheduled_time, time.perf_counter()
+        index += 1
+
+
+async def dispatch_requests(
+    request_func,
+    input_requests: list[tuple[str, int, int]],
+    request_kwargs: dict[str, Any],
+    arrival_times: Optional[np.ndarray],
+    start_time: float,
+    max_concurrency: Optional[int],
+    request_lora_modules: Optional[list[str]],
+    session,
+    live_stats: Optional[LiveStats],
+    end_time: Optional[float] = None,
+    sketches: Optional[MetricSketches] = None,
+    monitor: Optional[ClientMonitor] = None,
+) -> list[RequestFuncOutput]:
+    """
+    Send `input_requests` at their arrival times subject to the concurrency
+    limit, and return the outputs in arrival order.
+
+    Args:
+        request_kwargs:
+            `RequestFuncInput` fields shared by all requests, e.g. the
+            model, api_url and sampling options.
+        arrival_times:
+            The arrival time of each request, see `compute_arrival_times`.
+            If None, `max_concurrency` clients send requests back to back
+            until `end_time`.
+        request_lora_modules (optional):
+            The LoRA module used as model for each input request.
+        live_stats (optional):
+            Counts the sent and completed requests for the progress bar
+            and the live dashboard, which read it periodically.
+        end_time (optional):
+            The `time.perf_counter()` time after which no new requests are
+            sent. Arrivals still waiting for a concurrency slot by then are
+            dropped; requests in flight run to completion.
+        sketches (optional):
+            Latency sketches to which each request is added as it
+            completes.
+        monitor (optional):
+            The client monitor, whose startup phase ends when the first
+            request completes successfully.
+    """
+    num_requests = len(input_requests)
+    outputs: dict[int, RequestFuncOutput] = {}
+
+    async def send_request(index, request, scheduled_time, dispatch_time):
+        prompt, prompt_len, output_len, mm_content = request
+        request_func_input = RequestFuncInput(prompt=prompt,
+                                              prompt_len=prompt_len,
+                                              output_len=output_len,
+                                              multi_modal_content=mm_content,
+                                              **request_kwargs)
+        if request_lora_modules:
+            req_lora_module = request_lora_modules[index % num_requests]
+            request_func_input.model = req_lora_module
+            request_func_input.model_name = req_lora_module
+
+        if live_stats is not None:
+            live_stats.sent += 1
+        output = await request_func(request_func_input=request_func_input,
+                                    session=session)
+        output.scheduled_time = scheduled_time
+        output.dispatch_time = dispatch_time
+        if live_stats is not None:
+            live_stats.on_complete(output)
+        if monitor is not None and output.success:
+            monitor.end_startup()
+        if sketches is not None:
+            sketches.record(output, start_time)
+        outputs[index] = output
+
+    def ordered_outputs() -> list[RequestFuncOutput]:
+        return [outputs[index] for index in sorted(outputs)]
+
+    if arrival_times is None:
+        # Closed loop: each client sends its next request as soon as the
+        # previous one finished, so there is no schedule to be late for.
+        next_index = 0
+
+        async def send_back_to_back():
+            nonlocal next_index
+            while time.perf_counter() < end_time:
+                index = next_index
+                next_index += 1
+                now = time.perf_counter()
+                await send_request(index, input_requests[index % num_requests],
+                                   now, now)
+
+        await asyncio.gather(
+            *(send_back_to_back() for _ in range(max_concurrency)))
+        return ordered_outputs()
+
+    arrivals = enumerate_arrivals(input_requests, arrival_times, start_time)
+
+    if not max_concurrency:
+        # Unbounded concurrency: every request is sent as soon as it is due.
+        tasks: list[asyncio.Task] = []
+        async for index, request, scheduled_time, dispatch_time in arrivals:
+            tasks.append(
+                asyncio.create_task(
+                    send_request(index, request, scheduled_time,
+                                 dispatch_time)))
+        await asyncio.gather(*tasks)
+        return ordered_outputs()
+
+    # A pool of max_concurrency consumers takes due requests off the arrival
+    # queue, so a request only becomes a task once a concurrency slot is
+    # free. Memory and scheduling overhead scale with the in-flight requests
+    # rather than the number of prompts. The queue is unbounded so that the
+    # arrival schedule never waits for a free slot.
+    arrival_queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        async for arrival in arrivals:
+            arrival_queue.put_nowait(arrival)
+        for _ in range(max_concurrency):
+            arrival_queue.put_nowait(None)
+
+    async def consume():
+        while (arrival := await arrival_queue.get()) is not None:
+            if end_time is not None and time.perf_counter() >= end_time:
+                # The run is over, drain the backlog without sending it.
+                continue
+            await send_request(*arrival)
+
+    await asyncio.gather(produce(),
+                         *(consume() for _ in range(max_concurrency)))
+    return ordered_outputs()
+
+
+async def dispatch_load_profile(
+    request_func,
+    input_requests: list[tuple[str, int, int]],
+    request_kwargs: dict[str, Any],
+    load_profile: list[LoadSegment],
+    segment_arrival_times: list[Optional[np.ndarray]],
+    start_time: float,
+    request_lora_modules: Optional[list[str]],
+    session,
+    live_stats: Optional[LiveStats],
+    monitor: Optional[ClientMonitor] = None,
+) -> list[RequestFuncOutput]:
+    """
+    Run the segments of a load profile back to back from `start_time`.
+
+    Each segment starts on its own deadline and stops sending at its end.
+    Requests still in flight complete while the next segment starts, as
+    they would when the load on a real server changes.
+    """
+    tasks: list[asyncio.Task] = []
+    segment_start = start_time
+    for segment, arrival_times in zip(load_profile, segment_arrival_times):
+        delay = segment_start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(
+            asyncio.create_task(
+                dispatch_requests(
+                    request_func=request_func,
+                    input_requests=input_requests,
+                    request_kwargs=request_kwargs,
+                    arrival_times=arrival_times,
+                    start_time=segment_start,
+                    max_concurrency=segment.max_concurrency,
+                    request_lora_modules=request_lora_modules,
+                    session=session,
+                    live_stats=live_stats,
+                    end_time=segment_start + segment.duration,
+                    monitor=monitor,
+                )))
+        segment_start += segment.duration
+    segment_outputs = await asyncio.gather(*tasks)
+    return list(itertools.chain.from_iterable(segment_outputs))
+
+
+def select_measurement_window(
+    outputs: list[RequestFuncOutput],
+    window_start: float,
+    window_end: float,
+) -> list[RequestFuncOutput]:
+    """
+    Select the requests that were sent within the steady-state window
+    `[window_start, window_end)` of `time.perf_counter()` times, excluding
+    the warmup and cooldown phases of the run.
+    """
+    return [
+        output for output in outputs
+        if window_start <= output.start_time < window_end
+    ]
+
+
+@dataclass
+class RequestColumns:
+    """
+    The per-request fields that the metrics need, as NumPy columns over
+    the requests in order. The ITLs of all requests are flattened into one
+    array; those of request i are `itl_s[itl_offsets[i]:itl_offsets[i+1]]`.
+    """
+    success: np.ndarray
+    prompt_len: np.ndarray
+    ttft: np.ndarray
+    latency: np.ndarray
+    # The usage reported by the server, NaN where it was not reported.
+    output_tokens: np.ndarray
+    itl_s: np.ndarray
+    itl_offsets: np.ndarray
+
+    @classmethod
+    def from_outputs(cls,
+                     outputs: list[RequestFuncOutput]) -> "RequestColumns":
+        count = len(outputs)
+        itl_lens = np.fromiter((len(o.itl_ns) for o in outputs),
+                               dtype=np.int64,
+                               count=count)
+        # One copy of all the ITL buffers, without a view per request.
+        itl_ns = np.frombuffer(b"".join(o.itl_ns for o in outputs),
+                               dtype=np.uint64)
+        return cls(
+            success=np.fromiter((o.success for o in outputs),
+                                dtype=bool,
+                                count=count),
+            prompt_len=np.fromiter((o.prompt_len for o in outputs),
+                                   dtype=np.int64,
+                                   count=count),
+            ttft=np.fromiter((o.ttft for o in outputs),
+                             dtype=np.float64,
+                             count=count),
+            latency=np.fromiter((o.latency for o in outputs),
+                                dtype=np.float64,
+                                count=count),
+            output_tokens=np.fromiter(
+                (np.nan if o.output_tokens is None else o.output_tokens
+                 for o in outputs),
+                dtype=np.float64,
+                count=count),
+            itl_s=itl_ns / NANOSECONDS_PER_SECOND,
+            itl_offsets=np.concatenate([[0], np.cumsum(itl_lens)]),
+        )
+
+    def itls_of(self, mask: np.ndarray) -> np.ndarray:
+        """The flattened ITLs of the requests selected by `mask`."""
+        return self.itl_s[np.repeat(mask, np.diff(self.itl_offsets))]
+
+
+def count_output_lens(outputs: list[RequestFuncOutput],
+                      columns: RequestColumns,
+                      tokenizer: PreTrainedTokenizerBase,
+                      token_count_processes: int = 1) -> np.ndarray:
+    """
+    The number of output tokens of each request, 0 for failed requests:
+    the usage reported by the server, or else the number of tokens of its
+    generated text.
+    """
+    success = columns.success
+    output_lens = np.where(success, columns.output_tokens, 0)
+    uncounted = np.flatnonzero(success & np.isnan(output_lens))
+    if len(uncounted):
+        # We use the tokenizer to count the number of output tokens for
+        # some serving backends instead of looking at the number of ITLs,
+        # since multiple output tokens may be bundled together.
+        # Note : this may inflate the output token count slightly
+        output_lens[uncounted] = count_tokens(
+            tokenizer, [outputs[i].generated_text for i in uncounted],
+            num_processes=token_count_processes)
+    return output_lens.astype(np.int64)
+
+
+def calculate_metrics(
     outputs: list[RequestFuncOutput],
     dur_s: float,
     tokenizer: PreTrainedTokenizerBase,
     selected_percentile_metrics: list[str],
     selected_percentiles: list[float],
     goodput_config_dict: dict[str, float],
+    sketches: Optional[MetricSketches] = None,
+    token_count_processes: int = 1,
 ) -> tuple[BenchmarkMetrics, list[int]]:
-    actual_output_lens: list[int] = []
-    total_input = 0
-    completed = 0
-    good_completed = 0
-    itls: list[float] = []
-    tpots: list[float] = []
-    all_tpots: list[float] = []
-    ttfts: list[float] = []
-    e2els: list[float] = []
-    
-    for i in range(len(outputs)):
-        if outputs[i].success:
-            output_len = outputs[i].output_tokens
-            if output_len is None:
-                # We use the tokenizer to count the number of output tokens
-                # for some serving backends instead of looking at
-                # len(outputs[i].itl) since multiple output tokens may be
-                # bundled together
-                # Note : this may inflate the output token count slightly
-                output_len = len(
-                    tokenizer(outputs[i].generated_text,
-                              add_special_tokens=False).input_ids)
-            actual_output_lens.append(output_len)
-            total_input += input_requests[i][1]
-            tpot = 0
-            if output_len > 1:
-                latency_minus_ttft = outputs[i].latency - outputs[i].ttft
-                tpot = latency_minus_ttft / (output_len - 1)
-                tpots.append(tpot)
-            # Note: if output_len <= 1, we regard tpot as 0 for goodput
-            all_tpots.append(tpot)
-            itls += outputs[i].itl
-            ttfts.append(outputs[i].ttft)
-            e2els.append(outputs[i].latency)
-            completed += 1
-        else:
-            actual_output_lens.append(0)
+    """
+    Calculate the metrics over `outputs`, converted once to NumPy columns.
 
+    With `sketches`, the TTFT, ITL and E2EL statistics are taken from the
+    sketches filled during the run rather than from `outputs`, whose ITL
+    arrays were released.
+    """
+    columns = RequestColumns.from_outputs(outputs)
+    success = columns.success
+    output_lens = count_output_lens(outputs, columns, tokenizer,
+                                    token_count_processes)
+
+    completed = int(success.sum())
+    total_input = int(columns.prompt_len[success].sum())
+    total_output = int(output_lens.sum())
+    ttfts = columns.ttft[success]
+    e2els = columns.latency[success]
+    completed_lens = output_lens[success]
+    # Note: if output_len <= 1, we regard tpot as 0 for goodput
+    all_tpots = np.where(completed_lens > 1,
+                         (e2els - ttfts) / np.maximum(completed_lens - 1, 1),
+                         0.0)
+    tpots = all_tpots[completed_lens > 1]
+
+    if sketches is not None:
+        # TPOT needs the output lengths, which may only be known now.
+        sketches.histograms["tpot"] = sketches.new_histogram()
+        sketches.histograms["tpot"].add_many(tpots)
+        stats = {
+            name: (histogram.mean, histogram.std,
+                   *histogram.percentiles([50, *selected_percentiles]))
+            for name, histogram in sketches.histograms.items()
+        }
+    else:
+        # ttfts and itls are empty if streaming is not supported by backend
+        stats = {}
+        for name, values in (("ttft", ttfts), ("tpot", tpots),
+                             ("itl", columns.itls_of(success)), ("e2el",
+                                                                 e2els)):
+            values = values if values.size else np.zeros(1)
+            stats[name] = (values.mean(), values.std(),
+                           *np.percentile(values, [50, *selected_percentiles]))
+    stats_ms = {
+        name: [float(value) * 1000 for value in values]
+        for name, values in stats.items()
+    }
+
+    good_completed = 0
     if goodput_config_dict:
-        valid_metrics = []
-        slo_values = []
-
-        if "ttft" in goodput_config_dict:
-            valid_metrics.append(ttfts)
-            slo_values.append(goodput_config_dict["ttft"] /
-                              MILLISECONDS_TO_SECONDS_CONVERSION)
-        if "tpot" in goodput_config_dict:
-            valid_metrics.append(all_tpots)
-            slo_values.append(goodput_config_dict["tpot"] /
-                              MILLISECONDS_TO_SECONDS_CONVERSION)
-        if "e2el" in goodput_config_dict:
-            valid_metrics.append(e2els)
-            slo_values.append(goodput_config_dict["e2el"] /
-                              MILLISECONDS_TO_SECONDS_CONVERSION)
-
-        for req_metric in zip(*valid_metrics):
-            is_good_req = all([s >= r for s, r in zip(slo_values, req_metric)])
-            if is_good_req:
-                good_completed += 1
+        is_good = np.ones(completed, dtype=bool)
+        for name, values in (("ttft", ttfts), ("tpot", all_tpots),
+                             ("e2el", e2els)):
+            if name in goodput_config_dict:
+                is_good &= values <= (goodput_config_dict[name] /
+                                      MILLISECONDS_TO_SECONDS_CONVERSION)
+        good_completed = int(is_good.sum())
 
     if completed == 0:
         warnings.warn(
@@ -520,35 +1012,453 @@ def calculate_metrics(
     metrics = BenchmarkMetrics(
         completed=completed,
         total_input=total_input,
-        total_output=sum(actual_output_lens),
+        total_output=total_output,
         request_throughput=completed / dur_s,
         request_goodput=good_completed / dur_s,
-        output_throughput=sum(actual_output_lens) / dur_s,
-        total_token_throughput=(total_input + sum(actual_output_lens)) / dur_s,
-        mean_ttft_ms=np.mean(ttfts or 0) *
-        1000,  # ttfts is empty if streaming is not supported by backend
-        std_ttft_ms=np.std(ttfts or 0) * 1000,
-        median_ttft_ms=np.median(ttfts or 0) * 1000,
-        percentiles_ttft_ms=[(p, np.percentile(ttfts or 0, p) * 1000)
-                             for p in selected_percentiles],
-        mean_tpot_ms=np.mean(tpots or 0) * 1000,
-        std_tpot_ms=np.std(tpots or 0) * 1000,
-        median_tpot_ms=np.median(tpots or 0) * 1000,
-        percentiles_tpot_ms=[(p, np.percentile(tpots or 0, p) * 1000)
-                             for p in selected_percentiles],
-        mean_itl_ms=np.mean(itls or 0) * 1000,
-        std_itl_ms=np.std(itls or 0) * 1000,
-        median_itl_ms=np.median(itls or 0) * 1000,
-        percentiles_itl_ms=[(p, np.percentile(itls or 0, p) * 1000)
-                            for p in selected_percentiles],
-        mean_e2el_ms=np.mean(e2els or 0) * 1000,
-        std_e2el_ms=np.std(e2els or 0) * 1000,
-        median_e2el_ms=np.median(e2els or 0) * 1000,
-        percentiles_e2el_ms=[(p, np.percentile(e2els or 0, p) * 1000)
-                             for p in selected_percentiles],
+        goodput_attainment=(100 * good_completed /
+                            len(outputs) if outputs else 0.0),
+        output_throughput=total_output / dur_s,
+        total_token_throughput=(total_input + total_output) / dur_s,
+        mean_ttft_ms=stats_ms["ttft"][0],
+        std_ttft_ms=stats_ms["ttft"][1],
+        median_ttft_ms=stats_ms["ttft"][2],
+        percentiles_ttft_ms=list(zip(selected_percentiles,
+                                     stats_ms["ttft"][3:])),
+        mean_tpot_ms=stats_ms["tpot"][0],
+        std_tpot_ms=stats_ms["tpot"][1],
+        median_tpot_ms=stats_ms["tpot"][2],
+        percentiles_tpot_ms=list(zip(selected_percentiles,
+                                     stats_ms["tpot"][3:])),
+        mean_itl_ms=stats_ms["itl"][0],
+        std_itl_ms=stats_ms["itl"][1],
+        median_itl_ms=stats_ms["itl"][2],
+        percentiles_itl_ms=list(zip(selected_percentiles,
+                                    stats_ms["itl"][3:])),
+        mean_e2el_ms=stats_ms["e2el"][0],
+        std_e2el_ms=stats_ms["e2el"][1],
+        median_e2el_ms=stats_ms["e2el"][2],
+        percentiles_e2el_ms=list(zip(selected_percentiles,
+                                     stats_ms["e2el"][3:])),
     )
 
-    return metrics, actual_output_lens
+    return metrics, output_lens.tolist()
+
+
+def request_timeline(sent_outputs: list[RequestFuncOutput],
+                     outputs: list[RequestFuncOutput], output_lens: list[int],
+                     start_time: float, window_start: float,
+                     window_end: float, tokenizer: PreTrainedTokenizerBase,
+                     token_count_processes: int = 1) -> dict[str, Any]:
+    """
+    The timestamps of all the requests sent, in seconds from `start_time`,
+    for time_series.py. `outputs` are those sent in the measurement window
+    `[window_start, window_end)`, whose `output_lens` were counted by
+    `calculate_metrics`; the others are counted here.
+    """
+    measured_ids = {id(output) for output in outputs}
+    measured = np.fromiter((id(output) in measured_ids
+                            for output in sent_outputs),
+                           dtype=bool,
+                           count=len(sent_outputs))
+    sent_output_lens = np.zeros(len(sent_outputs), dtype=np.int64)
+    sent_output_lens[measured] = output_lens
+    unmeasured = [
+        output for output, is_measured in zip(sent_outputs, measured)
+        if not is_measured
+    ]
+    if unmeasured:
+        sent_output_lens[~measured] = count_output_lens(
+            unmeasured, RequestColumns.from_outputs(unmeasured), tokenizer,
+            token_count_processes)
+    return {
+        "window_start_s": window_start - start_time,
+        "window_end_s": window_end - start_time,
+        "measured": measured.tolist(),
+        "successes": [output.success for output in sent_outputs],
+        "output_lens": sent_output_lens.tolist(),
+        "start_times":
+        [output.start_time - start_time for output in sent_outputs],
+        "first_token_times": [
+            output.start_time + output.ttft -
+            start_time if output.success else None
+            for output in sent_outputs
+        ],
+        "end_times": [
+            output.start_time + output.latency - start_time
+            for output in sent_outputs
+        ],
+    }
+
+
+def calculate_segment_metrics(
+    outputs: list[RequestFuncOutput],
+    load_profile: list[LoadSegment],
+    start_time: float,
+    tokenizer: PreTrainedTokenizerBase,
+    selected_percentile_metrics: list[str],
+    selected_percentiles: list[float],
+    goodput_config_dict: dict[str, float],
+    token_count_processes: int = 1,
+) -> list[dict[str, Any]]:
+    """
+    Calculate the metrics of each load profile segment over the requests
+    sent within it, after the segment warmup.
+    """
+    segment_results = []
+    segment_start = start_time
+    for segment in load_profile:
+        window_start = segment_start + segment.warmup_seconds
+        window_end = segment_start + segment.duration
+        segment_start = window_end
+        metrics, _ = calculate_metrics(
+            outputs=select_measurement_window(outputs, window_start,
+                                              window_end),
+            dur_s=window_end - window_start,
+            tokenizer=tokenizer,
+            selected_percentile_metrics=selected_percentile_metrics,
+            selected_percentiles=selected_percentiles,
+            goodput_config_dict=goodput_config_dict,
+            token_count_processes=token_count_processes,
+        )
+        result = {
+            "start": window_start - start_time,
+            "duration": window_end - window_start,
+            "request_rate": (segment.request_rate
+                             if not segment.is_closed_loop else "inf"),
+            "final_request_rate": segment.final_request_rate,
+            "max_concurrency": segment.max_concurrency,
+            "burstiness": segment.burstiness,
+            "completed": metrics.completed,
+            "request_throughput": metrics.request_throughput,
+            "request_goodput":
+            metrics.request_goodput if goodput_config_dict else None,
+            "output_throughput": metrics.output_throughput,
+            "total_token_throughput": metrics.total_token_throughput,
+        }
+        for metric_attribute_name in selected_percentile_metrics:
+            for stat in ("mean", "median"):
+                key = f"{stat}_{metric_attribute_name}_ms"
+                result[key] = getattr(metrics, key)
+            for p, value in getattr(metrics,
+                                    f"percentiles_{metric_attribute_name}_ms"):
+                p_word = str(int(p)) if int(p) == p else str(p)
+                result[f"p{p_word}_{metric_attribute_name}_ms"] = value
+        segment_results.append(result)
+    return segment_results
+
+
+def print_segment_metrics(segment_results: list[dict[str, Any]]) -> None:
+    print("{s:{c}^{n}}".format(s=' Load Profile Segments ', n=50, c='-'))
+    print("{:<4} {:>8} {:>6} {:>6} {:>8} {:>8} {:>8}".format(
+        "Seg", "Rate", "Conc", "Done", "Req/s", "Tok/s", "TTFT ms"))
+    for i, result in enumerate(segment_results):
+        rate = result["request_rate"]
+        if result["final_request_rate"] is not None:
+            rate = f"{rate:g}-{result['final_request_rate']:g}"
+        print("{:<4} {:>8} {:>6} {:>6} {:>8.2f} {:>8.1f} {:>8.1f}".format(
+            i, rate if isinstance(rate, str) else f"{rate:g}",
+            str(result["max_concurrency"] or "-"), result["completed"],
+            result["request_throughput"], result["output_throughput"],
+            result.get("mean_ttft_ms", float("nan"))))
+
+
+class _SharedProgress:
+    """Progress counter shared between worker processes, exposing the
+    `update` method of a tqdm bar to `LiveStats.report`."""
+
+    def __init__(self, counter):
+        self.counter = counter
+
+    def update(self, n: int = 1) -> None:
+        with self.counter.get_lock():
+            self.counter.value += n
+
+
+def split_max_concurrency(max_concurrency: Optional[int],
+                          num_workers: int) -> list[Optional[int]]:
+    # Spread the remainder over the first workers so the per-worker limits
+    # add up to `max_concurrency`.
+    if not max_concurrency:
+        return [None] * num_workers
+    base, remainder = divmod(max_concurrency, num_workers)
+    return [base + (i < remainder) for i in range(num_workers)]
+
+
+async def _benchmark_worker_main(shard: dict[str, Any], ready_queue, go_event,
+                                 start_time, progress) -> tuple:
+    session = None
+    if shard["connection_mode"] == "pooled":
+        connection_limit = shard["connection_limit"]
+        session = create_client_session(
+            connection_limit=connection_limit,
+            keepalive_timeout=shard["keepalive_timeout"],
+            dns_cache_ttl=shard["dns_cache_ttl"])
+        num_connections = min(connection_limit or len(shard["input_requests"]),
+                              len(shard["input_requests"]))
+        await warmup_client_session(session, shard["base_url"] + "/health",
+                                    num_connections)
+
+    # Wait until every worker is ready, then start on the common deadline.
+    loop = asyncio.get_running_loop()
+    ready_queue.put(os.getpid())
+    await loop.run_in_executor(None, go_event.wait)
+
+    monitor = None
+    if shard["monitor_interval"]:
+        monitor = ClientMonitor(shard["monitor_interval"])
+        monitor.start(start_time.value)
+    live_stats = reporter = None
+    if shard["report_progress"] or shard["live_queue"] is not None:
+        live_stats = LiveStats()
+        reporter = asyncio.create_task(
+            live_stats.report(shard["live_queue"], progress,
+                              shard["live_interval"]))
+    try:
+        outputs = await dispatch_requests(
+            request_func=ASYNC_REQUEST_FUNCS[shard["backend"]],
+            input_requests=shard["input_requests"],
+            request_kwargs=shard["request_kwargs"],
+            arrival_times=shard["arrival_times"],
+            start_time=start_time.value,
+            max_concurrency=shard["max_concurrency"],
+            request_lora_modules=shard["request_lora_modules"],
+            session=session,
+            live_stats=live_stats,
+            end_time=(start_time.value + shard["duration"]
+                      if shard["duration"] is not None else None),
+            sketches=shard["sketches"],
+            monitor=monitor,
+        )
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+            try:
+                await reporter
+            except asyncio.CancelledError:
+                pass
+        if monitor is not None:
+            await monitor.stop()
+        if session is not None:
+            await session.close()
+    return outputs, time.perf_counter(), monitor, shard["sketches"]
+
+
+def _benchmark_worker(worker_id: int, shard: dict[str, Any], ready_queue,
+                      go_event, start_time, progress, result_queue) -> None:
+    try:
+        outputs, end_time, monitor, sketches = asyncio.run(
+            _benchmark_worker_main(shard, ready_queue, go_event, start_time,
+                                   _SharedProgress(progress)))
+        result_queue.put(
+            (worker_id, outputs, end_time, monitor, sketches, None))
+    except Exception as e:
+        # Unblock the coordinator if we failed before reporting ready.
+        ready_queue.put(os.getpid())
+        result_queue.put((worker_id, None, None, None, None, repr(e)))
+
+
+def _check_workers_alive(workers: list, reported: set[int],
+                         stage: str) -> None:
+    """
+    Raise if a worker that has not `reported` yet died, e.g. it failed to
+    import or start, or was killed by the OOM killer, instead of waiting
+    for it forever. The worker's traceback, if any, is on stderr.
+    """
+    dead = [(worker_id, worker.exitcode)
+            for worker_id, worker in enumerate(workers)
+            if worker_id not in reported and worker.exitcode not in (None, 0)]
+    if not dead:
+        return
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+    raise RuntimeError("Load generator worker died " + stage + ": " +
+                       "; ".join(f"worker {worker_id} exit code {exitcode}"
+                                 for worker_id, exitcode in dead))
+
+
+async def dispatch_sharded_requests(
+    backend: str,
+    base_url: str,
+    input_requests: list[tuple[str, int, int]],
+    request_kwargs: dict[str, Any],
+    arrival_times: Optional[np.ndarray],
+    max_concurrency: Optional[int],
+    request_lora_modules: Optional[list[str]],
+    num_workers: int,
+    connection_mode: str,
+    connection_limit: Optional[int],
+    keepalive_timeout: float,
+    dns_cache_ttl: Optional[int],
+    pbar,
+    duration: Optional[float] = None,
+    monitor_interval: Optional[float] = None,
+    sketches: Optional[MetricSketches] = None,
+    live_queue=None,
+    live_interval: float = 0.5,
+) -> tuple[list[RequestFuncOutput], float, float, Optional[ClientMonitor],
+           Optional[MetricSketches]]:
+    """
+    Split the requests, the arrival rate and `max_concurrency` across
+    `num_workers` processes, each with its own event loop and session.
+
+    All workers start on the same `time.perf_counter()` deadline. On Linux
+    this is the system-wide CLOCK_MONOTONIC, so the per-request timings of
+    all workers share a common time base with the coordinator.
+
+    Returns the merged outputs in arrival order, the common start time,
+    the time the last worker finished and, with a `monitor_interval` or
+    `sketches`, the merged client monitors or latency sketches of the
+    workers. Each worker fills its own copy of `sketches`.
+
+    The workers report their progress every `live_interval` seconds if
+    there is a `pbar`, and their `LiveStats` on `live_queue` if a live
+    dashboard reads it.
+    """
+    # Worker i takes every num_workers-th request of the common arrival
+    # timeline, so the merged load follows exactly the same schedule as a
+    # single-process run.
+    shard_concurrency = split_max_concurrency(max_concurrency, num_workers)
+    shard_connection_limit = split_max_concurrency(connection_limit or None,
+                                                   num_workers)
+    # Spawn rather than fork: the coordinator may hold tokenizer threads.
+    ctx = multiprocessing.get_context("spawn")
+    ready_queue = ctx.Queue()
+    result_queue = ctx.Queue()
+    go_event = ctx.Event()
+    start_time = ctx.Value("d", 0.0)
+    progress = ctx.Value("i", 0)
+
+    workers = []
+    for worker_id in range(num_workers):
+        shard = dict(
+            backend=backend,
+            base_url=base_url,
+            input_requests=input_requests[worker_id::num_workers],
+            request_kwargs=request_kwargs,
+            arrival_times=(arrival_times[worker_id::num_workers]
+                           if arrival_times is not None else None),
+            max_concurrency=shard_concurrency[worker_id],
+            request_lora_modules=(
+                request_lora_modules[worker_id::num_workers]
+                if request_lora_modules else None),
+            connection_mode=connection_mode,
+            connection_limit=shard_connection_limit[worker_id] or 0,
+            keepalive_timeout=keepalive_timeout,
+            dns_cache_ttl=dns_cache_ttl,
+            duration=duration,
+            monitor_interval=monitor_interval,
+            sketches=sketches,
+            live_queue=live_queue,
+            live_interval=live_interval,
+            report_progress=pbar is not None,
+        )
+        worker = ctx.Process(target=_benchmark_worker,
+                             args=(worker_id, shard, ready_queue, go_event,
+                                   start_time, progress, result_queue),
+                             daemon=True)
+        worker.start()
+        workers.append(worker)
+
+    loop = asyncio.get_running_loop()
+    ready: set[int] = set()
+    while len(ready) < num_workers:
+        try:
+            ready.add(await loop.run_in_executor(None, ready_queue.get, True,
+                                                 0.5))
+        except queue.Empty:
+            _check_workers_alive(workers, set(), "before it was ready")
+    # Leave the workers a moment to wake up before the first deadline.
+    start_time.value = time.perf_counter() + 0.1
+    go_event.set()
+
+    shard_outputs: list[Optional[list[RequestFuncOutput]]] = [None
+                                                              ] * num_workers
+    end_time = 0.0
+    monitors = []
+    worker_sketches = []
+    errors = []
+    reported: set[int] = set()
+    pending = num_workers
+    while pending:
+        try:
+            (worker_id, outputs, worker_end_time, monitor, sketches,
+             error) = await loop.run_in_executor(None, result_queue.get, True,
+                                                 0.5)
+        except queue.Empty:
+            # No worker finished yet, refresh the progress bar.
+            if pbar is not None:
+                pbar.update(progress.value - pbar.n)
+            _check_workers_alive(workers, reported,
+                                 "before it reported its results")
+            continue
+        pending -= 1
+        reported.add(worker_id)
+        shard_outputs[worker_id] = outputs
+        if error is not None:
+            errors.append(f"worker {worker_id}: {error}")
+        else:
+            end_time = max(end_time, worker_end_time)
+            if monitor is not None:
+                monitors.append(monitor)
+            if sketches is not None:
+                worker_sketches.append(sketches)
+    if pbar is not None:
+        pbar.update(progress.value - pbar.n)
+
+    # A worker only exits once its live stats are read off the queue, so
+    # keep the event loop, and with it the live dashboard, running.
+    while any(worker.is_alive() for worker in workers):
+        await asyncio.sleep(0.05)
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise RuntimeError("Load generator worker failed: " +
+                           "; ".join(errors))
+    monitor = ClientMonitor.merge(monitors) if monitors else None
+    sketches = (MetricSketches.merge_all(worker_sketches)
+                if worker_sketches else None)
+
+    if duration is not None:
+        # The number of requests each worker sent depends on the run, so
+        # merge the shards by send time.
+        outputs = sorted(itertools.chain.from_iterable(shard_outputs),
+                         key=lambda output: output.start_time)
+        return outputs, start_time.value, end_time, monitor, sketches
+
+    outputs: list[RequestFuncOutput] = [None] * len(input_requests)
+    for worker_id, worker_outputs in enumerate(shard_outputs):
+        outputs[worker_id::num_workers] = worker_outputs
+    return outputs, start_time.value, end_time, monitor, sketches
+
+
+def summarize_client_delays(
+        outputs: list[RequestFuncOutput]) -> dict[str, float]:
+    """
+    Summarize the client-side delays of every request:
+
+    * dispatch lateness: how late the client released requests compared to
+      their scheduled arrival times. Growing lateness means the client, not
+      the server, is limiting the offered load.
+    * concurrency wait: how long released requests waited for a free
+      --max-concurrency slot before being sent.
+    """
+    delays = {
+        "dispatch_lateness":
+        [output.dispatch_time - output.scheduled_time for output in outputs],
+        "concurrency_wait":
+        [output.start_time - output.dispatch_time for output in outputs],
+    }
+    result = {}
+    for name, values in delays.items():
+        values_ms = np.array(values or [0.0]) * 1000
+        result[f"mean_{name}_ms"] = float(np.mean(values_ms))
+        for p, value in zip(CLIENT_DELAY_PERCENTILES,
+                            np.percentile(values_ms,
+                                          CLIENT_DELAY_PERCENTILES)):
+            result[f"p{p}_{name}_ms"] = float(value)
+        result[f"max_{name}_ms"] = float(np.max(values_ms))
+    return result
 
 
 async def benchmark(
@@ -571,12 +1481,107 @@ async def benchmark(
     goodput_config_dict: dict[str, float],
     max_concurrency: Optional[int],
     lora_modules: Optional[list[str]],
+    connection_mode: str = "pooled",
+    connection_limit: Optional[int] = None,
+    keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+    dns_cache_ttl: Optional[int] = DEFAULT_DNS_CACHE_TTL,
+    num_workers: int = 1,
+    duration: Optional[float] = None,
+    warmup_seconds: float = 0.0,
+    cooldown_seconds: float = 0.0,
+    load_profile: Optional[list[LoadSegment]] = None,
+    arrival_times: Optional[np.ndarray] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    monitor_interval: Optional[float] = 0.005,
+    client_lag_threshold_ms: float = DEFAULT_LAG_THRESHOLD_MS,
+    client_profiler: Optional[ClientProfiler] = None,
+    metrics_mode: str = "exact",
+    sketch_relative_accuracy: float = 0.01,
+    live_interval: Optional[float] = None,
+    live_window: float = 30.0,
+    live_http_port: Optional[int] = None,
+    token_count_processes: int = 1,
 ):
+    # The arguments, to rerun with a session of our own, see below.
+    arguments = dict(locals())
     if backend in ASYNC_REQUEST_FUNCS:
         request_func = ASYNC_REQUEST_FUNCS[backend]
     else:
         raise ValueError(f"Unknown backend: {backend}")
 
+    if num_workers > 1 and max_concurrency and max_concurrency < num_workers:
+        raise ValueError(
+            f"Maximum concurrency ({max_concurrency}) must be at least the "
+            f"number of workers ({num_workers}).")
+
+    if arrival_times is not None and (load_profile is not None
+                                      or duration is not None):
+        raise ValueError("A replayed trace cannot be combined with a load "
+                         "profile or a run duration.")
+
+    if load_profile is not None:
+        if num_workers > 1:
+            raise ValueError(
+                "Load profiles are only supported with a single worker.")
+        duration = sum(segment.duration for segment in load_profile)
+        # Size the connection pool for the most concurrent segment.
+        concurrency_limits = [
+            segment.max_concurrency for segment in load_profile
+        ]
+        max_concurrency = (None if None in concurrency_limits else
+                           max(concurrency_limits))
+
+    if duration is not None:
+        if warmup_seconds + cooldown_seconds >= duration:
+            raise ValueError(
+                f"Warmup ({warmup_seconds}s) and cooldown "
+                f"({cooldown_seconds}s) leave no measurement window in a "
+                f"{duration}s run.")
+        if (load_profile is None and request_rate == float("inf")
+                and not max_concurrency):
+            raise ValueError(
+                "A duration-based run with an infinite request rate needs "
+                "--max-concurrency to bound the number of clients.")
+
+    sketches = None
+    if metrics_mode == "sketch":
+        if load_profile is not None:
+            raise ValueError("The per-segment metrics of a load profile "
+                             "need --metrics-mode exact.")
+        if cooldown_seconds and duration is None:
+            raise ValueError("--metrics-mode sketch needs --duration with "
+                             "--cooldown-seconds, to know the end of the "
+                             "measurement window during the run.")
+        sketches = MetricSketches(
+            sketch_relative_accuracy,
+            window_start=warmup_seconds,
+            window_end=(duration -
+                        cooldown_seconds if duration is not None else None))
+
+    if connection_mode == "pooled":
+        # The connection pool must never be the concurrency bottleneck.
+        if connection_limit is None:
+            connection_limit = max_concurrency or 0
+        elif max_concurrency and 0 < connection_limit < max_concurrency:
+            raise ValueError(
+                f"Connection limit ({connection_limit}) must not be lower "
+                f"than the maximum concurrency ({max_concurrency}).")
+        # A session passed in by the caller stays open after the run, so
+        # that its connections can be reused by the next one. Otherwise the
+        # run gets its own, closed however the run ends.
+        if session is None:
+            async with create_client_session(
+                    connection_limit=connection_limit,
+                    keepalive_timeout=keepalive_timeout,
+                    dns_cache_ttl=dns_cache_ttl) as session:
+                return await benchmark(**{**arguments, "session": session})
+    elif connection_mode == "per-request":
+        # Every request opens its own session, so connection setup is
+        # deliberately included in the measured latencies.
+        session = None
+    else:
+        raise ValueError(f"Unknown connection mode: {connection_mode}")
+
     print("Starting initial single prompt test run...")
     test_prompt, test_prompt_len, test_output_len, test_mm_content = (
         input_requests[0])
@@ -597,7 +1602,8 @@ async def benchmark(
         ignore_eos=ignore_eos,
     )
 
-    test_output = await request_func(request_func_input=test_input)
+    test_output = await request_func(request_func_input=test_input,
+                                     session=session)
     if not test_output.success:
         raise ValueError(
             "Initial test run failed - Please make sure benchmark arguments "
@@ -605,10 +1611,12 @@ async def benchmark(
     else:
         print("Initial test run completed. Starting main benchmark run...")
 
+    request_lora_modules = None
     if lora_modules:
         # For each input request, choose a LoRA module at random.
-        lora_modules = iter(
-            [random.choice(lora_modules) for _ in range(len(input_requests))])
+        request_lora_modules = [
+            random.choice(lora_modules) for _ in range(len(input_requests))
+        ]
 
     if profile:
         print("Starting profiler...")
@@ -622,7 +1630,8 @@ async def benchmark(
                                          best_of=best_of,
                                          multi_modal_content=test_mm_content,
                                          ignore_eos=ignore_eos)
-        profile_output = await request_func(request_func_input=profile_input)
+        profile_output = await request_func(request_func_input=profile_input,
+                                            session=session)
         if profile_output.success:
             print("Profiler started")
 
@@ -631,86 +1640,249 @@ async def benchmark(
     else:
         distribution = "Gamma distribution"
 
-    print(f"Traffic request rate: {request_rate}")
-    print(f"Burstiness factor: {burstiness} ({distribution})")
+    if load_profile is not None:
+        print(f"Load profile: {len(load_profile)} segments")
+    elif arrival_times is not None:
+        print(f"Trace replay: {len(arrival_times)} requests over "
+              f"{arrival_times[-1]:.2f}s")
+    else:
+        print(f"Traffic request rate: {request_rate}")
+        print(f"Burstiness factor: {burstiness} ({distribution})")
     print(f"Maximum request concurrency: {max_concurrency}")
-
-    pbar = None if disable_tqdm else tqdm(total=len(input_requests))
-
-    # This can be used once the minimum Python version is 3.10 or higher,
-    # and it will simplify the code in limited_request_func.
-    #    semaphore = (asyncio.Semaphore(max_concurrency)
-    #                 if max_concurrency else contextlib.nullcontext())
-    semaphore = (asyncio.Semaphore(max_concurrency)
-                 if max_concurrency else None)
-
-    async def limited_request_func(request_func_input, pbar):
-        if semaphore is None:
-            return await request_func(request_func_input=request_func_input,
-                                      pbar=pbar)
-        async with semaphore:
-            return await request_func(request_func_input=request_func_input,
-                                      pbar=pbar)
-
-    benchmark_start_time = time.perf_counter()
-    tasks: list[asyncio.Task] = []
-    async for request in get_request(input_requests, request_rate, burstiness):
-        prompt, prompt_len, output_len, mm_content = request
-        req_model_id, req_model_name = model_id, model_name
-        if lora_modules:
-            req_lora_module = next(lora_modules)
-            req_model_id, req_model_name = req_lora_module, req_lora_module
-
-        request_func_input = RequestFuncInput(model=req_model_id,
-                                              model_name=req_model_name,
-                                              prompt=prompt,
-                                              api_url=api_url,
-                                              prompt_len=prompt_len,
-                                              output_len=output_len,
-                                              logprobs=logprobs,
-                                              best_of=best_of,
-                                              multi_modal_content=mm_content,
-                                              ignore_eos=ignore_eos)
-        tasks.append(
-            asyncio.create_task(
-                limited_request_func(request_func_input=request_func_input,
-                                     pbar=pbar)))
-    outputs: list[RequestFuncOutput] = await asyncio.gather(*tasks)
-
-    if profile:
-        print("Stopping profiler...")
-        profile_input = RequestFuncInput(
-            model=model_id,
-            prompt=test_prompt,
-            api_url=base_url + "/stop_profile",
-            prompt_len=test_prompt_len,
-            output_len=test_output_len,
-            logprobs=logprobs,
-            best_of=best_of,
+    print(f"Connection mode: {connection_mode}")
+    if num_workers > 1:
+        print(f"Load generator worker processes: {num_workers}")
+
+    if load_profile is not None:
+        arrival_times = None
+        segment_arrival_times = [
+            compute_segment_arrival_times(segment) for segment in load_profile
+        ]
+        num_arrivals = (None if any(
+            times is None for times in segment_arrival_times) else sum(
+                len(times) for times in segment_arrival_times))
+    elif arrival_times is not None:
+        # Replay the arrival times of a trace.
+        num_arrivals = len(arrival_times)
+    else:
+        arrival_times = compute_arrival_times(len(input_requests),
+                                              request_rate, burstiness,
+                                              duration)
+        num_arrivals = (len(arrival_times)
+                        if arrival_times is not None else None)
+    if duration is not None:
+        print(f"Run duration: {duration}s (warmup {warmup_seconds}s, "
+              f"cooldown {cooldown_seconds}s)")
+
+    if session is not None and num_workers == 1:
+        # Open the pooled connections before the clock starts so that TCP
+        # setup is not part of the measured TTFT.
+        max_connections = num_arrivals or max_concurrency or len(
+            input_requests)
+        num_connections = min(connection_limit or max_connections,
+                              max_connections)
+        num_warm = await warmup_client_session(session,
+                                               base_url + "/health",
+                                               num_connections)
+        print(f"Pre-warmed connections: {num_warm}/{num_connections}")
+
+    pbar = None if disable_tqdm else tqdm(total=num_arrivals)
+    live = bool(live_interval) or live_http_port is not None
+    # The progress bar is refreshed periodically by the dashboard rather
+    # than on every completed request. Sharded runs refresh it from the
+    # shared progress counter instead. Without a progress bar or a live
+    # view, the completed requests are not counted at all.
+    live_stats = None
+    if num_workers == 1 and (live or pbar is not None):
+        live_stats = LiveStats(sketch_relative_accuracy)
+    live_queue = None
+    if num_workers > 1 and live:
+        live_queue = multiprocessing.get_context("spawn").Queue()
+    dashboard = None
+    if live_stats is not None or live_queue is not None:
+        dashboard = LiveDashboard(
+            live_stats,
+            interval=live_interval or 0.5,
+            window=live_window,
+            pbar=pbar if num_workers == 1 else None,
+            print_lines=bool(live_interval),
+            http_port=live_http_port,
+            live_queue=live_queue,
+            total=num_arrivals)
+
+    request_kwargs = dict(model=model_id,
+                          model_name=model_name,
+                          api_url=api_url,
+                          logprobs=logprobs,
+                          best_of=best_of,
+                          ignore_eos=ignore_eos)
+    # The client is profiled from the first request sent to the end of the
+    # metrics calculation, after the test request and the pre-warm.
+    if client_profiler is not None:
+        client_profiler.start()
+    try:
+        monitor = None
+        if monitor_interval and num_workers == 1:
+            # Sharded runs monitor the event loop of each worker instead.
+            monitor = ClientMonitor(monitor_interval)
+            monitor.start()
+        try:
+            if dashboard is not None:
+                await dashboard.start()
+            if num_workers > 1:
+                (outputs, benchmark_start_time, benchmark_end_time, monitor,
+                 sketches) = await dispatch_sharded_requests(
+                    backend=backend,
+                    base_url=base_url,
+                    input_requests=input_requests,
+                    request_kwargs=request_kwargs,
+                    arrival_times=arrival_times,
+                    max_concurrency=max_concurrency,
+                    request_lora_modules=request_lora_modules,
+                    num_workers=num_workers,
+                    connection_mode=connection_mode,
+                    connection_limit=connection_limit,
+                    keepalive_timeout=keepalive_timeout,
+                    dns_cache_ttl=dns_cache_ttl,
+                    pbar=pbar,
+                    duration=duration,
+                    monitor_interval=monitor_interval,
+                    sketches=sketches,
+                    live_queue=live_queue,
+                    live_interval=live_interval or 0.5,
+                )
+            elif load_profile is not None:
+                benchmark_start_time = time.perf_counter()
+                benchmark_end_time = None
+                outputs = await dispatch_load_profile(
+                    request_func=request_func,
+                    input_requests=input_requests,
+                    request_kwargs=request_kwargs,
+                    load_profile=load_profile,
+                    segment_arrival_times=segment_arrival_times,
+                    start_time=benchmark_start_time,
+                    request_lora_modules=request_lora_modules,
+                    session=session,
+                    live_stats=live_stats,
+                    monitor=monitor,
+                )
+            else:
+                benchmark_start_time = time.perf_counter()
+                benchmark_end_time = None
+                outputs = await dispatch_requests(
+                    request_func=request_func,
+                    input_requests=input_requests,
+                    request_kwargs=request_kwargs,
+                    arrival_times=arrival_times,
+                    start_time=benchmark_start_time,
+                    max_concurrency=max_concurrency,
+                    request_lora_modules=request_lora_modules,
+                    session=session,
+                    live_stats=live_stats,
+                    end_time=(benchmark_start_time + duration
+                              if duration is not None else None),
+                    sketches=sketches,
+                    monitor=monitor,
+                )
+        finally:
+            if dashboard is not None:
+                await dashboard.stop()
+            if monitor is not None and num_workers == 1:
+                await monitor.stop()
+
+        if profile:
+            print("Stopping profiler...")
+            profile_input = RequestFuncInput(
+                model=model_id,
+                prompt=test_prompt,
+                api_url=base_url + "/stop_profile",
+                prompt_len=test_prompt_len,
+                output_len=test_output_len,
+                logprobs=logprobs,
+                best_of=best_of,
+            )
+            profile_output = await request_func(
+                request_func_input=profile_input, session=session)
+            if profile_output.success:
+                print("Profiler stopped")
+
+        if pbar is not None:
+            pbar.close()
+
+        # Worker processes report when their last request finished, so that
+        # process teardown is not counted.
+        benchmark_end_time = benchmark_end_time or time.perf_counter()
+        benchmark_duration = benchmark_end_time - benchmark_start_time
+
+        num_sent = len(outputs)
+        # The client monitor leaves out the burst of sending the first
+        # requests.
+        first_token_time = min(
+            (output.start_time + output.ttft
+             for output in outputs if output.success),
+            default=None)
+        segment_results = None
+        if load_profile is not None:
+            segment_results = calculate_segment_metrics(
+                outputs=outputs,
+                load_profile=load_profile,
+                start_time=benchmark_start_time,
+                tokenizer=tokenizer,
+                selected_percentile_metrics=selected_percentile_metrics,
+                selected_percentiles=selected_percentiles,
+                goodput_config_dict=goodput_config_dict,
+                token_count_processes=token_count_processes,
+            )
+        num_dropped = (num_arrivals - num_sent
+                       if num_arrivals is not None else 0)
+        sent_outputs = outputs
+        window_start, window_end = benchmark_start_time, benchmark_end_time
+        measured_duration = benchmark_duration
+        if duration is not None or warmup_seconds or cooldown_seconds:
+            # Only requests sent in the steady state count, and throughput is
+            # relative to the length of that window.
+            window_start = benchmark_start_time + warmup_seconds
+            window_end = (benchmark_start_time + duration
+                          if duration is not None else
+                          benchmark_end_time) - cooldown_seconds
+            if window_end <= window_start:
+                raise ValueError(
+                    f"Warmup ({warmup_seconds}s) and cooldown "
+                    f"({cooldown_seconds}s) leave no measurement window in a "
+                    f"{benchmark_duration:.2f}s run.")
+            outputs = select_measurement_window(outputs, window_start,
+                                                window_end)
+            measured_duration = window_end - window_start
+
+        metrics, actual_output_lens = calculate_metrics(
+            outputs=outputs,
+            dur_s=measured_duration,
+            tokenizer=tokenizer,
+            selected_percentile_metrics=selected_percentile_metrics,
+            selected_percentiles=selected_percentiles,
+            goodput_config_dict=goodput_config_dict,
+            sketches=sketches,
+            token_count_processes=token_count_processes,
         )
-        profile_output = await request_func(request_func_input=profile_input)
-        if profile_output.success:
-            print("Profiler stopped")
-
-    if pbar is not None:
-        pbar.close()
-
-    benchmark_duration = time.perf_counter() - benchmark_start_time
-
-    metrics, actual_output_lens = calculate_metrics(
-        input_requests=input_requests,
-        outputs=outputs,
-        dur_s=benchmark_duration,
-        tokenizer=tokenizer,
-        selected_percentile_metrics=selected_percentile_metrics,
-        selected_percentiles=selected_percentiles,
-        goodput_config_dict=goodput_config_dict,
-    )
+        timeline = request_timeline(sent_outputs, outputs,
+                                    actual_output_lens, benchmark_start_time,
+                                    window_start, window_end, tokenizer,
+                                    token_count_processes)
+    finally:
+        if client_profiler is not None:
+            client_profiler.stop()
 
     print("{s:{c}^{n}}".format(s=' Serving Benchmark Result ', n=50, c='='))
     print("{:<40} {:<10}".format("Successful requests:", metrics.completed))
     print("{:<40} {:<10.2f}".format("Benchmark duration (s):",
                                     benchmark_duration))
+    if measured_duration != benchmark_duration:
+        print("{:<40} {:<10.2f}".format("Measured window (s):",
+                                        measured_duration))
+        print("{:<40} {:<10}".format("Measured requests:", len(outputs)))
+        print("{:<40} {:<10}".format("Sent requests:", num_sent))
+    if num_dropped:
+        print("{:<40} {:<10}".format("Dropped requests:", num_dropped))
     print("{:<40} {:<10}".format("Total input tokens:", metrics.total_input))
     print("{:<40} {:<10}".format("Total generated tokens:",
                                  metrics.total_output))
@@ -719,6 +1891,8 @@ async def benchmark(
     if goodput_config_dict:
         print("{:<40} {:<10.2f}".format("Request goodput (req/s):",
                                         metrics.request_goodput))
+        print("{:<40} {:<10.2f}".format("Goodput attainment (%):",
+                                        metrics.goodput_attainment))
     print("{:<40} {:<10.2f}".format("Output token throughput (tok/s):",
                                     metrics.output_throughput))
     print("{:<40} {:<10.2f}".format("Total Token throughput (tok/s):",
@@ -726,12 +1900,17 @@ async def benchmark(
 
     result = {
         "duration": benchmark_duration,
+        "measured_duration": measured_duration,
+        "sent_requests": num_sent,
+        "dropped_requests": num_dropped,
         "completed": metrics.completed,
         "total_input_tokens": metrics.total_input,
         "total_output_tokens": metrics.total_output,
         "request_throughput": metrics.request_throughput,
         "request_goodput:":
         metrics.request_goodput if goodput_config_dict else None,
+        "goodput_attainment":
+        metrics.goodput_attainment if goodput_config_dict else None,
         "output_throughput": metrics.output_throughput,
         "total_token_throughput": metrics.total_token_throughput,
         "input_lens": [output.prompt_len for output in outputs],
@@ -740,7 +1919,18 @@ async def benchmark(
         "itls": [output.itl for output in outputs],
         "generated_texts": [output.generated_text for output in outputs],
         "errors": [output.error for output in outputs],
+        "benchmark_start_unix":
+        time.time() - (time.perf_counter() - benchmark_start_time),
+        # Every request sent, including those outside the measurement
+        # window, for time_series.py.
+        "timeline": timeline,
+        "metrics_mode": metrics_mode,
     }
+    if sketches is not None:
+        # The ITLs and most texts were released as the requests completed.
+        del result["itls"], result["generated_texts"]
+        result["sketch_relative_accuracy"] = sketch_relative_accuracy
+        result["sketches"] = sketches.snapshot()
 
     def process_one_metric(
         # E.g., "ttft"
@@ -780,11 +1970,145 @@ async def benchmark(
     process_one_metric("itl", "ITL", "Inter-token Latency")
     process_one_metric("e2el", "E2EL", "End-to-end Latency")
 
+    client_delays = summarize_client_delays(outputs)
+    result.update(client_delays)
+    for name, header in [("dispatch_lateness", "Dispatch Lateness"),
+                         ("concurrency_wait", "Concurrency Wait")]:
+        label = header.lower()
+        print("{s:{c}^{n}}".format(s=header, n=50, c='-'))
+        print("{:<40} {:<10.2f}".format(f"Mean {label} (ms):",
+                                        client_delays[f"mean_{name}_ms"]))
+        for p in CLIENT_DELAY_PERCENTILES:
+            print("{:<40} {:<10.2f}".format(f"P{p} {label} (ms):",
+                                            client_delays[f"p{p}_{name}_ms"]))
+        print("{:<40} {:<10.2f}".format(f"Max {label} (ms):",
+                                        client_delays[f"max_{name}_ms"]))
+
+    if monitor is not None:
+        client_monitor = monitor.summary(client_lag_threshold_ms,
+                                         first_token_time)
+        result["client_bound"] = client_monitor["client_bound"]
+        result["client_monitor"] = client_monitor
+        print("{s:{c}^{n}}".format(s='Client Monitor', n=50, c='-'))
+        print("{:<40} {:<10.2f}".format("P50 event loop lag (ms):",
+                                        client_monitor["p50_loop_lag_ms"]))
+        print("{:<40} {:<10.2f}".format("P99 event loop lag (ms):",
+                                        client_monitor["p99_loop_lag_ms"]))
+        print("{:<40} {:<10.2f}".format("Max event loop lag (ms):",
+                                        client_monitor["max_loop_lag_ms"]))
+        print("{:<40} {:<10.2f}".format(
+            "Mean client CPU utilization (%):",
+            client_monitor["mean_cpu_utilization"] * 100))
+        if client_monitor["client_bound"]:
+            print("WARNING: this run is client-bound, its latencies include "
+                  "client overhead: " +
+                  "; ".join(client_monitor["client_bound_reasons"]))
+
+    if client_profiler is not None:
+        client_profile = client_profiler.summary()
+        result["client_profile"] = client_profile
+        client_profiler.print_summary(client_profile)
+
+    if segment_results is not None:
+        print_segment_metrics(segment_results)
+        result["segments"] = segment_results
+
     print("=" * 50)
 
     return result
 
 
+async def search_max_request_rate(
+    run_benchmark: Callable[[float], Awaitable[dict[str, Any]]],
+    target_pct: float,
+    initial_rate: float = 1.0,
+    tolerance: float = 0.05,
+    max_probes: int = 16,
+) -> tuple[Optional[float], list[dict[str, Any]]]:
+    """
+    Search the highest request rate at which at least `target_pct` percent
+    of the requests meet the goodput SLOs.
+
+    The rate is doubled (or halved, if `initial_rate` already misses the
+    target) until the target is crossed, then the crossing is bisected
+    until the passing and failing rates are within `tolerance` of each
+    other, relative to the passing rate.
+
+    Args:
+        run_benchmark:
+            Runs the benchmark at the given request rate and returns its
+            result, which must contain the "goodput_attainment".
+
+    Returns:
+        The highest passing rate, or None if no probed rate passed, and
+        the rate, attainment and result of every probe in probing order.
+    """
+    probes: list[dict[str, Any]] = []
+
+    async def probe(rate: float) -> bool:
+        print(f"SLO search probe {len(probes) + 1}: {rate:.4g} req/s")
+        result = await run_benchmark(rate)
+        attainment = result["goodput_attainment"]
+        passed = attainment >= target_pct
+        probes.append({
+            "request_rate": rate,
+            "goodput_attainment": attainment,
+            "passed": passed,
+            "result": result,
+        })
+        return passed
+
+    passing_rate, failing_rate = None, None
+    rate = initial_rate
+    # Exponential phase: bracket the knee between a passing and a failing
+    # rate.
+    if await probe(rate):
+        passing_rate = rate
+        while failing_rate is None and len(probes) < max_probes:
+            rate *= 2
+            if await probe(rate):
+                passing_rate = rate
+            else:
+                failing_rate = rate
+    else:
+        failing_rate = rate
+        while passing_rate is None and len(probes) < max_probes:
+            rate /= 2
+            if await probe(rate):
+                passing_rate = rate
+            else:
+                failing_rate = rate
+
+    # Bisection phase.
+    while (passing_rate is not None and failing_rate is not None
+           and failing_rate - passing_rate > tolerance * passing_rate
+           and len(probes) < max_probes):
+        rate = (passing_rate + failing_rate) / 2
+        if await probe(rate):
+            passing_rate = rate
+        else:
+            failing_rate = rate
+    return passing_rate, probes
+
+
+def print_slo_search(max_rate: Optional[float], probes: list[dict[str, Any]],
+                     target_pct: float) -> None:
+    print("{s:{c}^{n}}".format(s=' SLO Search Result ', n=50, c='='))
+    print("{:<6} {:>12} {:>14} {:>10}".format("Probe", "Rate (req/s)",
+                                              "Attainment (%)", "Passed"))
+    for i, probe in enumerate(probes):
+        print("{:<6} {:>12.4g} {:>14.2f} {:>10}".format(
+            i + 1, probe["request_rate"], probe["goodput_attainment"],
+            str(probe["passed"])))
+    print("{:<40} {:<10.2f}".format("Target attainment (%):", target_pct))
+    if max_rate is None:
+        print("No probed request rate met the target.")
+    else:
+        print("{:<40} {:<10.4g}".format("Max request rate (req/s):",
+                                        max_rate))
+    print("=" * 50)
+
+
 def check_goodput_args(args):
     # Check and parse goodput arguments
     goodput_config_dict = {}
@@ -830,7 +2154,10 @@ def save_to_pytorch_benchmark_format(args: argparse.Namespace,
     ]
     # These raw data might be useful, but they are rather big. They can be added
     # later if needed
-    ignored_metrics = ["ttfts", "itls", "generated_texts", "errors"]
+    ignored_metrics = [
+        "ttfts", "itls", "generated_texts", "errors", "client_monitor",
+        "client_profile", "sketches", "timeline"
+    ]
     pt_records = convert_to_pytorch_benchmark_format(
         args=args,
         metrics={k: [results[k]]
@@ -845,28 +2172,29 @@ def save_to_pytorch_benchmark_format(args: argparse.Namespace,
         write_to_json(pt_file, pt_records)
 
 
-def main(args: argparse.Namespace):
-    print(args)
-    random.seed(args.seed)
-    np.random.seed(args.seed)
-
-    backend = args.backend
-    model_id = args.model
-    model_name = args.served_model_name
-    tokenizer_id = args.tokenizer if args.tokenizer is not None else args.model
-    tokenizer_mode = args.tokenizer_mode
-
+def get_api_urls(args: argparse.Namespace) -> tuple[str, str]:
     if args.base_url is not None:
         api_url = f"{args.base_url}{args.endpoint}"
         base_url = f"{args.base_url}"
     else:
         api_url = f"http://{args.host}:{args.port}{args.endpoint}"
         base_url = f"http://{args.host}:{args.port}"
+    return api_url, base_url
 
-    tokenizer = get_tokenizer(tokenizer_id,
-                              tokenizer_mode=tokenizer_mode,
-                              trust_remote_code=args.trust_remote_code)
 
+def get_tokenizer_id(args: argparse.Namespace) -> str:
+    return args.tokenizer if args.tokenizer is not None else args.model
+
+
+def sample_input_requests(
+    args: argparse.Namespace, tokenizer: PreTrainedTokenizerBase
+) -> tuple[list[tuple[str, int, int, Any]], Optional[np.ndarray]]:
+    """
+    Sample the requests of the dataset selected by `args`. Also returns the
+    arrival times of the requests if the dataset is a trace, else None.
+    """
+    # Only traces bring their own arrival times.
+    arrival_times = None
     if args.dataset_name is None:
         raise ValueError(
             "Please specify '--dataset-name' and the corresponding "
@@ -918,6 +2246,14 @@ def main(args: argparse.Namespace):
                               for prompt, prompt_formatted, prompt_len,
                               output_len, _ in input_requests]
 
+    elif args.dataset_name == "trace":
+        input_requests, arrival_times = sample_trace_requests(
+            dataset_path=args.dataset_path,
+            num_requests=args.num_prompts,
+            tokenizer=tokenizer,
+            time_scale=args.trace_time_scale,
+        )
+
     elif args.dataset_name == "hf":
         input_requests = sample_hf_requests(
             dataset_path=args.dataset_path,
@@ -942,86 +2278,260 @@ def main(args: argparse.Namespace):
     else:
         raise ValueError(f"Unknown dataset: {args.dataset_name}")
 
+    return input_requests, arrival_times
+
+
+async def run_benchmark(
+    args: argparse.Namespace,
+    tokenizer: PreTrainedTokenizerBase,
+    input_requests: list[tuple[str, int, int, Any]],
+    arrival_times: Optional[np.ndarray] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    client_profiler: Optional[ClientProfiler] = None,
+) -> dict[str, Any]:
+    """
+    Run the benchmark configured by `args` on already sampled requests, or
+    the SLO search if `--slo-search` is set.
+
+    `session` is an optional pooled client session owned by the caller,
+    which lets a sweep keep its connections open across runs.
+    `client_profiler`, from `make_client_profiler`, profiles the client
+    during the measured window.
+    """
+    api_url, base_url = get_api_urls(args)
     goodput_config_dict = check_goodput_args(args)
 
+    load_profile = None
+    if args.load_profile is not None:
+        if args.duration is not None:
+            raise ValueError(
+                "--duration is taken from the load profile, do not pass both.")
+        load_profile = load_load_profile(args.load_profile, args.burstiness)
+
+    benchmark_kwargs = dict(
+        backend=args.backend,
+        api_url=api_url,
+        base_url=base_url,
+        model_id=args.model,
+        model_name=args.served_model_name,
+        tokenizer=tokenizer,
+        input_requests=input_requests,
+        logprobs=args.logprobs,
+        best_of=args.best_of,
+        request_rate=args.request_rate,
+        burstiness=args.burstiness,
+        disable_tqdm=args.disable_tqdm,
+        profile=args.profile,
+        selected_percentile_metrics=args.percentile_metrics.split(","),
+        selected_percentiles=[
+            float(p) for p in args.metric_percentiles.split(",")
+        ],
+        ignore_eos=args.ignore_eos,
+        goodput_config_dict=goodput_config_dict,
+        max_concurrency=args.max_concurrency,
+        lora_modules=args.lora_modules,
+        connection_mode=args.connection_mode,
+        connection_limit=args.connection_limit,
+        keepalive_timeout=args.keepalive_timeout,
+        dns_cache_ttl=args.dns_cache_ttl,
+        num_workers=args.num_workers,
+        duration=args.duration,
+        warmup_seconds=args.warmup_seconds,
+        cooldown_seconds=args.cooldown_seconds,
+        load_profile=load_profile,
+        arrival_times=arrival_times,
+        session=session,
+        monitor_interval=(args.client_monitor_interval_ms / 1000
+                          if args.client_monitor_interval_ms > 0 else None),
+        client_lag_threshold_ms=args.client_lag_threshold_ms,
+        client_profiler=client_profiler,
+        metrics_mode=args.metrics_mode,
+        sketch_relative_accuracy=args.sketch_relative_accuracy,
+        live_interval=args.live_interval,
+        live_window=args.live_window,
+        live_http_port=args.live_http_port,
+        token_count_processes=args.token_count_processes,
+    )
+
+    if not args.slo_search:
+        benchmark_result = await benchmark(**benchmark_kwargs)
+    else:
+        if not goodput_config_dict:
+            raise ValueError("--slo-search needs the SLOs given by --goodput.")
+        if load_profile is not None or arrival_times is not None:
+            raise ValueError("--slo-search searches a constant request rate "
+                             "and cannot be used with a load profile or trace.")
+
+        async def run_probe(rate: float) -> dict[str, Any]:
+            return await benchmark(**{**benchmark_kwargs, "request_rate": rate})
+
+        max_rate, probes = await search_max_request_rate(
+            run_probe,
+            target_pct=args.slo_target_pct,
+            initial_rate=args.slo_search_initial_rate,
+            tolerance=args.slo_search_tolerance,
+            max_probes=args.slo_search_max_probes)
+        print_slo_search(max_rate, probes, args.slo_target_pct)
+        # Report the run at the capacity knee, or the last probe if no
+        # rate passed.
+        knee = next((probe for probe in probes
+                     if probe["request_rate"] == max_rate), probes[-1])
+        benchmark_result = knee["result"]
+        benchmark_result["request_rate"] = knee["request_rate"]
+        benchmark_result["slo_search"] = {
+            "target_pct": args.slo_target_pct,
+            "tolerance": args.slo_search_tolerance,
+            "max_request_rate": max_rate,
+            "probes": [{
+                "request_rate": probe["request_rate"],
+                "goodput_attainment": probe["goodput_attainment"],
+                "passed": probe["passed"],
+                "request_throughput": probe["result"]["request_throughput"],
+                "request_goodput": probe["result"]["request_goodput:"],
+                "output_throughput": probe["result"]["output_throughput"],
+            } for probe in probes],
+        }
+
+    if load_profile is not None:
+        benchmark_result["load_profile"] = [
+            segment.to_dict() for segment in load_profile
+        ]
+    return benchmark_result
+
+
+def save_benchmark_result(args: argparse.Namespace,
+                          benchmark_result: dict[str, Any]) -> str:
+    """
+    Save the configuration from `args` and the benchmark result to the
+    result JSON file, and return the path of the file.
+    """
+    model_id = args.model
+    result_json: dict[str, Any] = {}
+
+    # Setup
+    current_dt = datetime.now().strftime("%Y%m%d-%H%M%S")
+    result_json["date"] = current_dt
+    result_json["backend"] = args.backend
+    result_json["model_id"] = model_id
+    result_json["tokenizer_id"] = get_tokenizer_id(args)
+    result_json["best_of"] = args.best_of
+    result_json["num_prompts"] = args.num_prompts
+
+    # Metadata
+    if args.metadata:
+        for item in args.metadata:
+            if "=" in item:
+                kvstring = item.split("=")
+                result_json[kvstring[0].strip()] = kvstring[1].strip()
+            else:
+                raise ValueError(
+                    "Invalid metadata format. Please use KEY=VALUE format.")
+
+    # Traffic
+    # The SLO search reports the request rate it found.
+    request_rate = benchmark_result.get("request_rate", args.request_rate)
+    result_json["request_rate"] = (request_rate
+                                   if request_rate < float("inf") else "inf")
+    result_json["burstiness"] = args.burstiness
+    result_json["max_concurrency"] = args.max_concurrency
+    result_json["connection_mode"] = args.connection_mode
+    result_json["num_workers"] = args.num_workers
+    result_json["target_duration"] = args.duration
+    result_json["warmup_seconds"] = args.warmup_seconds
+    result_json["cooldown_seconds"] = args.cooldown_seconds
+    if args.dataset_name == "trace":
+        result_json["trace_time_scale"] = args.trace_time_scale
+
+    # Merge with benchmark result
+    result_json = {**result_json, **benchmark_result}
+
+    # Save to file
+    base_model_id = model_id.split("/")[-1]
+    max_concurrency_str = (f"-concurrency{args.max_concurrency}"
+                           if args.max_concurrency is not None else "")
+    file_name = f"{args.backend}-{request_rate}qps-itkns-{args.sonnet_input_len}-otkns-{args.sonnet_output_len}{max_concurrency_str}-{base_model_id}-{current_dt}.json"  #noqa
+    if args.result_filename:
+        file_name = args.result_filename.replace("{datetime}", current_dt)
+    if args.result_dir:
+        file_name = os.path.join(args.result_dir, file_name)
+    if args.result_filename and "{datetime}" in args.result_filename:
+        # Runs of a sweep may finish within the same second.
+        stem, ext = os.path.splitext(file_name)
+        suffix = 1
+        while os.path.exists(file_name):
+            file_name = f"{stem}-{suffix}{ext}"
+            suffix += 1
+    print(f"Saving results to {file_name}")
+    # Write to a temporary file first, so that an interrupted run never
+    # leaves a truncated result behind.
+    with open(file_name + ".tmp", "w", encoding='utf-8') as outfile:
+        json.dump(result_json, outfile)
+    os.replace(file_name + ".tmp", file_name)
+    save_to_pytorch_benchmark_format(args, result_json, file_name)
+    if args.time_series_bin_seconds > 0:
+        time_series_file = time_series_path(file_name)
+        time_series_from_result(
+            result_json, args.time_series_bin_seconds).to_csv(
+                time_series_file, index=False)
+        print(f"Saving time series to {time_series_file}")
+    return file_name
+
+
+def make_client_profiler(
+        args: argparse.Namespace) -> Optional[ClientProfiler]:
+    if args.client_profile is None:
+        return None
+    return ClientProfiler(args.client_profile,
+                          top_n=args.client_profile_top_n,
+                          interval=args.client_profile_interval_ms / 1000)
+
+
+def save_client_profile(args: argparse.Namespace,
+                        client_profiler: ClientProfiler,
+                        result_file: Optional[str]) -> None:
+    """Save the profile artifact next to the result JSON."""
+    if result_file is not None:
+        base_path = os.path.splitext(result_file)[0]
+    else:
+        if args.result_dir:
+            os.makedirs(args.result_dir, exist_ok=True)
+        base_path = default_profile_base_path(args.result_dir)
+    path = client_profiler.save(base_path)
+    if path is not None:
+        print(f"Saved client profile to {path}")
+
+
+def main(args: argparse.Namespace):
+    print(args)
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    tokenizer = get_tokenizer(get_tokenizer_id(args),
+                              tokenizer_mode=args.tokenizer_mode,
+                              trust_remote_code=args.trust_remote_code)
+    input_requests, arrival_times = sample_input_requests(args, tokenizer)
+
     # Avoid GC processing "static" data - reduce pause times.
     gc.collect()
     gc.freeze()
 
+    client_profiler = make_client_profiler(args)
     benchmark_result = asyncio.run(
-        benchmark(
-            backend=backend,
-            api_url=api_url,
-            base_url=base_url,
-            model_id=model_id,
-            model_name=model_name,
-            tokenizer=tokenizer,
-            input_requests=input_requests,
-            logprobs=args.logprobs,
-            best_of=args.best_of,
-            request_rate=args.request_rate,
-            burstiness=args.burstiness,
-            disable_tqdm=args.disable_tqdm,
-            profile=args.profile,
-            selected_percentile_metrics=args.percentile_metrics.split(","),
-            selected_percentiles=[
-                float(p) for p in args.metric_percentiles.split(",")
-            ],
-            ignore_eos=args.ignore_eos,
-            goodput_config_dict=goodput_config_dict,
-            max_concurrency=args.max_concurrency,
-            lora_modules=args.lora_modules,
-        ))
+        run_benchmark(args,
+                      tokenizer,
+                      input_requests,
+                      arrival_times,
+                      client_profiler=client_profiler))
 
     # Save config and results to json
+    result_file = None
     if args.save_result:
-        result_json: dict[str, Any] = {}
-
-        # Setup
-        current_dt = datetime.now().strftime("%Y%m%d-%H%M%S")
-        result_json["date"] = current_dt
-        result_json["backend"] = backend
-        result_json["model_id"] = model_id
-        result_json["tokenizer_id"] = tokenizer_id
-        result_json["best_of"] = args.best_of
-        result_json["num_prompts"] = args.num_prompts
-
-        # Metadata
-        if args.metadata:
-            for item in args.metadata:
-                if "=" in item:
-                    kvstring = item.split("=")
-                    result_json[kvstring[0].strip()] = kvstring[1].strip()
-                else:
-                    raise ValueError(
-                        "Invalid metadata format. Please use KEY=VALUE format."
-                    )
-
-        # Traffic
-        result_json["request_rate"] = (args.request_rate if args.request_rate
-                                       < float("inf") else "inf")
-        result_json["burstiness"] = args.burstiness
-        result_json["max_concurrency"] = args.max_concurrency
-
-        # Merge with benchmark result
-        result_json = {**result_json, **benchmark_result}
-
-        # Save to file
-        base_model_id = model_id.split("/")[-1]
-        max_concurrency_str = (f"-concurrency{args.max_concurrency}"
-                               if args.max_concurrency is not None else "")
-        file_name = f"{backend}-{args.request_rate}qps-itkns-{args.sonnet_input_len}-otkns-{args.sonnet_output_len}{max_concurrency_str}-{base_model_id}-{current_dt}.json"  #noqa
-        if args.result_filename:
-            file_name = args.result_filename
-        if args.result_dir:
-            file_name = os.path.join(args.result_dir, file_name)
-        print(f"Saving results to {file_name}")
-        with open(file_name, "w", encoding='utf-8') as outfile:
-            json.dump(result_json, outfile)
-        save_to_pytorch_benchmark_format(args, result_json, file_name)
+        result_file = save_benchmark_result(args, benchmark_result)
+    if client_profiler is not None:
+        save_client_profile(args, client_profiler, result_file)
 
 
-if __name__ == "__main__":
+def make_arg_parser() -> FlexibleArgumentParser:
     parser = FlexibleArgumentParser(
         description="Benchmark the online serving throughput.")
     parser.add_argument(
@@ -1049,13 +2559,13 @@ if __name__ == "__main__":
         "--dataset-name",
         type=str,
         default="sharegpt",
-        choices=["sharegpt", "burstgpt", "sonnet", "random", "hf"],
+        choices=["sharegpt", "burstgpt", "sonnet", "random", "hf", "trace"],
         help="Name of the dataset to benchmark on.",
     )
     parser.add_argument("--dataset-path",
                         type=str,
                         default=None,
-                        help="Path to the sharegpt/sonnet dataset. "
+                        help="Path to the sharegpt/sonnet dataset or trace. "
                         "Or the huggingface dataset ID if using HF dataset.")
     parser.add_argument(
         "--max-concurrency",
@@ -1069,6 +2579,136 @@ if __name__ == "__main__":
         "to execute at a time. This means that when used in combination, the "
         "actual request rate may be lower than specified with --request-rate, "
         "if the server is not processing requests fast enough to keep up.")
+    parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=1,
+        help="Number of load generator processes. The requests, the request "
+        "rate and --max-concurrency are split across the workers, each "
+        "running its own event loop and connection pool, so that client-side "
+        "SSE parsing does not become the bottleneck at high concurrency. "
+        "The per-request results are merged into a single report.")
+    parser.add_argument(
+        "--client-monitor-interval-ms",
+        type=float,
+        default=5.0,
+        help="Interval in ms at which a background task samples the event "
+        "loop lag and the CPU utilization of the client while the requests "
+        "are sent. Both series are saved in the result JSON. Set to 0 to "
+        "disable the monitor.")
+    parser.add_argument(
+        "--client-lag-threshold-ms",
+        type=float,
+        default=DEFAULT_LAG_THRESHOLD_MS,
+        help="Flag the run as client-bound when the P99 event loop lag, "
+        "after the first token of the run, exceeds this many ms, since the "
+        "lag is added to the measured token timestamps.")
+    parser.add_argument(
+        "--live-interval",
+        type=float,
+        default=None,
+        help="Print a live line every this many seconds during the run: the "
+        "in-flight requests, the request and output token throughput and "
+        "the P50/P99 TTFT and ITL over the last --live-window seconds.")
+    parser.add_argument(
+        "--live-window",
+        type=float,
+        default=30.0,
+        help="Window in seconds of the rolling live metrics.")
+    parser.add_argument(
+        "--live-http-port",
+        type=int,
+        default=None,
+        help="Also serve the live metrics as JSON on "
+        "http://127.0.0.1:<port>/live during the run.")
+    parser.add_argument(
+        "--token-count-processes",
+        type=int,
+        default=1,
+        help="Processes that count the output tokens of backends that do "
+        "not report usage (e.g. TGI, DeepSpeed-MII). The generated texts "
+        "are batch-encoded in chunks either way; more processes help with "
+        "slow tokenizers on very large runs.")
+    parser.add_argument(
+        "--time-series-bin-seconds",
+        type=float,
+        default=1.0,
+        help="With --save-result, also save the in-flight requests, the "
+        "request and token throughput and the latency percentiles per bin "
+        "of this many seconds of the whole run, warmup and cooldown "
+        "included, to <result>.timeseries.csv, see time_series.py. Set to "
+        "0 to disable.")
+    parser.add_argument(
+        "--metrics-mode",
+        type=str,
+        default="exact",
+        choices=["exact", "sketch"],
+        help="'exact' computes the latency statistics from every request "
+        "at the end of the run. 'sketch' adds the TTFT, ITL and E2EL of each "
+        "request to fixed-size log-bucketed histograms as it completes and "
+        "releases its per-token ITLs, and its generated text unless the "
+        "backend does not report usage, so that memory does not grow with "
+        "the number of tokens of long soak runs. Percentiles "
+        "are then within --sketch-relative-accuracy and the result JSON has "
+        "no per-request ITLs or generated texts.")
+    parser.add_argument(
+        "--sketch-relative-accuracy",
+        type=float,
+        default=0.01,
+        help="Relative error bound of the percentiles in --metrics-mode "
+        "sketch.")
+    parser.add_argument(
+        "--client-profile",
+        type=str,
+        default=None,
+        choices=PROFILE_MODES,
+        help="Profile the client from the first request sent to the end of "
+        "the metrics calculation, excluding the test request. 'cprofile' "
+        "traces every Python call, 'tracemalloc' the allocations still alive "
+        "at the end, and 'sampling' samples the stack of the event loop "
+        "with a low overhead. A top-N summary is printed and the profile is "
+        "saved next to the result JSON. With --num-workers > 1 only the "
+        "coordinator process is profiled.")
+    parser.add_argument(
+        "--client-profile-top-n",
+        type=int,
+        default=20,
+        help="Number of functions in the client profile summary.")
+    parser.add_argument(
+        "--client-profile-interval-ms",
+        type=float,
+        default=1.0,
+        help="Stack sampling interval in ms of --client-profile sampling.")
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="Run for this many seconds instead of a fixed number of "
+        "requests. The sampled prompts (--num-prompts) are reused in order "
+        "for as long as the run lasts. With an infinite request rate, "
+        "--max-concurrency clients send requests back to back.")
+    parser.add_argument(
+        "--warmup-seconds",
+        type=float,
+        default=0.0,
+        help="Exclude requests sent in the first seconds of the run from "
+        "the metrics, e.g. while the server warms up its caches.")
+    parser.add_argument(
+        "--cooldown-seconds",
+        type=float,
+        default=0.0,
+        help="Exclude requests sent in the last seconds of the run from the "
+        "metrics, when the load ramps down. Without --duration the window "
+        "ends this long before the last request finished.")
+    parser.add_argument(
+        "--load-profile",
+        type=str,
+        default=None,
+        help="Path to a JSON or YAML load profile: a list of segments, each "
+        "with a duration and a request rate and/or maximum concurrency, run "
+        "back to back in a single run with metrics reported per segment. "
+        "See load_profile.py for the format. Overrides --request-rate, "
+        "--max-concurrency and --duration.")
 
     parser.add_argument(
         "--model",
@@ -1171,7 +2811,8 @@ if __name__ == "__main__":
         help="Specify the filename to save benchmark json results."
         "If not specified, results will be saved in "
         "{backend}-{args.request_rate}qps-{base_model_id}-{current_dt}.json"
-        " format.",
+        " format. A {datetime} in the filename is replaced by the "
+        "{current_dt} timestamp.",
     )
     parser.add_argument(
         "--ignore-eos",
@@ -1207,6 +2848,65 @@ if __name__ == "__main__":
         "goodput, refer to DistServe paper: https://arxiv.org/pdf/2401.09670 "
         "and the blog: https://hao-ai-lab.github.io/blogs/distserve")
 
+    slo_search_group = parser.add_argument_group("SLO search options")
+    slo_search_group.add_argument(
+        "--slo-search",
+        action="store_true",
+        help="Instead of a single run at --request-rate, search the highest "
+        "request rate at which the --goodput SLOs are met by at least "
+        "--slo-target-pct percent of the requests. The rate is doubled "
+        "until the target is missed, then bisected. The tokenizer and the "
+        "sampled requests are reused by every probe.")
+    slo_search_group.add_argument(
+        "--slo-target-pct",
+        type=float,
+        default=90.0,
+        help="Percentage of requests that must meet the SLOs.")
+    slo_search_group.add_argument(
+        "--slo-search-initial-rate",
+        type=float,
+        default=1.0,
+        help="Request rate of the first probe (requests/s).")
+    slo_search_group.add_argument(
+        "--slo-search-tolerance",
+        type=float,
+        default=0.05,
+        help="Stop bisecting once the highest passing and the lowest failing "
+        "rate are within this fraction of the passing rate.")
+    slo_search_group.add_argument(
+        "--slo-search-max-probes",
+        type=int,
+        default=16,
+        help="Maximum number of benchmark runs of the search.")
+
+    connection_group = parser.add_argument_group("connection options")
+    connection_group.add_argument(
+        "--connection-mode",
+        type=str,
+        default="pooled",
+        choices=["pooled", "per-request"],
+        help="\"pooled\" shares one keep-alive connection pool across all "
+        "requests and opens the connections before the benchmark starts. "
+        "\"per-request\" opens a new connection for every request, so "
+        "connection setup cost is included in the measured latencies.")
+    connection_group.add_argument(
+        "--connection-limit",
+        type=int,
+        default=None,
+        help="Maximum number of pooled connections. Defaults to "
+        "--max-concurrency, or unlimited if that is not set. Must not be "
+        "lower than --max-concurrency.")
+    connection_group.add_argument(
+        "--keepalive-timeout",
+        type=float,
+        default=DEFAULT_KEEPALIVE_TIMEOUT,
+        help="Seconds an idle pooled connection is kept open for reuse.")
+    connection_group.add_argument(
+        "--dns-cache-ttl",
+        type=int,
+        default=DEFAULT_DNS_CACHE_TTL,
+        help="Seconds a resolved host name is cached by the connection pool.")
+
     # group for dataset specific arguments
     sonnet_group = parser.add_argument_group("sonnet dataset options")
     sonnet_group.add_argument(
@@ -1239,6 +2939,16 @@ if __name__ == "__main__":
         help="Output length for each request. Overrides the output length "
         "from the ShareGPT dataset.")
 
+    trace_group = parser.add_argument_group("trace dataset options")
+    trace_group.add_argument(
+        "--trace-time-scale",
+        type=float,
+        default=1.0,
+        help="Factor applied to the gaps between the arrival timestamps of "
+        "the replayed trace. Values below 1 compress the trace (0.5 replays "
+        "it twice as fast), values above 1 stretch it. --request-rate and "
+        "--burstiness are ignored for traces.")
+
     random_group = parser.add_argument_group("random dataset options")
     random_group.add_argument(
         "--random-input-len",
@@ -1312,5 +3022,10 @@ if __name__ == "__main__":
                         "launching the server. For each request, the "
                         "script chooses a LoRA module at random.")
 
+    return parser
+
+
+if __name__ == "__main__":
+    parser = make_arg_parser()
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,176 @@
+# SPDX-License-Identifier: Apache-2.0
+r"""Microbenchmark the client-side SSE handling of the streaming backends.
+
+Compares the previous line-by-line handling (strip, decode, removeprefix,
+`json.loads` and `str +=` per chunk) with the block-based parser in
+`sse_parser.py` on a synthetic OpenAI completions stream fed through an
+`aiohttp.StreamReader`, and reports the parsed events per second of CPU
+time (i.e. per core).
+
+Usage:
+    python benchmarks/benchmark_sse_parser.py \
+        --num-events 200000 \
+        --block-size 16384
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+from aiohttp.base_protocol import BaseProtocol
+from sse_parser import DONE_PAYLOAD, iter_sse_data, json_loads, orjson
+
+
+class _LoopbackProtocol(BaseProtocol):
+    """Stands in for the connection behind an in-memory StreamReader."""
+
+    @property
+    def connected(self) -> bool:
+        return True
+
+    def pause_reading(self, *args, **kwargs) -> None:
+        pass
+
+    def resume_reading(self, *args, **kwargs) -> None:
+        pass
+
+
+async def _feed_stream(reader: aiohttp.StreamReader, data: bytes,
+                       block_size: int) -> None:
+    # Deliver the stream in network-sized blocks, yielding to the event
+    # loop in between like a socket read would.
+    for pos in range(0, len(data), block_size):
+        reader.feed_data(data[pos:pos + block_size])
+        await asyncio.sleep(0)
+    reader.feed_eof()
+
+
+async def _run_on_stream(parser, data: bytes, block_size: int):
+    loop = asyncio.get_running_loop()
+    reader = aiohttp.StreamReader(_LoopbackProtocol(loop),
+                                  limit=2**16,
+                                  loop=loop)
+    feeder = asyncio.create_task(_feed_stream(reader, data, block_size))
+    result = await parser(reader)
+    await feeder
+    return result
+
+
+def make_completions_stream(num_events: int) -> bytes:
+    frames = []
+    for i in range(num_events):
+        chunk = {
+            "id": "cmpl-benchmark",
+            "object": "text_completion",
+            "created": 0,
+            "model": "benchmark",
+            "choices": [{
+                "index": 0,
+                "text": f" token{i % 1000}",
+                "logprobs": None,
+                "finish_reason": None,
+            }],
+        }
+        frames.append(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+    frames.append(b'data: {"choices": [], "usage": '
+                  b'{"completion_tokens": %d}}\n\n' % num_events)
+    frames.append(b"data: [DONE]\n\n")
+    return b"".join(frames)
+
+
+async def parse_line_by_line(content) -> tuple[int, str]:
+    generated_text = ""
+    itl: list[float] = []
+    num_events = 0
+    most_recent_timestamp = time.perf_counter()
+    async for chunk_bytes in content:
+        chunk_bytes = chunk_bytes.strip()
+        if not chunk_bytes:
+            continue
+
+        chunk = chunk_bytes.decode("utf-8").removeprefix("data: ")
+        if chunk != "[DONE]":
+            data = json.loads(chunk)
+            if choices := data.get("choices"):
+                timestamp = time.perf_counter()
+                itl.append(timestamp - most_recent_timestamp)
+                most_recent_timestamp = timestamp
+                text = choices[0].get("text")
+                generated_text += text or ""
+                num_events += 1
+    return num_events, generated_text
+
+
+async def parse_blocks(content) -> tuple[int, str]:
+    text_chunks: list[str] = []
+    itl: list[float] = []
+    num_events = 0
+    most_recent_timestamp = time.perf_counter()
+    async for payloads in iter_sse_data(content):
+        timestamp = time.perf_counter()
+        for payload in payloads:
+            if payload == DONE_PAYLOAD:
+                continue
+            data = json_loads(payload)
+            if choices := data.get("choices"):
+                itl.append(timestamp - most_recent_timestamp)
+                most_recent_timestamp = timestamp
+                text = choices[0].get("text")
+                if text:
+                    text_chunks.append(text)
+                num_events += 1
+    return num_events, "".join(text_chunks)
+
+
+def run_parser(parser, data: bytes, block_size: int, num_iters: int) -> float:
+    num_events = 0
+    start = time.process_time()
+    for _ in range(num_iters):
+        iter_events, _ = asyncio.run(_run_on_stream(parser, data, block_size))
+        num_events += iter_events
+    return num_events / (time.process_time() - start)
+
+
+def main(args: argparse.Namespace):
+    print(args)
+    data = make_completions_stream(args.num_events)
+    print(f"Stream size: {len(data) / 2**20:.1f} MiB, "
+          f"JSON decoder: {'orjson' if orjson is not None else 'json'}")
+
+    # Both parsers must agree on the stream contents.
+    expected = asyncio.run(
+        _run_on_stream(parse_line_by_line, data, args.block_size))
+    actual = asyncio.run(_run_on_stream(parse_blocks, data, args.block_size))
+    assert actual == expected, "Block parser output differs."
+
+    before = run_parser(parse_line_by_line, data, args.block_size,
+                        args.num_iters)
+    after = run_parser(parse_blocks, data, args.block_size, args.num_iters)
+
+    print("{s:{c}^{n}}".format(s=' SSE Parser Benchmark ', n=50, c='='))
+    print("{:<40} {:<10.0f}".format("Line-by-line (events/s/core):", before))
+    print("{:<40} {:<10.0f}".format("Block parser (events/s/core):", after))
+    print("{:<40} {:<10.2f}".format("Speedup:", after / before))
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the SSE parsing of the streaming backends.")
+    parser.add_argument("--num-events",
+                        type=int,
+                        default=100000,
+                        help="Number of token events in the stream.")
+    parser.add_argument("--block-size",
+                        type=int,
+                        default=16384,
+                        help="Bytes delivered by each simulated socket read. "
+                        "Use a small value (~200) to model one token event "
+                        "per read at low concurrency.")
+    parser.add_argument("--num-iters",
+                        type=int,
+                        default=3,
+                        help="Number of times each parser runs the stream.")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,242 @@
+# SPDX-License-Identifier: Apache-2.0
+"""Detect benchmark runs whose latencies are inflated by the client itself.
+
+`ClientMonitor` runs as a background task on the event loop of the load
+generator while the requests are dispatched. It samples
+    - the event loop lag, i.e. how late a sleep of `interval` seconds
+      resumes; a request's tokens are timestamped when the loop gets to
+      them, so the lag adds directly to the measured TTFT and ITL,
+    - the CPU utilization of the client process, from /proc/self/stat
+      (`time.process_time()` where /proc is not available).
+
+A run is flagged as client-bound when the p99 loop lag exceeds an
+absolute threshold (`DEFAULT_LAG_THRESHOLD_MS` by default), or a process
+used nearly a full core. The lag percentiles leave out the samples taken
+before the first token of the run, while the first wave of requests is
+sent, since that burst does not delay the tokens that are measured. The
+monitors of the worker processes of a sharded run are merged with
+`merge`.
+
+The lag samples are aggregated as they are taken, so that the monitor
+has a fixed size whatever the length of the run: the maximum and mean
+lag per `cpu_interval` bucket for the saved series, and a `LogHistogram`
+for the percentiles. Only the samples taken before the first request
+completes are kept until the first token time of the run is known.
+"""
+import asyncio
+import os
+import time
+from array import array
+from typing import Any, Optional
+
+import numpy as np
+from quantile_sketch import LogHistogram
+
+# Mean CPU utilization, in cores, above which a single-threaded client is
+# saturated.
+CPU_SATURATION = 0.9
+
+# P99 event loop lag in ms above which a run is flagged as client-bound.
+DEFAULT_LAG_THRESHOLD_MS = 10.0
+
+try:
+    _CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = 100
+
+
+def _read_process_cpu_seconds() -> float:
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces, so count the fields from
+            # its closing parenthesis: utime and stime are fields 14 and 15.
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return time.process_time()
+
+
+class ClientMonitor:
+    """
+    Samples the event loop lag every `interval` seconds and the process
+    CPU utilization every `cpu_interval` seconds. The lag is kept as the
+    maximum, sum and count of the samples of each `cpu_interval` bucket,
+    and a histogram of the samples taken after `end_startup`; the samples
+    taken before it are kept as they are.
+    """
+
+    def __init__(self, interval: float = 0.005, cpu_interval: float = 0.1):
+        self.interval = interval
+        self.cpu_interval = cpu_interval
+        # The lag per cpu_interval bucket, in seconds.
+        self.bucket_max_lag_s = array("d")
+        self.bucket_lag_sum_s = array("d")
+        self.bucket_lag_count = array("q")
+        self.lag_histogram = LogHistogram()
+        self.startup_lag_s = array("d")
+        self.startup_lag_times = array("d")
+        self.cpu_times = array("d")
+        self.cpu_utilization = array("d")
+        # The CPU series of each process, for monitors merged from workers.
+        self.process_cpu: list[tuple[array, array]] = []
+        self.start_time = 0.0
+        self._steady = False
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def merge(cls, monitors: list["ClientMonitor"]) -> "ClientMonitor":
+        """Combine the stopped monitors of the workers of a sharded run."""
+        merged = cls(monitors[0].interval, monitors[0].cpu_interval)
+        merged.start_time = monitors[0].start_time
+        num_buckets = max(len(m.bucket_lag_count) for m in monitors)
+        max_lag_s = np.zeros(num_buckets)
+        lag_sum_s = np.zeros(num_buckets)
+        lag_count = np.zeros(num_buckets, dtype=np.int64)
+        for m in monitors:
+            n = len(m.bucket_lag_count)
+            np.maximum(max_lag_s[:n],
+                       np.frombuffer(m.bucket_max_lag_s, dtype=np.float64),
+                       out=max_lag_s[:n])
+            lag_sum_s[:n] += np.frombuffer(m.bucket_lag_sum_s,
+                                           dtype=np.float64)
+            lag_count[:n] += np.frombuffer(m.bucket_lag_count,
+                                           dtype=np.int64)
+            merged.lag_histogram.merge(m.lag_histogram)
+            merged.startup_lag_s.extend(m.startup_lag_s)
+            merged.startup_lag_times.extend(m.startup_lag_times)
+        merged.bucket_max_lag_s = array("d", max_lag_s.tobytes())
+        merged.bucket_lag_sum_s = array("d", lag_sum_s.tobytes())
+        merged.bucket_lag_count = array("q", lag_count.tobytes())
+        merged.process_cpu = [(m.cpu_times, m.cpu_utilization)
+                              for m in monitors]
+        return merged
+
+    def start(self, start_time: Optional[float] = None) -> None:
+        """Start sampling; the series are relative to `start_time`."""
+        self.start_time = (start_time if start_time is not None else
+                           time.perf_counter())
+        self._task = asyncio.create_task(self._run())
+
+    def end_startup(self) -> None:
+        """
+        Add the lag samples from now on to the histogram. Called when the
+        first request completes, which is after the first token of the run.
+        """
+        self._steady = True
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            # Leave the monitor picklable, to be sent back by workers.
+            self._task = None
+
+    async def _run(self) -> None:
+        last_cpu_time = time.perf_counter()
+        last_cpu_seconds = _read_process_cpu_seconds()
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._add_lag(now - self.start_time, max(now - expected, 0.0))
+            if now - last_cpu_time >= self.cpu_interval:
+                cpu_seconds = _read_process_cpu_seconds()
+                self.cpu_times.append(now - self.start_time)
+                self.cpu_utilization.append(
+                    (cpu_seconds - last_cpu_seconds) / (now - last_cpu_time))
+                last_cpu_time, last_cpu_seconds = now, cpu_seconds
+
+    def _add_lag(self, time_s: float, lag_s: float) -> None:
+        # Workers start sampling just before the common start time.
+        bucket = max(int(time_s // self.cpu_interval), 0)
+        while len(self.bucket_lag_count) <= bucket:
+            self.bucket_max_lag_s.append(0.0)
+            self.bucket_lag_sum_s.append(0.0)
+            self.bucket_lag_count.append(0)
+        if lag_s > self.bucket_max_lag_s[bucket]:
+            self.bucket_max_lag_s[bucket] = lag_s
+        self.bucket_lag_sum_s[bucket] += lag_s
+        self.bucket_lag_count[bucket] += 1
+        if self._steady:
+            self.lag_histogram.add(lag_s)
+        else:
+            self.startup_lag_s.append(lag_s)
+            self.startup_lag_times.append(time_s)
+
+    def summary(self,
+                lag_threshold_ms: float = DEFAULT_LAG_THRESHOLD_MS,
+                steady_start: Optional[float] = None) -> dict[str, Any]:
+        """
+        The lag percentiles, the CPU utilization, the client-bound flag and
+        the sampled series, for the result JSON. The lag percentiles only
+        count the samples from the `time.perf_counter()` time
+        `steady_start` on, e.g. the first token of the run.
+        """
+        startup_lag_s = np.frombuffer(self.startup_lag_s, dtype=np.float64)
+        if steady_start is not None:
+            startup_lag_times = np.frombuffer(self.startup_lag_times,
+                                              dtype=np.float64)
+            steady_startup_lag_s = startup_lag_s[
+                startup_lag_times >= steady_start - self.start_time]
+        else:
+            steady_startup_lag_s = startup_lag_s
+        steady_lag = LogHistogram(self.lag_histogram.relative_accuracy)
+        steady_lag.merge(self.lag_histogram)
+        steady_lag.add_many(steady_startup_lag_s)
+        p50_lag_ms, p99_lag_ms = steady_lag.percentiles([50, 99]) * 1000
+        max_lag_ms = steady_lag.max * 1000 if steady_lag.count else 0.0
+        process_cpu = self.process_cpu or [(self.cpu_times,
+                                            self.cpu_utilization)]
+        # The busiest process decides whether the client is saturated.
+        cpu_means = [
+            float(np.mean(utilization)) if len(utilization) else 0.0
+            for _, utilization in process_cpu
+        ]
+        mean_cpu = max(cpu_means)
+        max_cpu = max(
+            (max(utilization) for _, utilization in process_cpu
+             if len(utilization)),
+            default=0.0)
+
+        reasons = []
+        if p99_lag_ms > lag_threshold_ms:
+            reasons.append(f"p99 event loop lag {p99_lag_ms:.2f} ms > "
+                           f"{lag_threshold_ms:g} ms")
+        if mean_cpu > CPU_SATURATION:
+            reasons.append(
+                f"client CPU utilization {mean_cpu:.0%} of a core")
+
+        # Maximum and mean lag per CPU sampling bucket.
+        lag_count = np.frombuffer(self.bucket_lag_count, dtype=np.int64)
+        bucket_ids = np.flatnonzero(lag_count)
+        bucket_max_lag_ms = np.frombuffer(
+            self.bucket_max_lag_s, dtype=np.float64)[bucket_ids] * 1000
+        bucket_mean_lag_ms = (np.frombuffer(
+            self.bucket_lag_sum_s, dtype=np.float64)[bucket_ids] /
+                              lag_count[bucket_ids] * 1000)
+        return {
+            "client_bound": bool(reasons),
+            "client_bound_reasons": reasons,
+            "interval_ms": self.interval * 1000,
+            "lag_threshold_ms": lag_threshold_ms,
+            "num_startup_lag_samples":
+            len(startup_lag_s) - len(steady_startup_lag_s),
+            "p50_loop_lag_ms": float(p50_lag_ms),
+            "p99_loop_lag_ms": float(p99_lag_ms),
+            "max_loop_lag_ms": float(max_lag_ms),
+            "mean_cpu_utilization": mean_cpu,
+            "max_cpu_utilization": max_cpu,
+            "loop_lag_series": {
+                "time_s": (bucket_ids * self.cpu_interval).tolist(),
+                "max_lag_ms": bucket_max_lag_ms.tolist(),
+                "mean_lag_ms": bucket_mean_lag_ms.tolist(),
+            },
+            # One series per client process.
+            "cpu_series": [{
+                "time_s": times.tolist(),
+                "utilization": utilization.tolist(),
+            } for times, utilization in process_cpu],
+        }
@@ -0,0 +1,209 @@
+# SPDX-License-Identifier: Apache-2.0
+"""Profile the benchmark client during the measured window of a run.
+
+`benchmark_serving.py --client-profile MODE` profiles the client from the
+dispatch of the first request to the end of the metrics calculation, i.e.
+after the initial test request and the connection pre-warm. The modes are
+    cprofile:    deterministic profile of every Python call. Saves a
+                 ".prof" file for pstats, snakeviz or gprof2dot.
+    tracemalloc: allocations that are still alive at the end of the window,
+                 by source line. Saves a ".tracemalloc" snapshot for
+                 `tracemalloc.Snapshot.load`.
+    sampling:    samples the stack of the event loop thread every
+                 --client-profile-interval-ms from a background thread, with
+                 a much lower overhead than cprofile. Saves the collapsed
+                 stacks as ".folded" for flamegraph.pl or speedscope.
+
+With --num-workers > 1 only the coordinator process is profiled; profile
+the SSE loops with a single worker.
+"""
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Optional
+
+PROFILE_MODES = ("cprofile", "tracemalloc", "sampling")
+
+
+class ClientProfiler:
+    """
+    Profiles the client between `start` and `stop`. The cprofile and
+    sampling profiles of several windows, e.g. the probes of an SLO search,
+    accumulate; tracemalloc keeps the allocations of the last window.
+    """
+
+    def __init__(self, mode: str, top_n: int = 20, interval: float = 0.001):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown client profile mode '{mode}', "
+                             f"expected one of {PROFILE_MODES}.")
+        self.mode = mode
+        self.top_n = top_n
+        self.interval = interval
+        self._profile = cProfile.Profile() if mode == "cprofile" else None
+        self._start_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._peak_bytes = 0
+        # Sampling: collapsed stack -> samples.
+        self._stacks: Counter[str] = Counter()
+        self._num_samples = 0
+        self._sampler: Optional[threading.Thread] = None
+        self._stop_sampling = threading.Event()
+        self._running = False
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        if self.mode == "cprofile":
+            self._profile.enable()
+        elif self.mode == "tracemalloc":
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._start_snapshot = tracemalloc.take_snapshot()
+        else:
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(target=self._sample,
+                                             args=(threading.get_ident(), ),
+                                             daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        if self.mode == "cprofile":
+            self._profile.disable()
+        elif self.mode == "tracemalloc":
+            self._snapshot = tracemalloc.take_snapshot()
+            self._peak_bytes = max(self._peak_bytes,
+                                   tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        else:
+            self._stop_sampling.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def _sample(self, thread_id: int) -> None:
+        while not self._stop_sampling.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:"
+                             f"{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self._stacks[";".join(reversed(stack))] += 1
+                self._num_samples += 1
+
+    def summary(self) -> dict[str, Any]:
+        """The top functions (or lines, for tracemalloc) of the profile."""
+        if self.mode == "cprofile":
+            stats = pstats.Stats(self._profile, stream=io.StringIO())
+            rows = sorted(stats.stats.items(),
+                          key=lambda item: item[1][2],
+                          reverse=True)[:self.top_n]
+            top = [{
+                "function": f"{name} ({filename}:{lineno})",
+                "calls": calls,
+                "self_s": self_time,
+                "cumulative_s": cumulative_time,
+            } for (filename, lineno, name), (_, calls, self_time,
+                                              cumulative_time, _) in rows]
+            return {"mode": self.mode, "top": top}
+
+        if self.mode == "tracemalloc":
+            top = []
+            if self._snapshot is not None:
+                for stat in self._snapshot.compare_to(self._start_snapshot,
+                                                      "lineno")[:self.top_n]:
+                    frame = stat.traceback[0]
+                    top.append({
+                        "line": f"{frame.filename}:{frame.lineno}",
+                        "size_diff_bytes": stat.size_diff,
+                        "count_diff": stat.count_diff,
+                        "size_bytes": stat.size,
+                    })
+            return {
+                "mode": self.mode,
+                "peak_traced_bytes": self._peak_bytes,
+                "top": top
+            }
+
+        num_samples = max(self._num_samples, 1)
+        self_samples: Counter[str] = Counter()
+        total_samples: Counter[str] = Counter()
+        for stack, count in self._stacks.items():
+            functions = stack.split(";")
+            self_samples[functions[-1]] += count
+            for function in set(functions):
+                total_samples[function] += count
+        top = [{
+            "function": function,
+            "self_pct": 100 * count / num_samples,
+            "total_pct": 100 * total_samples[function] / num_samples,
+        } for function, count in self_samples.most_common(self.top_n)]
+        return {
+            "mode": self.mode,
+            "interval_ms": self.interval * 1000,
+            "samples": self._num_samples,
+            "top": top
+        }
+
+    def print_summary(self, summary: dict[str, Any]) -> None:
+        print("{s:{c}^{n}}".format(s=f'Client Profile ({self.mode})',
+                                   n=50,
+                                   c='-'))
+        if self.mode == "cprofile":
+            print("{:>10} {:>10} {:>10}  {}".format("Calls", "Self (s)",
+                                                   "Cum. (s)", "Function"))
+            for row in summary["top"]:
+                print("{:>10} {:>10.3f} {:>10.3f}  {}".format(
+                    row["calls"], row["self_s"], row["cumulative_s"],
+                    row["function"]))
+        elif self.mode == "tracemalloc":
+            print("{:<40} {:<10.2f}".format(
+                "Peak traced memory (MiB):",
+                summary["peak_traced_bytes"] / 2**20))
+            print("{:>12} {:>10}  {}".format("Net KiB", "Net count",
+                                             "Line"))
+            for row in summary["top"]:
+                print("{:>12.1f} {:>10}  {}".format(
+                    row["size_diff_bytes"] / 1024, row["count_diff"],
+                    row["line"]))
+        else:
+            print("{:<40} {:<10}".format("Samples:", summary["samples"]))
+            print("{:>8} {:>8}  {}".format("Self %", "Total %", "Function"))
+            for row in summary["top"]:
+                print("{:>8.1f} {:>8.1f}  {}".format(row["self_pct"],
+                                                     row["total_pct"],
+                                                     row["function"]))
+
+    def save(self, base_path: str) -> Optional[str]:
+        """Write the profile artifact next to `base_path` and return its
+        path."""
+        if self.mode == "cprofile":
+            path = base_path + ".client.prof"
+            self._profile.dump_stats(path)
+        elif self.mode == "tracemalloc":
+            if self._snapshot is None:
+                return None
+            path = base_path + ".client.tracemalloc"
+            self._snapshot.dump(path)
+        else:
+            path = base_path + ".client.folded"
+            with open(path, "w") as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        return path
+
+
+def default_profile_base_path(result_dir: Optional[str]) -> str:
+    """Where the artifacts go when the result JSON is not saved."""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return f"{result_dir or '.'}/client-profile-{stamp}"
@@ -0,0 +1,392 @@
+# SPDX-License-Identifier: Apache-2.0
+r"""Local stand-in streaming server for validating the benchmark client.
+
+Serves the OpenAI `/v1/completions` and `/v1/chat/completions` and the TGI
+`/generate_stream` streaming APIs with synthetic tokens whose timings are
+drawn from configurable distributions, so that what the client measures can
+be compared with what the server actually sent.
+
+Usage:
+    python benchmarks/fake_server.py --port 8000 \
+        --ttft-ms "lognormal:50:0.3" --tpot-ms "normal:10:1" \
+        --max-num-seqs 256 --tpot-per-seq-ms 0.02 --error-rate 0.01
+
+then e.g.
+    python benchmarks/benchmark_serving.py --backend openai --model fake \
+        --tokenizer <tokenizer> --port 8000 ...
+
+Timing distributions are given in milliseconds as "<value>" or
+"<kind>:<params>": const:<ms>, uniform:<low>:<high>, normal:<mean>:<std>,
+exp:<mean> or lognormal:<median>:<sigma>.
+
+Server model:
+    - A request waits for one of `--max-num-seqs` sequence slots, then its
+      first token is sent after its TTFT plus `--prefill-ms-per-token` per
+      prompt word, and each next token after its TPOT plus
+      `--tpot-per-seq-ms` per other running sequence, like a batch that
+      decodes slower as it grows.
+    - `--error-rate` of the requests fail with HTTP 500 and `--abort-rate`
+      of them drop the connection halfway through the stream.
+    - A request generates `max_tokens` (`max_completion_tokens`,
+      `max_new_tokens`) tokens. The first token is "req<id>", so that the
+      client outputs can be matched with the ground truth by their text.
+
+Ground truth:
+    GET /ground_truth returns, for the last `--max-records` requests, the
+    `time.perf_counter_ns()` at which the request arrived and at which each
+    of its tokens was written to the socket. On Linux it is the same
+    monotonic clock as the client's, so the timestamps of a client on the
+    same host can be compared directly. DELETE /ground_truth clears them
+    and the stats.
+    GET /stats summarizes the requests, the events sent and how late the
+    server was on its own schedule; a late server means the server, not
+    the client, is the bottleneck.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any, Optional
+
+from aiohttp import web
+
+DISTRIBUTIONS = ("const", "uniform", "normal", "exp", "lognormal")
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a timing distribution in milliseconds into a sampler returning
+    non-negative seconds.
+    """
+    kind, _, params = spec.partition(":")
+    if not params:
+        kind, params = "const", kind
+    try:
+        values = [float(value) for value in params.split(":")]
+    except ValueError as e:
+        raise ValueError(f"Invalid timing distribution '{spec}'.") from e
+    expected_params = {
+        "const": 1,
+        "uniform": 2,
+        "normal": 2,
+        "exp": 1,
+        "lognormal": 2
+    }
+    if kind not in expected_params or len(values) != expected_params[kind]:
+        raise ValueError(f"Invalid timing distribution '{spec}', expected "
+                         f"one of {DISTRIBUTIONS} with its parameters.")
+
+    if kind == "const":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0) / 1000
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / values[0]) / 1000
+    return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]
+                                          ) / 1000
+
+
+class _Framing:
+    """Pre-encoded SSE events of one API, with the token text spliced in."""
+
+    def __init__(self, kind: str, model: str):
+        self.kind = kind
+        if kind == "completions":
+            head, tail = json.dumps({
+                "id": "cmpl-fake",
+                "object": "text_completion",
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "text": "\0",
+                    "logprobs": None,
+                    "finish_reason": None
+                }],
+            }).split('"\\u0000"')
+        elif kind == "chat":
+            head, tail = json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {
+                        "content": "\0"
+                    },
+                    "finish_reason": None
+                }],
+            }).split('"\\u0000"')
+        else:
+            head, tail = ('{"token": {"id": 0, "text": ',
+                          ', "logprob": 0.0, "special": false}, '
+                          '"generated_text": null, "details": null}')
+        self.head = b"data: " + head.encode()
+        self.tail = tail.encode() + b"\n\n"
+
+    def token(self, text: str, generated_text: Optional[str] = None) -> bytes:
+        if generated_text is not None:
+            # TGI sends the whole text with the last token.
+            return (self.head + json.dumps(text).encode() + self.tail.replace(
+                b'"generated_text": null',
+                b'"generated_text": ' + json.dumps(generated_text).encode()))
+        return self.head + json.dumps(text).encode() + self.tail
+
+    def final(self, num_tokens: int, include_usage: bool,
+              num_prompt_tokens: int) -> bytes:
+        if self.kind == "tgi":
+            return b""
+        frames = b""
+        if include_usage:
+            usage = {
+                "prompt_tokens": num_prompt_tokens,
+                "completion_tokens": num_tokens,
+                "total_tokens": num_prompt_tokens + num_tokens,
+            }
+            frames += (b"data: " + json.dumps({
+                "choices": [],
+                "usage": usage
+            }).encode() + b"\n\n")
+        return frames + b"data: [DONE]\n\n"
+
+
+class FakeServer:
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.sample_ttft = parse_distribution(args.ttft_ms)
+        self.sample_tpot = parse_distribution(args.tpot_ms)
+        self.slots = asyncio.Semaphore(args.max_num_seqs)
+        self.num_running = 0
+        self.request_ids = itertools.count()
+        self.records: deque[dict[str, Any]] = deque(maxlen=args.max_records)
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.stats = {
+            "requests": 0,
+            "completed": 0,
+            "errors": 0,
+            "aborted": 0,
+            "events": 0,
+            "max_running": 0,
+            "lateness_ns_sum": 0,
+            "max_lateness_ns": 0,
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/completions", self.completions)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/generate_stream", self.generate_stream)
+        app.router.add_get("/v1/models", self.models)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/ground_truth", self.get_ground_truth)
+        app.router.add_delete("/ground_truth", self.clear_ground_truth)
+        app.router.add_get("/stats", self.get_stats)
+        return app
+
+    async def completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        return await self.stream(request, "completions", body,
+                                 body.get("max_tokens"),
+                                 str(body.get("prompt", "")))
+
+    async def chat_completions(self,
+                               request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        prompt = " ".join(
+            str(message.get("content", ""))
+            for message in body.get("messages", []))
+        return await self.stream(
+            request, "chat", body,
+            body.get("max_completion_tokens", body.get("max_tokens")), prompt)
+
+    async def generate_stream(self,
+                              request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        params = body.get("parameters", {})
+        return await self.stream(request, "tgi", body,
+                                 params.get("max_new_tokens"),
+                                 str(body.get("inputs", "")))
+
+    async def stream(self, request: web.Request, kind: str,
+                     body: dict[str, Any], max_tokens: Optional[int],
+                     prompt: str) -> web.StreamResponse:
+        arrival_ns = time.perf_counter_ns()
+        request_id = next(self.request_ids)
+        num_tokens = max(int(max_tokens or self.args.default_output_len), 1)
+        num_prompt_tokens = len(prompt.split())
+        record = {
+            "id": request_id,
+            "api": kind,
+            "arrival_ns": arrival_ns,
+            "num_prompt_tokens": num_prompt_tokens,
+            "num_tokens": num_tokens,
+            "token_ns": [],
+            "status": "ok",
+        }
+        self.records.append(record)
+        self.stats["requests"] += 1
+
+        if self.rng.random() < self.args.error_rate:
+            record["status"] = "error"
+            self.stats["errors"] += 1
+            raise web.HTTPInternalServerError(text="Injected failure")
+        abort_after = (self.rng.randrange(num_tokens)
+                       if self.rng.random() < self.args.abort_rate else None)
+
+        framing = _Framing(kind, str(body.get("model", "fake")))
+        include_usage = bool(
+            body.get("stream_options", {}).get("include_usage"))
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        loop = asyncio.get_running_loop()
+        async with self.slots:
+            self.num_running += 1
+            self.stats["max_running"] = max(self.stats["max_running"],
+                                            self.num_running)
+            try:
+                # The schedule is kept on absolute deadlines, so that the
+                # server's own delays do not accumulate.
+                deadline = loop.time() + self.sample_ttft(self.rng) + (
+                    num_prompt_tokens * self.args.prefill_ms_per_token / 1000)
+                texts = []
+                for i in range(num_tokens):
+                    if i:
+                        deadline += self.sample_tpot(self.rng) + (
+                            (self.num_running - 1) *
+                            self.args.tpot_per_seq_ms / 1000)
+                    delay = deadline - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    lateness_ns = int(max(loop.time() - deadline, 0) * 1e9)
+                    self.stats["lateness_ns_sum"] += lateness_ns
+                    self.stats["max_lateness_ns"] = max(
+                        self.stats["max_lateness_ns"], lateness_ns)
+                    if i == abort_after:
+                        record["status"] = "aborted"
+                        self.stats["aborted"] += 1
+                        request.transport.close()
+                        return response
+                    text = f"req{request_id}" if i == 0 else " tok"
+                    texts.append(text)
+                    generated_text = ("".join(texts) if kind == "tgi"
+                                      and i == num_tokens - 1 else None)
+                    record["token_ns"].append(time.perf_counter_ns())
+                    await response.write(framing.token(text, generated_text))
+                    self.stats["events"] += 1
+            finally:
+                self.num_running -= 1
+        final = framing.final(num_tokens, include_usage, num_prompt_tokens)
+        if final:
+            await response.write(final)
+        await response.write_eof()
+        self.stats["completed"] += 1
+        return response
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "object": "list",
+            "data": [{
+                "id": "fake",
+                "object": "model"
+            }]
+        })
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    async def get_ground_truth(self, request: web.Request) -> web.Response:
+        return web.json_response(list(self.records))
+
+    async def clear_ground_truth(self, request: web.Request) -> web.Response:
+        self.records.clear()
+        self.reset_stats()
+        return web.Response(text="ok")
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        stats = dict(self.stats)
+        stats["mean_lateness_ms"] = (stats.pop("lateness_ns_sum") /
+                                     max(stats["events"], 1) / 1e6)
+        stats["max_lateness_ms"] = stats.pop("max_lateness_ns") / 1e6
+        stats["running"] = self.num_running
+        return web.json_response(stats)
+
+
+def main(args: argparse.Namespace):
+    # Fail on invalid distributions before the server starts.
+    parse_distribution(args.ttft_ms)
+    parse_distribution(args.tpot_ms)
+
+    async def make_app() -> web.Application:
+        # The semaphore must be created in the loop of the server.
+        return FakeServer(args).make_app()
+
+    print(f"Fake server listening on {args.host}:{args.port}")
+    web.run_app(make_app(),
+                host=args.host,
+                port=args.port,
+                access_log=None,
+                print=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fake OpenAI/TGI streaming server with known timings.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ttft-ms",
+                        type=str,
+                        default="50",
+                        help="Time to first token distribution in ms, e.g. "
+                        "'50' or 'lognormal:50:0.3'.")
+    parser.add_argument("--tpot-ms",
+                        type=str,
+                        default="10",
+                        help="Time per output token distribution in ms, e.g. "
+                        "'10' or 'normal:10:1'.")
+    parser.add_argument("--prefill-ms-per-token",
+                        type=float,
+                        default=0.0,
+                        help="Additional TTFT per prompt word in ms.")
+    parser.add_argument("--max-num-seqs",
+                        type=int,
+                        default=1024,
+                        help="Sequences generated at the same time; other "
+                        "requests wait for a slot.")
+    parser.add_argument("--tpot-per-seq-ms",
+                        type=float,
+                        default=0.0,
+                        help="Additional TPOT in ms per other running "
+                        "sequence.")
+    parser.add_argument("--error-rate",
+                        type=float,
+                        default=0.0,
+                        help="Fraction of the requests failing with HTTP "
+                        "500.")
+    parser.add_argument("--abort-rate",
+                        type=float,
+                        default=0.0,
+                        help="Fraction of the requests whose connection is "
+                        "dropped mid-stream.")
+    parser.add_argument("--default-output-len",
+                        type=int,
+                        default=128,
+                        help="Tokens generated when a request sets no "
+                        "maximum.")
+    parser.add_argument("--max-records",
+                        type=int,
+                        default=100000,
+                        help="Number of requests kept in the ground truth.")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
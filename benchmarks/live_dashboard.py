@@ -0,0 +1,223 @@
+# SPDX-License-Identifier: Apache-2.0
+"""Live view of a benchmark run while it goes on.
+
+The request dispatch adds every completed request to a `LiveStats`, a few
+counters and two latency histograms (see quantile_sketch.py), instead of
+updating the progress bar itself. `LiveDashboard` wakes up every
+`interval` seconds, takes the requests completed since its last tick and
+    - refreshes the tqdm bar, if any,
+    - with `print_lines`, prints the in-flight requests, the request and
+      output token throughput and the TTFT and ITL percentiles over the
+      last `window` seconds,
+    - with an `http_port`, serves the same numbers as JSON on
+      http://127.0.0.1:<port>/live, e.g. for `watch curl`,
+so that a misconfigured run can be stopped early. The workers of a
+sharded run send their `LiveStats` deltas to the coordinator through a
+queue, see `LiveStats.report`.
+"""
+import asyncio
+import json
+import queue
+import time
+from collections import deque
+from typing import Any, Optional
+
+import numpy as np
+from aiohttp import web
+from quantile_sketch import NANOSECONDS_PER_SECOND, LogHistogram
+
+
+class LiveStats:
+    """The requests sent and completed since the last `drain`."""
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.sent = 0
+        self.completed = 0
+        self.failed = 0
+        self.output_tokens = 0
+        self.ttft = LogHistogram(relative_accuracy)
+        self.itl = LogHistogram(relative_accuracy)
+
+    def on_complete(self, output) -> None:
+        if not output.success:
+            self.failed += 1
+            return
+        self.completed += 1
+        # The token count may only be known from the tokenizer at the end
+        # of the run; the streamed chunks are a close enough estimate.
+        self.output_tokens += (output.output_tokens
+                               or len(output.itl_ns) + 1)
+        self.ttft.add(output.ttft)
+        self.itl.add_many(
+            np.frombuffer(output.itl_ns, dtype=np.uint64) /
+            NANOSECONDS_PER_SECOND)
+
+    def drain(self) -> "LiveStats":
+        """Return the stats so far and start over."""
+        drained = LiveStats(self.relative_accuracy)
+        for name in ("sent", "completed", "failed", "output_tokens", "ttft",
+                     "itl"):
+            value = getattr(self, name)
+            setattr(self, name, getattr(drained, name))
+            setattr(drained, name, value)
+        return drained
+
+    def merge(self, other: "LiveStats") -> None:
+        self.sent += other.sent
+        self.completed += other.completed
+        self.failed += other.failed
+        self.output_tokens += other.output_tokens
+        self.ttft.merge(other.ttft)
+        self.itl.merge(other.itl)
+
+    async def report(self, live_queue, progress, interval: float) -> None:
+        """
+        In a worker of a sharded run, send the stats to the coordinator
+        every `interval` seconds until cancelled. `progress` is the shared
+        progress counter and `live_queue` None if there is no dashboard.
+        """
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                self._report(live_queue, progress)
+        finally:
+            self._report(live_queue, progress)
+
+    def _report(self, live_queue, progress) -> None:
+        stats = self.drain()
+        progress.update(stats.completed + stats.failed)
+        if live_queue is not None:
+            live_queue.put(stats)
+
+
+class LiveDashboard:
+    """
+    Aggregates the `LiveStats` of a run every `interval` seconds, keeping
+    the deltas of the last `window` seconds for the rolling rates and
+    percentiles.
+    """
+
+    def __init__(self,
+                 stats: Optional[LiveStats],
+                 interval: float,
+                 window: float = 30.0,
+                 pbar=None,
+                 print_lines: bool = False,
+                 http_port: Optional[int] = None,
+                 live_queue=None,
+                 total: Optional[int] = None):
+        self.stats = stats
+        self.interval = interval
+        self.pbar = pbar
+        self.print_lines = print_lines
+        self.http_port = http_port
+        self.live_queue = live_queue
+        self.total = total
+        self.totals = LiveStats()
+        self._deltas: deque[tuple[float, LiveStats]] = deque(
+            maxlen=max(int(round(window / interval)), 1))
+        self._snapshot: dict[str, Any] = {}
+        self._start_time = 0.0
+        self._last_tick = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, start_time: Optional[float] = None) -> None:
+        self._start_time = (start_time if start_time is not None else
+                            time.perf_counter())
+        self._last_tick = self._start_time
+        self._snapshot = self.snapshot(self._start_time)
+        if self.http_port is not None:
+            app = web.Application()
+            app.router.add_get("/live", self._handle_live)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, "127.0.0.1",
+                              self.http_port).start()
+            print(f"Live metrics on http://127.0.0.1:{self.http_port}/live")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Count the requests completed since the last tick.
+        self.tick()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.tick()
+            if self.print_lines:
+                self.print_snapshot()
+
+    def tick(self) -> dict[str, Any]:
+        now = time.perf_counter()
+        delta = (self.stats.drain()
+                 if self.stats is not None else LiveStats())
+        while self.live_queue is not None:
+            try:
+                delta.merge(self.live_queue.get_nowait())
+            except queue.Empty:
+                break
+        self.totals.merge(delta)
+        self._deltas.append((now - self._last_tick, delta))
+        self._last_tick = now
+        if self.pbar is not None:
+            self.pbar.update(delta.completed + delta.failed)
+        self._snapshot = self.snapshot(now)
+        return self._snapshot
+
+    def snapshot(self, now: float) -> dict[str, Any]:
+        window = LiveStats()
+        window_s = 0.0
+        for elapsed, delta in self._deltas:
+            window.merge(delta)
+            window_s += elapsed
+        window_s = max(window_s, 1e-9)
+        ttft_p50, ttft_p99 = window.ttft.percentiles([50, 99]) * 1000
+        itl_p50, itl_p99 = window.itl.percentiles([50, 99]) * 1000
+        totals = self.totals
+        return {
+            "elapsed_s": now - self._start_time,
+            "total": self.total,
+            "sent": totals.sent,
+            "completed": totals.completed,
+            "failed": totals.failed,
+            "in_flight": totals.sent - totals.completed - totals.failed,
+            "window_s": window_s,
+            "request_throughput": window.completed / window_s,
+            "output_throughput": window.output_tokens / window_s,
+            "p50_ttft_ms": float(ttft_p50),
+            "p99_ttft_ms": float(ttft_p99),
+            "p50_itl_ms": float(itl_p50),
+            "p99_itl_ms": float(itl_p99),
+        }
+
+    def print_snapshot(self) -> None:
+        s = self._snapshot
+        done = (f"{s['completed']}/{s['total']}"
+                if s["total"] is not None else f"{s['completed']}")
+        line = (f"[{s['elapsed_s']:7.1f}s] in-flight {s['in_flight']} | "
+                f"done {done} failed {s['failed']} | "
+                f"{s['request_throughput']:.2f} req/s "
+                f"{s['output_throughput']:.1f} tok/s | TTFT p50/p99 "
+                f"{s['p50_ttft_ms']:.1f}/{s['p99_ttft_ms']:.1f} ms | ITL "
+                f"p50/p99 {s['p50_itl_ms']:.1f}/{s['p99_itl_ms']:.1f} ms")
+        # Print above the progress bar rather than through it.
+        if self.pbar is not None:
+            self.pbar.write(line)
+        else:
+            print(line, flush=True)
+
+    async def _handle_live(self, request: web.Request) -> web.Response:
+        return web.Response(text=json.dumps(self._snapshot),
+                            content_type="application/json")
@@ -0,0 +1,117 @@
+# SPDX-License-Identifier: Apache-2.0
+r"""Time-varying load profiles for `benchmark_serving.py --load-profile`.
+
+A load profile is a JSON or YAML list of segments that are run back to back
+in a single benchmark, e.g. a concurrency staircase:
+
+    [
+        {"duration": 60, "max_concurrency": 1},
+        {"duration": 60, "max_concurrency": 4},
+        {"duration": 60, "max_concurrency": 16},
+        {"duration": 60, "max_concurrency": 64, "warmup_seconds": 10}
+    ]
+
+Each segment takes the keys:
+    duration:           length of the segment in seconds (required).
+    request_rate:       arrival rate in requests/s. Defaults to inf, i.e.
+                        `max_concurrency` clients send back to back.
+    final_request_rate: ramp the arrival rate linearly from `request_rate`
+                        to this value over the segment.
+    max_concurrency:    maximum number of requests in flight.
+    burstiness:         burstiness of the arrivals, defaults to --burstiness.
+    warmup_seconds:     leave the first seconds of the segment out of its
+                        metrics.
+
+Steps and staircases are sequences of constant segments; ramps and diurnal
+patterns are sequences of ramped segments. The profile may also be an
+object with the list under "segments".
+"""
+import json
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Optional
+
+
+@dataclass
+class LoadSegment:
+    duration: float
+    request_rate: float = float("inf")
+    final_request_rate: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    burstiness: float = 1.0
+    warmup_seconds: float = 0.0
+
+    @property
+    def is_closed_loop(self) -> bool:
+        return self.request_rate == float("inf")
+
+    def to_dict(self) -> dict[str, Any]:
+        # Keep the saved profile valid JSON, which has no infinity.
+        segment = asdict(self)
+        if self.is_closed_loop:
+            segment["request_rate"] = "inf"
+        return segment
+
+    def validate(self) -> None:
+        if self.duration <= 0:
+            raise ValueError(
+                f"Segment duration must be positive, got {self.duration}.")
+        if not 0 <= self.warmup_seconds < self.duration:
+            raise ValueError(
+                f"Segment warmup ({self.warmup_seconds}s) must be shorter "
+                f"than the segment ({self.duration}s).")
+        if self.is_closed_loop and not self.max_concurrency:
+            raise ValueError(
+                "A segment with an infinite request rate needs "
+                "max_concurrency to bound the number of clients.")
+        if self.final_request_rate is not None:
+            if self.is_closed_loop or self.final_request_rate == float("inf"):
+                raise ValueError("Ramped segments need finite request rates.")
+            if self.request_rate + self.final_request_rate <= 0:
+                raise ValueError("A ramped segment must send requests.")
+        if self.burstiness <= 0:
+            raise ValueError(
+                "A positive burstiness factor is expected, but given "
+                f"{self.burstiness}.")
+
+
+def _load_spec(path: str) -> Any:
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError(
+                    "Please install PyYAML to load YAML load profiles: "
+                    "pip install pyyaml") from e
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def load_load_profile(path: str,
+                      default_burstiness: float = 1.0) -> list[LoadSegment]:
+    """Load and validate the segments of the load profile at `path`."""
+    spec = _load_spec(path)
+    if isinstance(spec, dict):
+        spec = spec.get("segments")
+    if not isinstance(spec, list) or not spec:
+        raise ValueError(
+            f"Load profile {path} must be a non-empty list of segments.")
+
+    known_keys = {field.name for field in fields(LoadSegment)}
+    segments = []
+    for i, item in enumerate(spec):
+        unknown_keys = set(item) - known_keys
+        if unknown_keys:
+            raise ValueError(f"Unknown keys in segment {i} of {path}: "
+                             f"{sorted(unknown_keys)}")
+        item = {"burstiness": default_burstiness, **item}
+        segment = LoadSegment(**item)
+        segment.request_rate = float(segment.request_rate)
+        if segment.final_request_rate is not None:
+            segment.final_request_rate = float(segment.final_request_rate)
+        try:
+            segment.validate()
+        except ValueError as e:
+            raise ValueError(f"Segment {i} of {path}: {e}") from e
+        segments.append(segment)
+    return segments
@@ -1,61 +1,200 @@
 # making the client vllm free
 # SPDX-License-Identifier: Apache-2.0
 
-import json
+import asyncio
+import contextlib
 import os
 import sys
 import time
 import traceback
-from dataclasses import dataclass, field
+from array import array
+from collections.abc import AsyncIterator
 from typing import Optional, Union
 
 import aiohttp
 import huggingface_hub.constants
+from sse_parser import DONE_PAYLOAD, iter_sse_data, json_loads
 from tqdm.asyncio import tqdm
 from transformers import (AutoTokenizer, PreTrainedTokenizer,
                           PreTrainedTokenizerFast)
 
 AIOHTTP_TIMEOUT = aiohttp.ClientTimeout(total=6 * 60 * 60)
+# aiohttp keeps idle pooled connections for 15s by default.
+DEFAULT_KEEPALIVE_TIMEOUT = 15.0
+DEFAULT_DNS_CACHE_TTL = 300
+NANOSECONDS_PER_SECOND = 1e9
 
 
-@dataclass
 class RequestFuncInput:
-    prompt: str
-    api_url: str
-    prompt_len: int
-    output_len: int
-    model: str
-    model_name: Optional[str] = None
-    best_of: int = 1
-    logprobs: Optional[int] = None
-    extra_body: Optional[dict] = None
-    multi_modal_content: Optional[dict] = None
-    ignore_eos: bool = False
-
-
-@dataclass
+    __slots__ = ("prompt", "api_url", "prompt_len", "output_len", "model",
+                 "model_name", "best_of", "logprobs", "extra_body",
+                 "multi_modal_content", "ignore_eos")
+
+    def __init__(
+        self,
+        prompt: str,
+        api_url: str,
+        prompt_len: int,
+        output_len: int,
+        model: str,
+        model_name: Optional[str] = None,
+        best_of: int = 1,
+        logprobs: Optional[int] = None,
+        extra_body: Optional[dict] = None,
+        multi_modal_content: Optional[dict] = None,
+        ignore_eos: bool = False,
+    ):
+        self.prompt = prompt
+        self.api_url = api_url
+        self.prompt_len = prompt_len
+        self.output_len = output_len
+        self.model = model
+        self.model_name = model_name
+        self.best_of = best_of
+        self.logprobs = logprobs
+        self.extra_body = extra_body
+        self.multi_modal_content = multi_modal_content
+        self.ignore_eos = ignore_eos
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}"
+                           for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
 class RequestFuncOutput:
-    generated_text: str = ""
-    success: bool = False
-    latency: float = 0.0
-    output_tokens: int = 0
-    ttft: float = 0.0  # Time to first token
-    itl: list[float] = field(
-        default_factory=list)  # list of inter-token latencies
-    tpot: float = 0.0  # avg next-token latencies
-    prompt_len: int = 0
-    error: str = ""
+    """
+    The timings of one request. Slotted, and the inter-token latencies are
+    kept as a contiguous array of `time.perf_counter_ns()` deltas (8 bytes
+    per token instead of a list of boxed floats), so the memory held per
+    completed request is bounded by its output length.
+    """
+    __slots__ = ("generated_text", "success", "latency", "output_tokens",
+                 "ttft", "itl_ns", "tpot", "prompt_len", "error",
+                 "scheduled_time", "dispatch_time", "start_time")
+
+    def __init__(
+        self,
+        generated_text: str = "",
+        success: bool = False,
+        latency: float = 0.0,
+        output_tokens: Optional[int] = None,
+        ttft: float = 0.0,
+        itl_ns: Optional[array] = None,
+        tpot: float = 0.0,
+        prompt_len: int = 0,
+        error: str = "",
+        scheduled_time: float = 0.0,
+        dispatch_time: float = 0.0,
+        start_time: float = 0.0,
+    ):
+        self.generated_text = generated_text
+        self.success = success
+        self.latency = latency
+        # None if the server does not report it (TGI, TensorRT-LLM,
+        # DeepSpeed-MII), then calculate_metrics tokenizes the output.
+        self.output_tokens = output_tokens
+        self.ttft = ttft  # Time to first token
+        # Inter-token latencies in nanoseconds. Unsigned 64 bit, as 32 bit
+        # would overflow on gaps longer than 4.3s.
+        self.itl_ns = itl_ns if itl_ns is not None else array("Q")
+        self.tpot = tpot  # avg next-token latencies
+        self.prompt_len = prompt_len
+        self.error = error
+        # Absolute time.perf_counter() timestamps of the arrival schedule:
+        # when the request was due, when the scheduler released it and
+        # when it was actually sent.
+        self.scheduled_time = scheduled_time
+        self.dispatch_time = dispatch_time
+        self.start_time = start_time
+
+    @property
+    def itl(self) -> list[float]:
+        """Inter-token latencies in seconds."""
+        return [itl_ns / NANOSECONDS_PER_SECOND for itl_ns in self.itl_ns]
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}"
+                           for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+def create_client_session(
+    connection_limit: int = 0,
+    keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+    dns_cache_ttl: Optional[int] = DEFAULT_DNS_CACHE_TTL,
+) -> aiohttp.ClientSession:
+    """
+    Create a pooled session to be shared by all requests of a benchmark run.
+
+    Args:
+        connection_limit:
+            Maximum number of simultaneous connections. 0 means unlimited.
+        keepalive_timeout:
+            Seconds an idle connection is kept in the pool for reuse.
+        dns_cache_ttl:
+            Seconds a resolved host is cached. None caches forever.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=connection_limit,
+        keepalive_timeout=keepalive_timeout,
+        use_dns_cache=True,
+        ttl_dns_cache=dns_cache_ttl,
+    )
+    return aiohttp.ClientSession(connector=connector,
+                                 trust_env=True,
+                                 timeout=AIOHTTP_TIMEOUT)
+
+
+async def warmup_client_session(
+    session: aiohttp.ClientSession,
+    url: str,
+    num_connections: int,
+) -> int:
+    """
+    Open `num_connections` pooled connections ahead of the measured run by
+    issuing concurrent GET requests to `url`. The response status does not
+    matter, only that the connection is established and kept alive.
+
+    Returns the number of requests that got a response.
+    """
+
+    async def _touch() -> bool:
+        try:
+            async with session.get(url) as response:
+                await response.read()
+            return True
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    results = await asyncio.gather(*(_touch()
+                                     for _ in range(num_connections)))
+    return sum(results)
+
+
+@contextlib.asynccontextmanager
+async def _client_session(
+    session: Optional[aiohttp.ClientSession],
+) -> AsyncIterator[aiohttp.ClientSession]:
+    # Reuse the shared session if one is given, otherwise open (and tear
+    # down) a dedicated one so the request pays for its own connection.
+    if session is not None:
+        yield session
+        return
+    async with aiohttp.ClientSession(trust_env=True,
+                                     timeout=AIOHTTP_TIMEOUT) as new_session:
+        yield new_session
 
 
 async def async_request_tgi(
     request_func_input: RequestFuncInput,
     pbar: Optional[tqdm] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith("generate_stream")
 
-    async with aiohttp.ClientSession(trust_env=True,
-                                     timeout=AIOHTTP_TIMEOUT) as session:
+    async with _client_session(session) as session:
         params = {
             "best_of": request_func_input.best_of,
             "max_new_tokens": request_func_input.output_len,
@@ -73,38 +212,33 @@ async def async_request_tgi(
         output.prompt_len = request_func_input.prompt_len
 
         ttft = 0.0
-        st = time.perf_counter()
+        st = time.perf_counter_ns()
+        output.start_time = st / NANOSECONDS_PER_SECOND
         most_recent_timestamp = st
         try:
             async with session.post(url=api_url, json=payload) as response:
                 if response.status == 200:
-                    async for chunk_bytes in response.content:
-                        chunk_bytes = chunk_bytes.strip()
-                        if not chunk_bytes:
-                            continue
-                        chunk_bytes = chunk_bytes.decode("utf-8")
-
-                        # NOTE: Sometimes TGI returns a ping response without
-                        # any data, we should skip it.
-                        if chunk_bytes.startswith(":"):
-                            continue
-                        chunk = chunk_bytes.removeprefix("data:")
-
-                        data = json.loads(chunk)
-                        timestamp = time.perf_counter()
-                        # First token
-                        if ttft == 0.0:
-                            ttft = time.perf_counter() - st
-                            output.ttft = ttft
-
-                        # Decoding phase
-                        else:
-                            output.itl.append(timestamp -
-                                              most_recent_timestamp)
-
-                        most_recent_timestamp = timestamp
-
-                    output.latency = most_recent_timestamp - st
+                    # NOTE: Sometimes TGI returns a ping response without
+                    # any data, the SSE parser skips it.
+                    async for payloads in iter_sse_data(response.content):
+                        timestamp = time.perf_counter_ns()
+                        for payload in payloads:
+                            data = json_loads(payload)
+                            # First token
+                            if ttft == 0.0:
+                                ttft = ((timestamp - st) /
+                                        NANOSECONDS_PER_SECOND)
+                                output.ttft = ttft
+
+                            # Decoding phase
+                            else:
+                                output.itl_ns.append(timestamp -
+                                                     most_recent_timestamp)
+
+                            most_recent_timestamp = timestamp
+
+                    output.latency = ((most_recent_timestamp - st) /
+                                      NANOSECONDS_PER_SECOND)
                     output.success = True
                     output.generated_text = data["generated_text"]
                 else:
@@ -123,12 +257,12 @@ async def async_request_tgi(
 async def async_request_trt_llm(
     request_func_input: RequestFuncInput,
     pbar: Optional[tqdm] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith("generate_stream")
 
-    async with aiohttp.ClientSession(trust_env=True,
-                                     timeout=AIOHTTP_TIMEOUT) as session:
+    async with _client_session(session) as session:
         assert request_func_input.best_of == 1
         payload = {
             "accumulate_tokens": True,
@@ -144,35 +278,34 @@ async def async_request_trt_llm(
         output.prompt_len = request_func_input.prompt_len
 
         ttft = 0.0
-        st = time.perf_counter()
+        st = time.perf_counter_ns()
+        output.start_time = st / NANOSECONDS_PER_SECOND
         most_recent_timestamp = st
         try:
             async with session.post(url=api_url, json=payload) as response:
                 if response.status == 200:
-                    async for chunk_bytes in response.content:
-                        chunk_bytes = chunk_bytes.strip()
-                        if not chunk_bytes:
-                            continue
-
-                        chunk = chunk_bytes.decode("utf-8").removeprefix(
-                            "data:")
-
-                        data = json.loads(chunk)
-                        output.generated_text += data["text_output"]
-                        timestamp = time.perf_counter()
-                        # First token
-                        if ttft == 0.0:
-                            ttft = timestamp - st
-                            output.ttft = ttft
-
-                        # Decoding phase
-                        else:
-                            output.itl.append(timestamp -
-                                              most_recent_timestamp)
-
-                        most_recent_timestamp = timestamp
-
-                    output.latency = most_recent_timestamp - st
+                    text_chunks: list[str] = []
+                    async for payloads in iter_sse_data(response.content):
+                        timestamp = time.perf_counter_ns()
+                        for payload in payloads:
+                            data = json_loads(payload)
+                            text_chunks.append(data["text_output"])
+                            # First token
+                            if ttft == 0.0:
+                                ttft = ((timestamp - st) /
+                                        NANOSECONDS_PER_SECOND)
+                                output.ttft = ttft
+
+                            # Decoding phase
+                            else:
+                                output.itl_ns.append(timestamp -
+                                                     most_recent_timestamp)
+
+                            most_recent_timestamp = timestamp
+
+                    output.generated_text = "".join(text_chunks)
+                    output.latency = ((most_recent_timestamp - st) /
+                                      NANOSECONDS_PER_SECOND)
                     output.success = True
 
                 else:
@@ -191,9 +324,9 @@ async def async_request_trt_llm(
 async def async_request_deepspeed_mii(
     request_func_input: RequestFuncInput,
     pbar: Optional[tqdm] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> RequestFuncOutput:
-    async with aiohttp.ClientSession(trust_env=True,
-                                     timeout=AIOHTTP_TIMEOUT) as session:
+    async with _client_session(session) as session:
         assert request_func_input.best_of == 1
 
         payload = {
@@ -210,13 +343,15 @@ async def async_request_deepspeed_mii(
         # See https://github.com/microsoft/DeepSpeed-MII/pull/311
         output.ttft = 0
 
-        st = time.perf_counter()
+        st = time.perf_counter_ns()
+        output.start_time = st / NANOSECONDS_PER_SECOND
         try:
             async with session.post(url=request_func_input.api_url,
                                     json=payload) as response:
                 if response.status == 200:
                     parsed_resp = await response.json()
-                    output.latency = time.perf_counter() - st
+                    output.latency = ((time.perf_counter_ns() - st) /
+                                      NANOSECONDS_PER_SECOND)
                     output.generated_text = parsed_resp["text"][0]
                     output.success = True
                 else:
@@ -235,14 +370,14 @@ async def async_request_deepspeed_mii(
 async def async_request_openai_completions(
     request_func_input: RequestFuncInput,
     pbar: Optional[tqdm] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith(
         ("completions", "profile")
     ), "OpenAI Completions API URL must end with 'completions' or 'profile'."
 
-    async with aiohttp.ClientSession(trust_env=True,
-                                     timeout=AIOHTTP_TIMEOUT) as session:
+    async with _client_session(session) as session:
         payload = {
             "model": request_func_input.model_name \
                 if request_func_input.model_name else request_func_input.model,
@@ -267,24 +402,22 @@ async def async_request_openai_completions(
         output = RequestFuncOutput()
         output.prompt_len = request_func_input.prompt_len
 
-        generated_text = ""
+        text_chunks: list[str] = []
         token_count = 0
-        st = time.perf_counter()
+        st = time.perf_counter_ns()
+        output.start_time = st / NANOSECONDS_PER_SECOND
         most_recent_timestamp = st
         try:
             async with session.post(url=api_url, json=payload,
                                     headers=headers) as response:
                 if response.status == 200:
                     first_chunk_received = False
-                    async for chunk_bytes in response.content:
-                        chunk_bytes = chunk_bytes.strip()
-                        if not chunk_bytes:
-                            continue
-
-                        chunk = chunk_bytes.decode("utf-8").removeprefix(
-                            "data: ")
-                        if chunk != "[DONE]":
-                            data = json.loads(chunk)
+                    async for payloads in iter_sse_data(response.content):
+                        timestamp = time.perf_counter_ns()
+                        for payload in payloads:
+                            if payload == DONE_PAYLOAD:
+                                continue
+                            data = json_loads(payload)
 
                             # NOTE: Some completion API might have a last
                             # usage summary response without a token so we
@@ -293,21 +426,21 @@ async def async_request_openai_completions(
                                 # Note that text could be empty here
                                 # e.g. for special tokens
                                 text = choices[0].get("text")
-                                timestamp = time.perf_counter()
                                 # First token
                                 if not first_chunk_received:
                                     first_chunk_received = True
-                                    ttft = time.perf_counter() - st
+                                    ttft = ((timestamp - st) /
+                                            NANOSECONDS_PER_SECOND)
                                     output.ttft = ttft
 
                                 # Decoding phase
                                 else:
-                                    output.itl.append(timestamp -
-                                                      most_recent_timestamp)
+                                    output.itl_ns.append(timestamp -
+                                                         most_recent_timestamp)
 
                                 most_recent_timestamp = timestamp
-                                generated_text += text or ""
                                 if text:
+                                    text_chunks.append(text)
                                     token_count += 1
                             elif usage := data.get("usage"):
                                 output.output_tokens = usage.get(
@@ -319,8 +452,9 @@ async def async_request_openai_completions(
                         output.error = (
                             "Never received a valid chunk to calculate TTFT."
                             "This response will be marked as failed!")
-                    output.generated_text = generated_text
-                    output.latency = most_recent_timestamp - st
+                    output.generated_text = "".join(text_chunks)
+                    output.latency = ((most_recent_timestamp - st) /
+                                      NANOSECONDS_PER_SECOND)
                 else:
                     output.error = response.reason or ""
                     output.success = False
@@ -338,16 +472,14 @@ async def async_request_openai_completions(
 async def async_request_openai_chat_completions(
     request_func_input: RequestFuncInput,
     pbar: Optional[tqdm] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith(
         "chat/completions"
     ), "OpenAI Chat Completions API URL must end with 'chat/completions'."
 
-    print(f'*** in openai_chat_completions request_func_input prompt: {request_func_input.prompt}')
-
-    async with aiohttp.ClientSession(trust_env=True,
-                                     timeout=AIOHTTP_TIMEOUT) as session:
+    async with _client_session(session) as session:
         content = [{"type": "text", "text": request_func_input.prompt}]
         if request_func_input.multi_modal_content:
             content.append(request_func_input.multi_modal_content)
@@ -377,42 +509,39 @@ async def async_request_openai_chat_completions(
         }
 
         output = RequestFuncOutput()
-        print(f'*** output: {output}')
         output.prompt_len = request_func_input.prompt_len
 
-        generated_text = ""
+        text_chunks: list[str] = []
         ttft = 0.0
-        st = time.perf_counter()
+        st = time.perf_counter_ns()
+        output.start_time = st / NANOSECONDS_PER_SECOND
         most_recent_timestamp = st
         try:
             async with session.post(url=api_url, json=payload,
                                     headers=headers) as response:
                 if response.status == 200:
-                    async for chunk_bytes in response.content:
-                        chunk_bytes = chunk_bytes.strip()
-                        if not chunk_bytes:
-                            continue
-
-                        chunk = chunk_bytes.decode("utf-8").removeprefix(
-                            "data: ")
-                        if chunk != "[DONE]":
-                            timestamp = time.perf_counter()
-                            data = json.loads(chunk)
+                    async for payloads in iter_sse_data(response.content):
+                        timestamp = time.perf_counter_ns()
+                        for payload in payloads:
+                            if payload == DONE_PAYLOAD:
+                                continue
+                            data = json_loads(payload)
 
                             if choices := data.get("choices"):
                                 content = choices[0]["delta"].get("content")
                                 # First token
                                 if ttft == 0.0:
-                                    ttft = timestamp - st
+                                    ttft = ((timestamp - st) /
+                                            NANOSECONDS_PER_SECOND)
                                     output.ttft = ttft
 
                                 # Decoding phase
                                 else:
-                                    print(f'entered decoding phase, token generated: {content}')
-                                    output.itl.append(timestamp -
-                                                      most_recent_timestamp)
+                                    output.itl_ns.append(timestamp -
+                                                         most_recent_timestamp)
 
-                                generated_text += content or ""
+                                if content:
+                                    text_chunks.append(content)
                                 # TODO: check if this is correct where is the output_tokens counted?
                             elif usage := data.get("usage"):
                                 output.output_tokens = usage.get(
@@ -420,10 +549,10 @@ async def async_request_openai_chat_completions(
 
                             most_recent_timestamp = timestamp
 
-                    output.generated_text = generated_text
-                    print(f'generated_text: {generated_text}')
+                    output.generated_text = "".join(text_chunks)
                     output.success = True
-                    output.latency = most_recent_timestamp - st
+                    output.latency = ((most_recent_timestamp - st) /
+                                      NANOSECONDS_PER_SECOND)
                 else:
                     output.error = response.reason or ""
                     output.success = False
@@ -431,10 +560,8 @@ async def async_request_openai_chat_completions(
             output.success = False
             exc_info = sys.exc_info()
             output.error = "".join(traceback.format_exception(*exc_info))
-    print(f'*** output: {output}')
     if pbar:
         pbar.update(1)
-    print(f'*** output post pbar.update: {output}')
     return output
 
 
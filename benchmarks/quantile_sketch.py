@@ -0,0 +1,205 @@
+# SPDX-License-Identifier: Apache-2.0
+"""Mergeable streaming quantile sketches of the request latencies.
+
+With `benchmark_serving.py --metrics-mode sketch`, the TTFT, ITL and E2EL
+of every request are added to a log-bucketed histogram as the request
+completes, and its per-token ITL array and generated text are released,
+so that only a small fixed-size record per request is kept. The
+histograms have a fixed size whatever the length of the run, are merged
+across the worker processes of a sharded run and can be snapshotted while
+the run goes on.
+
+`LogHistogram` buckets the values on a logarithmic scale of base
+`gamma = (1 + a) / (1 - a)`, like DDSketch, so that every quantile is
+reported with a relative error of at most `a` (the relative accuracy,
+1% by default). The count, sum and sum of squares are exact, so the mean
+and standard deviation are too.
+"""
+import math
+from array import array
+from functools import lru_cache
+from typing import Any, Optional
+
+import numpy as np
+
+NANOSECONDS_PER_SECOND = 1e9
+
+# Percentiles of a sketch snapshot.
+SNAPSHOT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+@lru_cache
+def _bucket_values(relative_accuracy: float, offset: int,
+                   num_buckets: int) -> np.ndarray:
+    # Bucket i holds (gamma^(k-1), gamma^k] with k = i + offset; its value
+    # 2 gamma^k / (gamma + 1) is within the relative accuracy of every
+    # value in it.
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    return (2 * np.power(gamma,
+                         np.arange(num_buckets) + offset) / (gamma + 1))
+
+
+class LogHistogram:
+    """
+    A histogram of positive values in seconds with logarithmic buckets
+    between `min_value` and `max_value`. Values outside the range are
+    counted in the first or last bucket; the exact minimum and maximum
+    bound the reported quantiles.
+    """
+
+    def __init__(self,
+                 relative_accuracy: float = 0.01,
+                 min_value: float = 1e-6,
+                 max_value: float = 3600.0):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("The relative accuracy must be in (0, 1), got "
+                             f"{relative_accuracy}.")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        num_buckets = (math.ceil(math.log(max_value) / self._log_gamma) -
+                       self._offset + 1)
+        self.counts = np.zeros(num_buckets, dtype=np.int64)
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = math.ceil(math.log(value) / self._log_gamma) - self._offset
+        return min(index, len(self.counts) - 1)
+
+    def add(self, value: float) -> None:
+        self.counts[self._bucket(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.sum_sq += value * value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def add_many(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        values = np.asarray(values, dtype=np.float64)
+        with np.errstate(divide="ignore"):
+            indices = (np.ceil(np.log(values) / self._log_gamma) -
+                       self._offset)
+        indices = np.clip(np.nan_to_num(indices, neginf=0), 0,
+                          len(self.counts) - 1).astype(np.int64)
+        self.counts += np.bincount(indices, minlength=len(self.counts))
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.sum_sq += float(np.dot(values, values))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "LogHistogram") -> None:
+        if (other.relative_accuracy != self.relative_accuracy
+                or len(other.counts) != len(self.counts)):
+            raise ValueError("Cannot merge histograms with different "
+                             "buckets.")
+        self.counts += other.counts
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        if not self.count:
+            return 0.0
+        return math.sqrt(max(self.sum_sq / self.count - self.mean**2, 0.0))
+
+    def percentiles(self, percentiles) -> np.ndarray:
+        """The given percentiles (0-100), 0 for an empty histogram."""
+        percentiles = np.asarray(percentiles, dtype=np.float64)
+        if not self.count:
+            return np.zeros(len(percentiles))
+        # The value of rank q (count - 1), as np.percentile's "lower".
+        ranks = np.floor(percentiles / 100 * (self.count - 1))
+        indices = np.searchsorted(np.cumsum(self.counts), ranks, side="right")
+        values = _bucket_values(self.relative_accuracy, self._offset,
+                                len(self.counts))
+        return np.clip(values[indices], self.min, self.max)
+
+    def snapshot(self) -> dict[str, Any]:
+        """The count, mean and `SNAPSHOT_PERCENTILES` in milliseconds."""
+        snapshot = {"count": self.count, "mean_ms": self.mean * 1000}
+        for p, value in zip(SNAPSHOT_PERCENTILES,
+                            self.percentiles(SNAPSHOT_PERCENTILES)):
+            snapshot[f"p{p:g}_ms"] = float(value) * 1000
+        return snapshot
+
+
+class MetricSketches:
+    """
+    The TTFT, ITL and E2EL histograms of the successful requests sent in
+    the measurement window `[window_start, window_end)`, in seconds from
+    the start of the run.
+    """
+
+    METRICS = ("ttft", "itl", "e2el")
+
+    def __init__(self,
+                 relative_accuracy: float = 0.01,
+                 window_start: float = 0.0,
+                 window_end: Optional[float] = None):
+        self.relative_accuracy = relative_accuracy
+        self.window_start = window_start
+        self.window_end = window_end if window_end is not None else math.inf
+        self.histograms = {
+            name: self.new_histogram()
+            for name in self.METRICS
+        }
+
+    def new_histogram(self) -> LogHistogram:
+        return LogHistogram(self.relative_accuracy)
+
+    @classmethod
+    def merge_all(cls, sketches: list["MetricSketches"]) -> "MetricSketches":
+        """Combine the sketches of the workers of a sharded run."""
+        merged = cls(sketches[0].relative_accuracy, sketches[0].window_start,
+                     sketches[0].window_end)
+        for sketch in sketches:
+            for name, histogram in sketch.histograms.items():
+                merged.histograms[name].merge(histogram)
+        return merged
+
+    def record(self, output, start_time: float) -> None:
+        """
+        Add a completed request of a run started at `start_time`, and
+        release its per-token ITL array and all but the last line of its
+        error. Its generated text is released too, unless it succeeded and
+        its server did not report usage: those texts are counted with the
+        tokenizer in one batch after the run.
+        """
+        if output.success and (self.window_start <= output.start_time -
+                               start_time < self.window_end):
+            self.histograms["ttft"].add(output.ttft)
+            self.histograms["e2el"].add(output.latency)
+            self.histograms["itl"].add_many(
+                np.frombuffer(output.itl_ns, dtype=np.uint64) /
+                NANOSECONDS_PER_SECOND)
+        output.itl_ns = array("Q")
+        if not output.success or output.output_tokens is not None:
+            output.generated_text = ""
+        output.error = output.error.rstrip().rsplit("\n", 1)[-1]
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        return {
+            name: histogram.snapshot()
+            for name, histogram in self.histograms.items()
+        }
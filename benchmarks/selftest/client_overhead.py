@@ -0,0 +1,385 @@
+# SPDX-License-Identifier: Apache-2.0
+r"""Measure the overhead and the timing error of the benchmark client.
+
+Runs `benchmark()` in-process against the fake server (fake_server.py)
+over a grid of concurrency levels and output lengths, and compares the
+token timestamps the client measured with the times the server wrote the
+tokens. For every point it reports
+    - the request and SSE event rates the client sustained, and the same
+      rates per second of client CPU time, i.e. per core,
+    - the error of the client TTFTs versus the ground truth, i.e. the
+      time from sending a request to its first token against the time from
+      its arrival at the server to the server writing its first token,
+    - the error of the timestamps of the next tokens versus the ground
+      truth, relative to the first token on either side, which is the
+      error of the measured ITLs and TPOTs,
+    - the client memory per in-flight request (peak RSS growth),
+    - how late the fake server was on its own schedule.
+
+A point passes if its p99 token timestamp error is within --max-error-ms
+and its p99 TTFT error within --max-ttft-error-ms. The
+highest concurrency up to which every point passes is the highest at
+which published numbers of this client can be trusted. The suite exits
+with status 1 if a point at or below --min-trusted-concurrency fails.
+
+Usage:
+    python benchmarks/selftest/client_overhead.py \
+        --tokenizer meta-llama/Meta-Llama-3-8B-Instruct \
+        --concurrency 1,4,16,64,256,1024 \
+        --output-lens 128,1024,4096
+
+The fake server runs in its own process. Pass --base-url to use one that
+is already running, e.g. pinned to other cores with taskset.
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import time
+import urllib.request
+from typing import Any, Optional
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from server_manager import ServerManager  # noqa: E402
+from sweep_spec import ServerLaunch, SweepConfig  # noqa: E402
+
+
+def _http(base_url: str, path: str, method: str = "GET") -> Any:
+    request = urllib.request.Request(base_url + path, method=method)
+    with urllib.request.urlopen(request) as response:
+        body = response.read()
+    return json.loads(body) if method == "GET" else None
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+async def _track_peak_rss(peak: list[int], interval: float = 0.02) -> None:
+    while True:
+        peak[0] = max(peak[0], _rss_bytes() or 0)
+        await asyncio.sleep(interval)
+
+
+def timestamp_errors(
+        result: dict[str, Any],
+        ground_truth: list[dict[str, Any]]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The client minus the server TTFT of the requests that completed on both
+    sides, and the client minus the server time of each of their next
+    tokens since their first token, in seconds. Requests are matched by
+    their first token, "req<id>".
+    """
+    records = {
+        record["id"]: record
+        for record in ground_truth if record["status"] == "ok"
+    }
+    ttft_errors = []
+    token_errors = []
+    for text, ttft, itl in zip(result["generated_texts"], result["ttfts"],
+                               result["itls"]):
+        if not text.startswith("req"):
+            continue
+        record = records.get(int(text[3:].split(" ", 1)[0]))
+        if record is None or len(itl) + 1 != len(record["token_ns"]):
+            continue
+        token_ns = np.array(record["token_ns"])
+        ttft_errors.append(ttft - (token_ns[0] - record["arrival_ns"]) / 1e9)
+        token_errors.append(
+            np.cumsum(itl) - (token_ns[1:] - token_ns[0]) / 1e9)
+    return (np.array(ttft_errors),
+            np.concatenate(token_errors) if token_errors else np.zeros(0))
+
+
+def start_fake_server(stack: contextlib.ExitStack, port: int, log_dir: str,
+                      options: str = "") -> str:
+    """
+    Start fake_server.py with `options` on `port` until `stack` closes,
+    and return its URL once it is ready.
+    """
+    command = (f"{sys.executable} "
+               f"{os.path.join(BENCHMARKS_DIR, 'fake_server.py')} "
+               f"--port {port} {options}")
+    launch = ServerLaunch(command=command,
+                          health_path="/health",
+                          ready_timeout_seconds=60.0,
+                          poll_interval_seconds=0.2)
+    config = SweepConfig(model_name="fake",
+                         model="fake",
+                         tokenizer=None,
+                         server={"port": port},
+                         dataset={},
+                         input_len=None,
+                         output_len=None,
+                         request_rate=float("inf"),
+                         concurrency=None,
+                         num_prompts=0,
+                         repetition=0,
+                         results_dir=log_dir,
+                         result_filename="",
+                         launch_command=command)
+    stack.enter_context(ServerManager(launch)).start(config)
+    return f"http://127.0.0.1:{port}"
+
+
+def _percentile(values: np.ndarray, q: float) -> float:
+    return float(np.percentile(values, q)) if len(values) else float("inf")
+
+
+async def run_point(serving, tokenizer, args: argparse.Namespace,
+                    base_url: str, concurrency: int,
+                    output_len: int) -> dict[str, Any]:
+    num_prompts = max(concurrency * args.waves, args.min_prompts)
+    prompt = "hi " * args.input_len
+    input_requests = [(prompt, args.input_len, output_len, None)
+                      ] * num_prompts
+    _http(base_url, "/ground_truth", method="DELETE")
+
+    peak_rss = [_rss_bytes() or 0]
+    base_rss = peak_rss[0]
+    rss_task = asyncio.create_task(_track_peak_rss(peak_rss))
+    cpu_start = time.process_time()
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(
+                sys.stdout if args.verbose else output):
+            result = await serving.benchmark(
+                backend="openai",
+                api_url=base_url + "/v1/completions",
+                base_url=base_url,
+                model_id="fake",
+                model_name=None,
+                tokenizer=tokenizer,
+                input_requests=input_requests,
+                logprobs=None,
+                best_of=1,
+                request_rate=float("inf"),
+                burstiness=1.0,
+                disable_tqdm=True,
+                profile=False,
+                selected_percentile_metrics=["ttft", "tpot", "itl"],
+                selected_percentiles=[99.0],
+                ignore_eos=True,
+                goodput_config_dict={},
+                max_concurrency=concurrency,
+                lora_modules=None,
+            )
+    finally:
+        cpu_seconds = time.process_time() - cpu_start
+        rss_task.cancel()
+
+    ttft_errors, token_errors = timestamp_errors(
+        result, _http(base_url, "/ground_truth"))
+    ttft_errors_ms = np.abs(ttft_errors) * 1000
+    errors_ms = np.abs(token_errors) * 1000
+    server_stats = _http(base_url, "/stats")
+    duration = result["duration"]
+    events = result["total_output_tokens"]
+    p99_ttft_error_ms = _percentile(ttft_errors_ms, 99)
+    p99_error_ms = _percentile(errors_ms, 99)
+    return {
+        "concurrency": concurrency,
+        "output_len": output_len,
+        "num_prompts": num_prompts,
+        "completed": result["completed"],
+        "duration": duration,
+        "request_throughput": result["completed"] / duration,
+        "event_throughput": events / duration,
+        "client_cpu_seconds": cpu_seconds,
+        "client_cpu_utilization": cpu_seconds / duration,
+        "requests_per_core_second": result["completed"] / cpu_seconds,
+        "events_per_core_second": events / cpu_seconds,
+        "num_matched_requests": len(ttft_errors_ms),
+        "median_ttft_error_ms": _percentile(ttft_errors_ms, 50),
+        "p99_ttft_error_ms": p99_ttft_error_ms,
+        "median_error_ms": _percentile(errors_ms, 50),
+        "p99_error_ms": p99_error_ms,
+        "max_error_ms": _percentile(errors_ms, 100),
+        "rss_kib_per_inflight_request":
+        (peak_rss[0] - base_rss) / 1024 / concurrency,
+        "server_max_lateness_ms": server_stats["max_lateness_ms"],
+        "passed": (p99_error_ms <= args.max_error_ms
+                   and p99_ttft_error_ms <= args.max_ttft_error_ms),
+    }
+
+
+def print_results(points: list[dict[str, Any]],
+                  args: argparse.Namespace) -> Optional[int]:
+    """Print the points and the summary; returns the trusted concurrency."""
+    # Errors and lateness in ms.
+    print("{s:{c}^{n}}".format(s=' Client Self-Overhead ', n=108, c='='))
+    print("{:>6} {:>7} {:>8} {:>9} {:>5} {:>11} {:>9} {:>9} {:>9} {:>9} "
+          "{:>9} {:>4}".format("Conc", "Out len", "Req/s", "Events/s", "CPU",
+                               "Events/core", "p99 TTFT", "p50 tok",
+                               "p99 tok", "KiB/req", "Srv late", "OK"))
+    for point in points:
+        print("{:>6} {:>7} {:>8.1f} {:>9.0f} {:>5.2f} {:>11.0f} {:>9.3f} "
+              "{:>9.3f} {:>9.3f} {:>9.1f} {:>9.2f} {:>4}".format(
+                  point["concurrency"], point["output_len"],
+                  point["request_throughput"], point["event_throughput"],
+                  point["client_cpu_utilization"],
+                  point["events_per_core_second"],
+                  point["p99_ttft_error_ms"], point["median_error_ms"],
+                  point["p99_error_ms"],
+                  point["rss_kib_per_inflight_request"],
+                  point["server_max_lateness_ms"],
+                  "yes" if point["passed"] else "NO"))
+
+    # Trusted up to the first failing concurrency of any output length.
+    trusted = None
+    for concurrency in sorted({point["concurrency"] for point in points}):
+        if not all(point["passed"] for point in points
+                   if point["concurrency"] == concurrency):
+            break
+        trusted = concurrency
+    passed = [point for point in points if point["passed"]]
+    print("-" * 108)
+    print("{:<40} {:<10}".format("Max p99 token timestamp error (ms):",
+                                 f"{args.max_error_ms:g}"))
+    print("{:<40} {:<10}".format("Max p99 TTFT error (ms):",
+                                 f"{args.max_ttft_error_ms:g}"))
+    print("{:<40} {:<10}".format("Trusted up to concurrency:",
+                                 str(trusted)))
+    if passed:
+        best = max(passed, key=lambda point: point["event_throughput"])
+        print("{:<40} {:<10.2f}".format(
+            "Max sustainable requests/s:",
+            max(point["request_throughput"] for point in passed)))
+        print("{:<40} {:<10.0f}".format("Max sustainable SSE events/s:",
+                                        best["event_throughput"]))
+        print("{:<40} {:<10.0f}".format(
+            "SSE events/s per core:",
+            max(point["events_per_core_second"] for point in passed)))
+        print("{:<40} {:<10.0f}".format(
+            "Requests/s per core:",
+            max(point["requests_per_core_second"] for point in passed)))
+    print("=" * 108)
+    return trusted
+
+
+def main(args: argparse.Namespace):
+    print(args)
+    serving = importlib.import_module(args.serving_module)
+    tokenizer = serving.get_tokenizer(args.tokenizer)
+    concurrencies = [int(value) for value in args.concurrency.split(",")]
+    output_lens = [int(value) for value in args.output_lens.split(",")]
+
+    with contextlib.ExitStack() as stack:
+        base_url = args.base_url
+        if base_url is None:
+            base_url = start_fake_server(
+                stack, args.port, args.log_dir,
+                f"--ttft-ms {args.ttft_ms} --tpot-ms {args.tpot_ms} "
+                f"--max-num-seqs {max(concurrencies)}")
+
+        points = []
+        for output_len in output_lens:
+            for concurrency in concurrencies:
+                print(f"Running concurrency {concurrency}, output length "
+                      f"{output_len}")
+                points.append(
+                    asyncio.run(
+                        run_point(serving, tokenizer, args, base_url,
+                                  concurrency, output_len)))
+
+    trusted = print_results(points, args)
+    if args.result_file is not None:
+        with open(args.result_file, "w") as f:
+            json.dump({"points": points, "trusted_concurrency": trusted}, f)
+
+    failed = [
+        point for point in points if not point["passed"]
+        and point["concurrency"] <= args.min_trusted_concurrency
+    ]
+    if failed:
+        print(f"FAILED: the timing error exceeds the thresholds at "
+              f"{len(failed)} points up to concurrency "
+              f"{args.min_trusted_concurrency}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the overhead and timing error of the client.")
+    parser.add_argument("--tokenizer",
+                        type=str,
+                        required=True,
+                        help="Tokenizer passed to benchmark(); the fake "
+                        "server does not use it.")
+    parser.add_argument("--serving-module",
+                        type=str,
+                        default="benchmark_serving",
+                        help="benchmark_serving or "
+                        "pure_client_benchmark_serving.")
+    parser.add_argument("--concurrency",
+                        type=str,
+                        default="1,4,16,64,256,1024",
+                        help="Comma-separated concurrency levels.")
+    parser.add_argument("--output-lens",
+                        type=str,
+                        default="128,1024,4096",
+                        help="Comma-separated output lengths.")
+    parser.add_argument("--input-len", type=int, default=128)
+    parser.add_argument("--waves",
+                        type=int,
+                        default=2,
+                        help="Requests per point, in multiples of the "
+                        "concurrency.")
+    parser.add_argument("--min-prompts",
+                        type=int,
+                        default=16,
+                        help="Minimum number of requests per point.")
+    parser.add_argument("--ttft-ms",
+                        type=str,
+                        default="20",
+                        help="TTFT distribution of the fake server.")
+    parser.add_argument("--tpot-ms",
+                        type=str,
+                        default="10",
+                        help="TPOT distribution of the fake server.")
+    parser.add_argument("--max-error-ms",
+                        type=float,
+                        default=5.0,
+                        help="Maximum p99 error in ms of the token "
+                        "timestamps since the first token of a passing "
+                        "point.")
+    parser.add_argument("--max-ttft-error-ms",
+                        type=float,
+                        default=10.0,
+                        help="Maximum p99 TTFT error in ms of a passing "
+                        "point.")
+    parser.add_argument("--min-trusted-concurrency",
+                        type=int,
+                        default=256,
+                        help="Fail if a point up to this concurrency does "
+                        "not pass.")
+    parser.add_argument("--base-url",
+                        type=str,
+                        default=None,
+                        help="URL of a running fake server. By default one "
+                        "is started on --port.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--log-dir",
+                        type=str,
+                        default=".",
+                        help="Directory of the fake server log.")
+    parser.add_argument("--result-file",
+                        type=str,
+                        default=None,
+                        help="Save the points and the summary as JSON.")
+    parser.add_argument("--verbose",
+                        action="store_true",
+                        help="Show the output of benchmark().")
+    main(parser.parse_args())
@@ -0,0 +1,150 @@
+# SPDX-License-Identifier: Apache-2.0
+r"""Check the output token counts of every API of the fake server.
+
+The OpenAI APIs report the number of generated tokens. TGI, like
+TensorRT-LLM and DeepSpeed-MII, does not, and `calculate_metrics`
+tokenizes the generated texts instead. For each API this runs
+`benchmark()` in-process against the fake server (fake_server.py) and
+checks that the output length of every request is
+    - with usage, the number of tokens the server generated,
+    - without usage, the number of tokens of its generated text, encoded
+      one text at a time,
+and that no run reports 0 output tokens or a TPOT of 0. The suite exits
+with status 1 if a check fails.
+
+Usage:
+    python benchmarks/selftest/output_tokens.py \
+        --tokenizer meta-llama/Meta-Llama-3-8B-Instruct
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import io
+import sys
+from typing import Any
+
+from client_overhead import start_fake_server
+
+# Backend, endpoint and whether the API reports usage.
+APIS = (
+    ("openai", "/v1/completions", True),
+    ("openai-chat", "/v1/chat/completions", True),
+    ("tgi", "/generate_stream", False),
+)
+
+
+async def run_api(serving, tokenizer, args: argparse.Namespace,
+                  base_url: str, backend: str,
+                  endpoint: str) -> dict[str, Any]:
+    prompt = "hi " * args.input_len
+    input_requests = [(prompt, args.input_len, args.output_len, None)
+                      ] * args.num_prompts
+    output = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+        return await serving.benchmark(
+            backend=backend,
+            api_url=base_url + endpoint,
+            base_url=base_url,
+            model_id="fake",
+            model_name=None,
+            tokenizer=tokenizer,
+            input_requests=input_requests,
+            logprobs=None,
+            best_of=1,
+            request_rate=float("inf"),
+            burstiness=1.0,
+            disable_tqdm=True,
+            profile=False,
+            selected_percentile_metrics=["ttft", "tpot", "itl"],
+            selected_percentiles=[99.0],
+            ignore_eos=True,
+            goodput_config_dict={},
+            max_concurrency=args.num_prompts,
+            lora_modules=None,
+        )
+
+
+def check_output_lens(result: dict[str, Any], tokenizer, reports_usage: bool,
+                      output_len: int) -> list[str]:
+    """The failed checks of a run."""
+    if reports_usage:
+        expected = [output_len] * len(result["output_lens"])
+    else:
+        expected = [
+            len(tokenizer(text, add_special_tokens=False).input_ids)
+            for text in result["generated_texts"]
+        ]
+    failures = []
+    if result["completed"] != len(expected):
+        failures.append(f"{result['completed']}/{len(expected)} requests "
+                        "completed")
+    if result["output_lens"] != expected:
+        failures.append(f"output lengths {result['output_lens']}, "
+                        f"expected {expected}")
+    if not result["total_output_tokens"]:
+        failures.append("0 output tokens")
+    if not result["mean_tpot_ms"]:
+        failures.append("a TPOT of 0")
+    return failures
+
+
+def main(args: argparse.Namespace):
+    print(args)
+    serving = importlib.import_module(args.serving_module)
+    tokenizer = serving.get_tokenizer(args.tokenizer)
+
+    failed = False
+    with contextlib.ExitStack() as stack:
+        base_url = args.base_url
+        if base_url is None:
+            base_url = start_fake_server(stack, args.port, args.log_dir,
+                                         "--ttft-ms 5 --tpot-ms 1")
+        print("{s:{c}^{n}}".format(s=' Output Token Counts ', n=50, c='='))
+        for backend, endpoint, reports_usage in APIS:
+            result = asyncio.run(
+                run_api(serving, tokenizer, args, base_url, backend,
+                        endpoint))
+            failures = check_output_lens(result, tokenizer, reports_usage,
+                                         args.output_len)
+            print("{:<15} {:<10} {:<10} {}".format(
+                backend, "usage" if reports_usage else "tokenizer",
+                result["total_output_tokens"],
+                "OK" if not failures else "FAILED: " + "; ".join(failures)))
+            failed = failed or bool(failures)
+        print("=" * 50)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the output token counts of every API.")
+    parser.add_argument("--tokenizer",
+                        type=str,
+                        required=True,
+                        help="Tokenizer that counts the outputs of the APIs "
+                        "without usage.")
+    parser.add_argument("--serving-module",
+                        type=str,
+                        default="benchmark_serving",
+                        help="benchmark_serving or "
+                        "pure_client_benchmark_serving.")
+    parser.add_argument("--num-prompts", type=int, default=16)
+    parser.add_argument("--input-len", type=int, default=16)
+    parser.add_argument("--output-len", type=int, default=32)
+    parser.add_argument("--base-url",
+                        type=str,
+                        default=None,
+                        help="URL of a running fake server. By default one "
+                        "is started on --port.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--log-dir",
+                        type=str,
+                        default=".",
+                        help="Directory of the fake server log.")
+    parser.add_argument("--verbose",
+                        action="store_true",
+                        help="Show the output of benchmark().")
+    main(parser.parse_args())
@@ -0,0 +1,256 @@
+# SPDX-License-Identifier: Apache-2.0
+r"""Launch, probe and stop the server under test of a benchmark sweep.
+
+With a [launch] table in the sweep spec, the sweep runner starts the server
+command itself instead of assuming that a server is up on localhost:8000:
+
+    [launch]
+    command = "furiosa-llm serve {model} --devices npu:0 --port {port}"
+    health_path = "/v1/models"
+    restart_between_configs = false
+
+The server is polled on its health path until it answers, then sent a
+one-token streaming completion until a token comes back. Both times,
+measured from the launch, are the cold-start metrics of the server:
+    time_to_ready_s:                the health path answered 200.
+    time_to_first_token_s:          the first token of a successful
+                                    completion arrived.
+
+To measure the cold start of a server on its own:
+    python benchmarks/server_manager.py \
+        --command "vllm serve {model} --port {port}" \
+        --model meta-llama/Meta-Llama-3-8B-Instruct --port 8000
+
+or of the fake server, e.g. to try a [launch] table:
+    python benchmarks/server_manager.py --port 8000 \
+        --command "python benchmarks/fake_server.py --port {port}"
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Optional
+
+from sweep_spec import ServerLaunch, SweepConfig
+
+
+def get_base_url(server: dict[str, Any]) -> str:
+    if server.get("base_url"):
+        return server["base_url"].rstrip("/")
+    return (f"http://{server.get('host', '127.0.0.1')}:"
+            f"{server.get('port', 8000)}")
+
+
+def _is_healthy(url: str, timeout: float) -> bool:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status == 200
+    except (OSError, urllib.error.URLError):
+        return False
+
+
+def _stream_first_token(url: str, model: str, timeout: float) -> bool:
+    """Send a one-token streaming completion; whether a token came back."""
+    if url.endswith("chat/completions"):
+        payload = {"messages": [{"role": "user", "content": "Hello"}]}
+    else:
+        payload = {"prompt": "Hello"}
+    payload.update(model=model, max_tokens=1, stream=True)
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[len(b"data:"):].strip()
+                if data == b"[DONE]":
+                    return False
+                if json.loads(data).get("choices"):
+                    return True
+    except (OSError, ValueError, urllib.error.URLError):
+        pass
+    return False
+
+
+class ServerManager:
+    """
+    Runs at most one server process at a time for a sweep. `ensure` starts
+    or restarts the server for the next run as needed and returns the
+    cold-start metrics when it did.
+    """
+
+    def __init__(self, launch: ServerLaunch):
+        self.launch = launch
+        self.process: Optional[subprocess.Popen] = None
+        self.command: Optional[str] = None
+        self._log = None
+
+    def __enter__(self) -> "ServerManager":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def ensure(self, config: SweepConfig) -> Optional[dict[str, Any]]:
+        """
+        Make sure the server of `config` is running, restarting it if its
+        command changed, it died or every run gets a fresh server. Returns
+        the cold-start metrics if the server was (re)started.
+        """
+        if (self.is_running and self.command == config.launch_command
+                and not self.launch.restart_between_configs):
+            return None
+        if self.process is not None:
+            self.stop()
+        return self.start(config)
+
+    def start(self, config: SweepConfig) -> dict[str, Any]:
+        base_url = get_base_url(config.server)
+        health_url = base_url + self.launch.health_path
+        if _is_healthy(health_url, self.launch.poll_interval_seconds):
+            raise RuntimeError(
+                f"A server is already answering on {health_url}. Stop it "
+                "first so that the sweep benchmarks the server it launches.")
+
+        log_path = os.path.join(config.results_dir, self.launch.log_file)
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        self._log = open(log_path, "ab")
+        print(f"Starting server: {config.launch_command}")
+        start = time.perf_counter()
+        # A session of its own, so that stop() reaches the processes the
+        # command spawns.
+        self.process = subprocess.Popen(config.launch_command,
+                                        shell=True,
+                                        stdout=self._log,
+                                        stderr=subprocess.STDOUT,
+                                        env={
+                                            **os.environ,
+                                            **self.launch.env
+                                        },
+                                        start_new_session=True)
+        self.command = config.launch_command
+        deadline = start + self.launch.ready_timeout_seconds
+
+        while not _is_healthy(health_url, self.launch.poll_interval_seconds):
+            self._check_alive(log_path, deadline)
+            time.sleep(self.launch.poll_interval_seconds)
+        time_to_ready = time.perf_counter() - start
+
+        endpoint = config.server.get("endpoint", "/v1/completions")
+        time_to_first_token = None
+        if endpoint.endswith("completions"):
+            while not _stream_first_token(
+                    base_url + endpoint, config.model,
+                    max(deadline - time.perf_counter(), 1.0)):
+                self._check_alive(log_path, deadline)
+                time.sleep(self.launch.poll_interval_seconds)
+            time_to_first_token = time.perf_counter() - start
+
+        cold_start = {
+            "command": config.launch_command,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "time_to_ready_s": time_to_ready,
+            "time_to_first_token_s": time_to_first_token,
+        }
+        print("{:<40} {:<10.2f}".format("Server time to ready (s):",
+                                        time_to_ready))
+        if time_to_first_token is not None:
+            print("{:<40} {:<10.2f}".format("Server time to first token (s):",
+                                            time_to_first_token))
+        return cold_start
+
+    def _check_alive(self, log_path: str, deadline: float) -> None:
+        if self.process.poll() is not None:
+            code = self.process.returncode
+            self.stop()
+            raise RuntimeError(
+                f"The server exited with code {code} before it was ready, "
+                f"see {log_path}.")
+        if time.perf_counter() > deadline:
+            self.stop()
+            raise TimeoutError(
+                f"The server was not ready after "
+                f"{self.launch.ready_timeout_seconds:.0f}s, see {log_path}.")
+
+    def stop(self) -> None:
+        """Stop the server with SIGTERM, then SIGKILL after the timeout."""
+        if self.process is not None:
+            if self.process.poll() is None:
+                print("Stopping server")
+                try:
+                    os.killpg(self.process.pid, signal.SIGTERM)
+                    self.process.wait(
+                        timeout=self.launch.shutdown_timeout_seconds)
+                except subprocess.TimeoutExpired:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                    self.process.wait()
+                except ProcessLookupError:
+                    pass
+            self.process = None
+            self.command = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def main(args: argparse.Namespace):
+    launch = ServerLaunch(command=args.command,
+                          health_path=args.health_path,
+                          ready_timeout_seconds=args.ready_timeout)
+    server = {"host": args.host, "port": args.port, "endpoint": args.endpoint}
+    config = SweepConfig(model_name=args.model,
+                         model=args.model,
+                         tokenizer=None,
+                         server=server,
+                         dataset={},
+                         input_len=None,
+                         output_len=None,
+                         request_rate=float("inf"),
+                         concurrency=None,
+                         num_prompts=0,
+                         repetition=0,
+                         results_dir=args.log_dir,
+                         result_filename="",
+                         launch_command=args.command.format(
+                             model=args.model,
+                             model_name=args.model,
+                             host=args.host,
+                             port=args.port))
+    with ServerManager(launch) as manager:
+        print(json.dumps(manager.start(config), indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Launch a server, measure its cold start and stop it.")
+    parser.add_argument("--command",
+                        type=str,
+                        required=True,
+                        help="Shell command of the server, formatted with "
+                        "{model}, {model_name}, {host} and {port}.")
+    parser.add_argument("--model", type=str, default="model")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--endpoint", type=str, default="/v1/completions")
+    parser.add_argument("--health-path", type=str, default="/v1/models")
+    parser.add_argument("--ready-timeout",
+                        type=float,
+                        default=1800.0,
+                        help="Seconds to wait for the server to be ready.")
+    parser.add_argument("--log-dir",
+                        type=str,
+                        default=".",
+                        help="Directory of the server log.")
+    main(parser.parse_args())
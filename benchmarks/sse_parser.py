@@ -0,0 +1,98 @@
+# SPDX-License-Identifier: Apache-2.0
+"""Incremental parser for server-sent event (SSE) streams.
+
+The streaming request functions only need the payload of each `data:`
+field. Instead of iterating the response line by line and decoding every
+line to `str`, the parser reads whatever bytes are buffered with
+`readany()` and yields each payload as a `memoryview` into that block,
+which can be fed to the JSON decoder without copying.
+"""
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DATA_FIELD = b"data:"
+DONE_PAYLOAD = b"[DONE]"
+
+_WHITESPACE = b" \t\r"
+
+
+def _json_loads_fallback(payload: memoryview) -> Any:
+    # The stdlib decoder does not accept memoryviews.
+    return json.loads(bytes(payload))
+
+
+# orjson decodes memoryviews directly and is several times faster.
+json_loads = orjson.loads if orjson is not None else _json_loads_fallback
+
+
+def parse_sse_block(data: bytes, pos: int = 0) -> tuple[list[memoryview], int]:
+    """
+    Split the complete lines of `data` starting at `pos` into SSE payloads.
+
+    Blank lines, comments (lines starting with ':') and fields other than
+    `data:` are skipped. Lines without a field name are passed through, as
+    some backends stream bare JSON lines.
+
+    Returns the payloads and the offset of the first incomplete line.
+    """
+    view = memoryview(data)
+    payloads: list[memoryview] = []
+    while True:
+        end = data.find(b"\n", pos)
+        if end < 0:
+            return payloads, pos
+        start, stop = pos, end
+        pos = end + 1
+        while start < stop and data[start] in _WHITESPACE:
+            start += 1
+        while stop > start and data[stop - 1] in _WHITESPACE:
+            stop -= 1
+        if start == stop or data[start] == 0x3A:  # b":"
+            continue
+        if data.startswith(DATA_FIELD, start, stop):
+            start += len(DATA_FIELD)
+            if start < stop and data[start] == 0x20:  # b" "
+                start += 1
+        elif data[start] not in b"{[":
+            # event:, id: and retry: fields carry no payload.
+            continue
+        payloads.append(view[start:stop])
+
+
+async def iter_sse_data(content) -> AsyncIterator[list[memoryview]]:
+    """
+    Read an SSE stream (e.g. `aiohttp.StreamReader`) in blocks and yield,
+    per block, the list of `data:` payloads that arrived with it.
+
+    Payloads are views into the current block and are only valid until
+    the next iteration.
+    """
+    pending: list[bytes] = []
+    while True:
+        block = await content.readany()
+        if not block:
+            break
+        if block.find(b"\n") < 0:
+            # No complete line yet, avoid rescanning the partial line.
+            pending.append(block)
+            continue
+        if pending:
+            pending.append(block)
+            block = b"".join(pending)
+            pending.clear()
+        payloads, pos = parse_sse_block(block)
+        if payloads:
+            yield payloads
+        if pos < len(block):
+            pending.append(block[pos:])
+    if pending:
+        # The stream ended without a trailing newline.
+        payloads, _ = parse_sse_block(b"".join(pending) + b"\n")
+        if payloads:
+            yield payloads
@@ -0,0 +1,673 @@
+# SPDX-License-Identifier: Apache-2.0
+"""Run many benchmark_serving.py configurations in a single process.
+
+Each configuration is given as the command line arguments that would be
+passed to `benchmark_serving.py`, and produces the same result JSON file.
+Unlike one subprocess per configuration, the serving module, the
+tokenizers and the tokenized sonnet dataset are loaded once, and the
+pooled client session keeps its connections open from one run to the
+next, as long as the runs use the same connector settings.
+
+Sweeps are usually described by a sweep spec file (see sweep_spec.py):
+    python benchmarks/sweep_runner.py benchmarks/sweeps/llama_sonnet.toml
+
+or run from code with the arguments of each configuration:
+    runner = SweepRunner("benchmark_serving")
+    runner.run([
+        ["--model", "m", "--max-concurrency", "1", ...],
+        ["--model", "m", "--max-concurrency", "2", ...],
+    ])
+"""
+import argparse
+import asyncio
+import gc
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import time
+import traceback
+from collections.abc import Callable, Collection, Iterable, Iterator
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import numpy as np
+from server_manager import ServerManager
+from sweep_spec import (ORDERS, AdaptiveConcurrency, EarlyStop, SweepConfig,
+                        SweepSpec, load_sweep_spec)
+
+
+MANIFEST_FILENAME = "sweep_manifest.jsonl"
+
+
+def is_valid_result_file(path: Optional[str]) -> bool:
+    """Whether `path` holds a complete result JSON with finished requests."""
+    if path is None or not os.path.isfile(path):
+        return False
+    try:
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return isinstance(result, dict) and result.get("completed", 0) > 0
+
+
+class SweepManifest:
+    """
+    Append-only JSON lines log of the runs of a sweep in a results
+    directory, keyed by the hash of each configuration. Every finished run
+    is appended and flushed to disk immediately, so that a sweep can be
+    resumed after a crash or Ctrl-C by skipping the completed runs. The
+    ".jsonl" suffix keeps it out of "*.json" result globs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: dict[str, dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash.
+                        continue
+                    self.entries[entry["config_hash"]] = entry
+
+    def is_completed(self, config_hash: str) -> bool:
+        entry = self.entries.get(config_hash)
+        return (entry is not None and entry["status"] == "completed"
+                and is_valid_result_file(entry["result_file"]))
+
+    def record(self,
+               config_hash: str,
+               args: list[str],
+               status: str,
+               result_file: Optional[str],
+               attempts: int,
+               reason: Optional[str] = None,
+               cold_start: Optional[dict[str, Any]] = None) -> None:
+        entry = {
+            "config_hash": config_hash,
+            "status": status,
+            "result_file": result_file,
+            "attempts": attempts,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": args,
+        }
+        if reason is not None:
+            entry["reason"] = reason
+        if cold_start is not None:
+            entry["server_cold_start"] = cold_start
+        self.entries[config_hash] = entry
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def load_result(path: Optional[str]) -> Optional[dict[str, Any]]:
+    if not is_valid_result_file(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def add_to_result(path: str, **fields: Any) -> None:
+    """Add fields to the result JSON at `path`, atomically."""
+    with open(path, encoding="utf-8") as f:
+        result = json.load(f)
+    result.update(fields)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(path + ".tmp", path)
+
+
+def curve_point(result: dict[str, Any]) -> dict[str, float]:
+    """
+    The knee metrics of a run, from the per-request data of its result so
+    that p99 TPOT is available whatever the --percentile-metrics were.
+    """
+    if "sketches" in result:
+        # --metrics-mode sketch keeps no per-request ITLs.
+        return {
+            "output_throughput": result["output_throughput"],
+            "p99_tpot_ms": result["sketches"]["tpot"]["p99_ms"],
+        }
+    tpots = [
+        sum(itl) / (output_len - 1)
+        for output_len, itl, error in zip(result["output_lens"],
+                                          result["itls"], result["errors"])
+        if not error and output_len > 1
+    ]
+    return {
+        "output_throughput":
+        result["output_throughput"],
+        "p99_tpot_ms":
+        float(np.percentile(tpots, 99)) * 1000 if tpots else 0.0,
+    }
+
+
+def find_knees(curve: dict[int, dict[str, float]],
+               metrics: list[str]) -> list[tuple[float, int]]:
+    """
+    Score the interior concurrency levels of a curve by the largest change
+    in slope of any of `metrics`, each normalized by its maximum, against
+    log2 of the concurrency. Returns (score, concurrency) by decreasing
+    score.
+    """
+    levels = sorted(curve)
+    if len(levels) < 3:
+        return []
+    x = np.log2(levels)
+    scores = np.zeros(len(levels) - 2)
+    for metric in metrics:
+        y = np.array([curve[level][metric] for level in levels])
+        scale = np.abs(y).max()
+        if scale == 0:
+            continue
+        slopes = np.diff(y / scale) / np.diff(x)
+        scores = np.maximum(scores, np.abs(np.diff(slopes)))
+    return sorted(zip(scores.tolist(), levels[1:-1]), reverse=True)
+
+
+def select_refinement(curve: dict[int, dict[str, float]],
+                      adaptive: AdaptiveConcurrency, budget: int,
+                      tried_levels: Collection[int]) -> list[int]:
+    """
+    The next concurrency levels to run: the geometric midpoints of the
+    intervals around the sharpest knee that are still wider than the
+    resolution and were not tried yet, at most `budget` of them.
+    """
+    levels = sorted(curve)
+    for _, knee in find_knees(curve, adaptive.metrics):
+        i = levels.index(knee)
+        new_levels = []
+        for low, high in ((levels[i - 1], knee), (knee, levels[i + 1])):
+            mid = round(math.sqrt(low * high))
+            if ((high - low) / low > adaptive.resolution
+                    and low < mid < high and mid not in tried_levels):
+                new_levels.append(mid)
+        if new_levels:
+            return new_levels[:budget]
+    return []
+
+
+def print_capacity_curve(config: SweepConfig,
+                         curve: dict[int, dict[str, float]],
+                         metrics: list[str]) -> None:
+    knees = find_knees(curve, metrics)
+    knee = knees[0][1] if knees else None
+    print("{s:{c}^{n}}".format(s=f" Capacity Curve: {config.model_name} ",
+                               n=50,
+                               c='='))
+    print("{:<12} {:>18} {:>15}".format("Concurrency", "Output tok/s",
+                                        "P99 TPOT (ms)"))
+    for level in sorted(curve):
+        print("{:<12} {:>18.2f} {:>15.2f}{}".format(
+            level, curve[level]["output_throughput"],
+            curve[level]["p99_tpot_ms"], "  <- knee" if level == knee else ""))
+    print("=" * 50)
+
+
+class SaturationTracker:
+    """
+    Tracks the results of the concurrency climbs of a sweep and decides,
+    according to `early_stop`, at which level each climb saturated.
+    """
+
+    def __init__(self, early_stop: EarlyStop):
+        self.early_stop = early_stop
+        # Climb key -> concurrency -> result of the run.
+        self.climbs: dict[str, dict[int, dict[str, Any]]] = {}
+        self._warned_metrics: set[str] = set()
+
+    def add(self, config: SweepConfig, result: dict[str, Any]) -> None:
+        if config.concurrency is None:
+            return
+        self.climbs.setdefault(config.climb_key(),
+                               {})[config.concurrency] = result
+
+    def _slo_breach(self, result: dict[str, Any]) -> Optional[str]:
+        factor = self.early_stop.slo_breach_factor
+        for metric, slo in self.early_stop.p99_slo_ms.items():
+            value = result.get(f"p99_{metric}_ms")
+            if value is None:
+                if metric not in self._warned_metrics:
+                    self._warned_metrics.add(metric)
+                    print(f"WARNING: the results have no p99 {metric}, add "
+                          f"it to --percentile-metrics to stop at its SLO.")
+                continue
+            if value > factor * slo:
+                return (f"p99 {metric} {value:.0f} ms > {factor:g}x "
+                        f"SLO of {slo:g} ms")
+        return None
+
+    def saturation(self, climb_key: str) -> Optional[tuple[int, str]]:
+        """
+        The lowest concurrency at which the climb saturated and the reason,
+        or None if it has not saturated so far.
+        """
+        points = self.climbs.get(climb_key, {})
+        previous_throughput = None
+        num_low_gains = 0
+        for concurrency in sorted(points):
+            result = points[concurrency]
+            reason = self._slo_breach(result)
+            if reason is not None:
+                return concurrency, reason
+            throughput = result.get("output_throughput", 0.0)
+            if previous_throughput:
+                gain = throughput / previous_throughput - 1
+                if gain < self.early_stop.min_throughput_gain:
+                    num_low_gains += 1
+                    if num_low_gains >= self.early_stop.patience:
+                        return concurrency, (
+                            f"output throughput gain {gain:.1%} < "
+                            f"{self.early_stop.min_throughput_gain:.1%}")
+                else:
+                    num_low_gains = 0
+            previous_throughput = throughput
+        return None
+
+    def skip_reason(self, config: SweepConfig) -> Optional[str]:
+        """Why `config` is skipped as saturated, or None to run it."""
+        if config.concurrency is None:
+            return None
+        saturation = self.saturation(config.climb_key())
+        if saturation is None or config.concurrency <= saturation[0]:
+            return None
+        return f"saturated at concurrency {saturation[0]}: {saturation[1]}"
+
+
+class SweepRunner:
+    """
+    Runs benchmark configurations in-process with the serving module
+    `serving_module`, e.g. "benchmark_serving" or
+    "pure_client_benchmark_serving".
+    """
+
+    def __init__(self, serving_module: str = "benchmark_serving"):
+        self.serving = importlib.import_module(serving_module)
+        self.parser = self.serving.make_arg_parser()
+        self._tokenizers: dict[tuple[str, str, bool], Any] = {}
+        self._session = None
+        self._session_settings: Optional[tuple] = None
+
+    def parse_args(self, argv: list[str]) -> argparse.Namespace:
+        return self.parser.parse_args(argv)
+
+    def get_tokenizer(self, args: argparse.Namespace):
+        key = (self.serving.get_tokenizer_id(args), args.tokenizer_mode,
+               args.trust_remote_code)
+        if key not in self._tokenizers:
+            self._tokenizers[key] = self.serving.get_tokenizer(
+                key[0],
+                tokenizer_mode=args.tokenizer_mode,
+                trust_remote_code=args.trust_remote_code)
+        return self._tokenizers[key]
+
+    async def get_session(self, args: argparse.Namespace):
+        """
+        The pooled session shared by consecutive runs with the same
+        --connection-limit, --keepalive-timeout and --dns-cache-ttl. A run
+        with other connector settings replaces it with a new one.
+        """
+        # Without a --connection-limit the pool is unbounded, so that it
+        # never limits the concurrency of a run; each run bounds its
+        # requests by its --max-concurrency.
+        settings = (args.connection_limit or 0, args.keepalive_timeout,
+                    args.dns_cache_ttl)
+        if self._session is None or settings != self._session_settings:
+            await self.close_session()
+            self._session = self.serving.create_client_session(
+                connection_limit=settings[0],
+                keepalive_timeout=args.keepalive_timeout,
+                dns_cache_ttl=args.dns_cache_ttl)
+            self._session_settings = settings
+        return self._session
+
+    async def close_session(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def run_config(self, args: argparse.Namespace) -> Optional[str]:
+        """
+        Run one configuration like `benchmark_serving.main`, and return the
+        path of its result file if results are saved.
+        """
+        print(args)
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+
+        tokenizer = self.get_tokenizer(args)
+        input_requests, arrival_times = self.serving.sample_input_requests(
+            args, tokenizer)
+        session = None
+        if args.connection_mode == "pooled" and args.num_workers == 1:
+            # Other runs manage their own connections.
+            session = await self.get_session(args)
+        client_profiler = self.serving.make_client_profiler(args)
+        benchmark_result = await self.serving.run_benchmark(
+            args,
+            tokenizer,
+            input_requests,
+            arrival_times,
+            session=session,
+            client_profiler=client_profiler)
+        result_file = None
+        if args.save_result:
+            result_file = self.serving.save_benchmark_result(
+                args, benchmark_result)
+        if client_profiler is not None:
+            self.serving.save_client_profile(args, client_profiler,
+                                             result_file)
+        return result_file
+
+    async def run_with_retries(self, argv: list[str], retries: int,
+                               retry_backoff: float
+                               ) -> tuple[bool, Optional[str], int]:
+        """
+        Run one configuration, retrying up to `retries` times with
+        exponential backoff if it raises or saves no valid result.
+        Returns whether it succeeded, its result file and the number of
+        attempts.
+        """
+        args = self.parse_args(argv)
+        for attempt in range(retries + 1):
+            if attempt:
+                delay = retry_backoff * 2**(attempt - 1)
+                print(f"Retrying in {delay:.0f}s "
+                      f"(attempt {attempt + 1}/{retries + 1})")
+                await asyncio.sleep(delay)
+            start = time.perf_counter()
+            try:
+                result_file = await self.run_config(args)
+            except Exception:
+                # Keep going with the next configuration, as a failed
+                # subprocess would.
+                traceback.print_exc()
+                print(f"Benchmark failed: {' '.join(argv)}")
+                continue
+            finally:
+                gc.collect()
+            if args.save_result and not is_valid_result_file(result_file):
+                print(f"Benchmark saved no completed requests to "
+                      f"{result_file}")
+                continue
+            print("Benchmark completed successfully in "
+                  f"{time.perf_counter() - start:.1f}s")
+            return True, result_file, attempt + 1
+        return False, None, retries + 1
+
+    async def run_async(
+        self,
+        configs: Iterable[list[str]],
+        retries: int = 0,
+        retry_backoff: float = 30.0,
+        on_result: Optional[Callable[[int, bool, Optional[str], int],
+                                     None]] = None,
+    ) -> list[tuple[list[str], bool, Optional[str]]]:
+        results = []
+        try:
+            for i, argv in enumerate(configs):
+                succeeded, result_file, attempts = await self.run_with_retries(
+                    argv, retries, retry_backoff)
+                results.append((argv, succeeded, result_file))
+                if on_result is not None:
+                    on_result(i, succeeded, result_file, attempts)
+        finally:
+            await self.close_session()
+        return results
+
+    def run(
+        self,
+        configs: Iterable[list[str]],
+        retries: int = 0,
+        retry_backoff: float = 30.0,
+        on_result: Optional[Callable[[int, bool, Optional[str], int],
+                                     None]] = None,
+    ) -> list[tuple[list[str], bool, Optional[str]]]:
+        """
+        Run every configuration in order. Returns the arguments, whether
+        the run succeeded and the result file of each configuration.
+
+        `on_result` is called with the index, the success, the result file
+        and the number of attempts as soon as each configuration finished.
+        """
+        return asyncio.run(
+            self.run_async(configs, retries, retry_backoff, on_result))
+
+
+def print_sweep_plan(configs: list[SweepConfig], spec: SweepSpec) -> float:
+    """Print the runs of a sweep in order and return the estimated total
+    wall time in seconds."""
+    print("{s:{c}^{n}}".format(s=' Sweep Plan ', n=78, c='='))
+    print("{:<5} {:<12} {:>7} {:>7} {:>8} {:>6} {:>7} {:>4} {:>10}".format(
+        "Run", "Model", "Input", "Output", "Rate", "Conc", "Prompts", "Rep",
+        "Est. (s)"))
+    total_seconds = 0.0
+    for i, config in enumerate(configs):
+        seconds = config.estimate_seconds(spec.estimate)
+        total_seconds += seconds
+        print("{:<5} {:<12} {:>7} {:>7} {:>8} {:>6} {:>7} {:>4} {:>10.0f}".
+              format(i + 1, config.model_name[:12], str(config.input_len),
+                     str(config.output_len), config.request_rate_str,
+                     str(config.concurrency), config.num_prompts,
+                     config.repetition, seconds))
+    print("{:<40} {:<10}".format("Runs:", len(configs)))
+    print("{:<40} {:<10}".format(
+        "Estimated wall time:", str(timedelta(seconds=round(total_seconds)))))
+    print("=" * 78)
+    return total_seconds
+
+
+def run_sweep(spec: SweepSpec, dry_run: bool = False
+              ) -> list[tuple[list[str], bool, Optional[str]]]:
+    """
+    Expand the sweep spec, print the plan and run every configuration that
+    has not completed yet according to the manifests of its results
+    directory.
+
+    With an [early_stop] table, the runs of a climb above the concurrency
+    at which it saturated are skipped and recorded as such in the manifest.
+    The concurrency levels should then run in ascending order, as in the
+    "spec" order; cheapest-first runs the high levels first and skips
+    little.
+
+    With an [adaptive] table, the runs are grouped by climb, and each climb
+    runs its concurrency levels as anchors before refining around the knee
+    of its capacity curve, see `select_refinement`.
+
+    With a [launch] table, the server is started before the first run and
+    restarted as configured, see server_manager.py. The cold-start metrics
+    are added to the result and the manifest entry of the run that
+    followed the start.
+    """
+    date = datetime.now().strftime("%Y-%m-%d")
+    configs = spec.expand(date)
+    manifests = {
+        results_dir: SweepManifest(os.path.join(results_dir,
+                                                MANIFEST_FILENAME))
+        for results_dir in dict.fromkeys(config.results_dir
+                                         for config in configs)
+    }
+    pending = [
+        config for config in configs if not manifests[
+            config.results_dir].is_completed(config.config_hash())
+    ]
+    if len(pending) < len(configs):
+        print(f"Skipping {len(configs) - len(pending)} runs completed by a "
+              "previous invocation of this sweep.")
+    print_sweep_plan(pending, spec)
+    if spec.adaptive is not None:
+        print(f"Adaptive: each climb runs its anchor levels above, then up "
+              f"to {spec.adaptive.max_runs} runs in total around the knee.")
+    if dry_run:
+        return []
+    for results_dir in manifests:
+        os.makedirs(results_dir, exist_ok=True)
+
+    # Results of the completed runs by config hash, including those of
+    # previous invocations.
+    results_by_hash: dict[str, dict[str, Any]] = {}
+    tracker = None
+    if spec.early_stop is not None:
+        tracker = SaturationTracker(spec.early_stop)
+    if spec.early_stop is not None or spec.adaptive is not None:
+        # Resume the climbs from the runs of previous invocations.
+        for manifest in manifests.values():
+            for entry in manifest.entries.values():
+                if entry["status"] == "completed":
+                    result = load_result(entry["result_file"])
+                    if result is not None:
+                        results_by_hash[entry["config_hash"]] = result
+        if tracker is not None:
+            for config in configs:
+                if config.config_hash() in results_by_hash:
+                    tracker.add(config, results_by_hash[config.config_hash()])
+
+    def iter_adaptive(climb: list[SweepConfig]) -> Iterator[SweepConfig]:
+        # Run the anchors, then refine around the knee of the curve.
+        runs = {config.concurrency: config for config in climb}
+        next_levels = sorted(runs)
+        while next_levels:
+            for level in next_levels:
+                yield runs[level]
+            curve = {
+                level: curve_point(results_by_hash[config.config_hash()])
+                for level, config in runs.items()
+                if config.config_hash() in results_by_hash
+            }
+            next_levels = select_refinement(curve, spec.adaptive,
+                                            spec.adaptive.max_runs - len(runs),
+                                            runs)
+            for level in next_levels:
+                runs[level] = spec.with_concurrency(climb[0], level, date)
+                results_dir = runs[level].results_dir
+                if results_dir not in manifests:
+                    # The layout may depend on the concurrency.
+                    os.makedirs(results_dir, exist_ok=True)
+                    manifests[results_dir] = SweepManifest(
+                        os.path.join(results_dir, MANIFEST_FILENAME))
+            if not next_levels and len(curve) >= 3:
+                print_capacity_curve(climb[0], curve, spec.adaptive.metrics)
+
+    def iter_configs() -> Iterator[SweepConfig]:
+        if spec.adaptive is None:
+            yield from pending
+            return
+        climbs: dict[str, list[SweepConfig]] = {}
+        for config in configs:
+            climbs.setdefault(config.climb_key(), []).append(config)
+        for climb in climbs.values():
+            yield from iter_adaptive(climb)
+
+    server_manager = (ServerManager(spec.launch)
+                      if spec.launch is not None else None)
+    # Cold-start metrics of the server, by index of the run it started for.
+    cold_starts: dict[int, dict[str, Any]] = {}
+    started: list[SweepConfig] = []
+    skipped: list[tuple[SweepConfig, str]] = []
+
+    def iter_args() -> Iterator[list[str]]:
+        # Decided lazily, as each run completes before the next is drawn.
+        for config in iter_configs():
+            if manifests[config.results_dir].is_completed(
+                    config.config_hash()):
+                continue
+            reason = (tracker.skip_reason(config)
+                      if tracker is not None else None)
+            if reason is not None:
+                print(f"Skipping {config.model_name} at concurrency "
+                      f"{config.concurrency}, {reason}")
+                manifests[config.results_dir].record(config.config_hash(),
+                                                     config.to_args(),
+                                                     "skipped_saturation",
+                                                     None,
+                                                     0,
+                                                     reason=reason)
+                skipped.append((config, reason))
+                continue
+            if server_manager is not None:
+                cold_start = server_manager.ensure(config)
+                if cold_start is not None:
+                    cold_starts[len(started)] = cold_start
+            started.append(config)
+            yield config.to_args()
+
+    def record(index: int, succeeded: bool, result_file: Optional[str],
+               attempts: int) -> None:
+        config = started[index]
+        cold_start = cold_starts.get(index)
+        if succeeded and cold_start is not None and result_file is not None:
+            add_to_result(result_file, server_cold_start=cold_start)
+        manifests[config.results_dir].record(
+            config.config_hash(),
+            config.to_args(),
+            "completed" if succeeded else "failed",
+            result_file,
+            attempts,
+            cold_start=cold_start)
+        if succeeded and (tracker is not None or spec.adaptive is not None):
+            result = load_result(result_file)
+            if result is not None:
+                results_by_hash[config.config_hash()] = result
+                if tracker is not None:
+                    tracker.add(config, result)
+
+    try:
+        results = SweepRunner(spec.serving_module).run(
+            iter_args(),
+            retries=spec.retries,
+            retry_backoff=spec.retry_backoff_seconds,
+            on_result=record)
+    except KeyboardInterrupt:
+        print("Sweep interrupted. Run it again to resume from the first "
+              "run that did not complete.")
+        raise
+    finally:
+        if server_manager is not None:
+            server_manager.stop()
+    num_failed = sum(not succeeded for _, succeeded, _ in results)
+    print(f"Completed {len(results) - num_failed}/{len(results)} runs")
+    if skipped:
+        print(f"Skipped {len(skipped)} runs past saturation")
+    return results
+
+
+def main(args: argparse.Namespace):
+    spec = load_sweep_spec(args.spec)
+    if args.order is not None:
+        spec.order = args.order
+    if args.serving_module is not None:
+        spec.serving_module = args.serving_module
+    try:
+        run_sweep(spec, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a benchmark sweep described by a sweep spec file.")
+    parser.add_argument("spec",
+                        type=str,
+                        help="Path to the TOML, YAML or JSON sweep spec.")
+    parser.add_argument("--dry-run",
+                        action="store_true",
+                        help="Only print the runs and the estimated time.")
+    parser.add_argument("--order",
+                        type=str,
+                        choices=ORDERS,
+                        default=None,
+                        help="Override the run order of the spec.")
+    parser.add_argument("--serving-module",
+                        type=str,
+                        default=None,
+                        help="Override the serving module of the spec, e.g. "
+                        "pure_client_benchmark_serving.")
+    main(parser.parse_args())
@@ -0,0 +1,434 @@
+# SPDX-License-Identifier: Apache-2.0
+"""Declarative benchmark sweep specifications.
+
+A sweep spec is a TOML or YAML file describing the models, server
+endpoints, dataset, length pairs, concurrency levels, request rates,
+repetitions and output layout of a sweep. It expands into one
+`SweepConfig` per benchmark run, i.e. the product of
+
+    models x length_pairs x request_rates x concurrency x num_prompts
+    x repetitions
+
+The optional [early_stop] and [adaptive] tables change which concurrency
+levels actually run, see `EarlyStop` and `AdaptiveConcurrency`.
+
+See sweeps/llama_sonnet.toml for an example covering every key.
+"""
+import copy
+import dataclasses
+import hashlib
+import json
+import math
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from itertools import product
+from typing import Any, Optional
+
+# Options of benchmark_serving.py set by the [server] table or by a model.
+SERVER_KEYS = ("backend", "host", "port", "base_url", "endpoint")
+
+# Where the length pair goes on the command line, per dataset.
+DATASET_LENGTH_ARGS = {
+    "sonnet": ("--sonnet-input-len", "--sonnet-output-len"),
+    "random": ("--random-input-len", "--random-output-len"),
+}
+
+ORDERS = ("spec", "cheapest-first")
+
+# Curve metrics that adaptive sweeps look for the knee of.
+KNEE_METRICS = ("output_throughput", "p99_tpot_ms")
+
+
+@dataclass
+class CostEstimate:
+    """
+    Rough model of the wall time of a run: the requests are processed in
+    waves of `concurrency`, each taking the prefill and decode time of one
+    request, plus a fixed overhead per run. Tune the coefficients to the
+    hardware being benchmarked.
+    """
+    prefill_seconds_per_token: float = 0.0002
+    decode_seconds_per_token: float = 0.03
+    overhead_seconds: float = 10.0
+
+
+@dataclass
+class EarlyStop:
+    """
+    When to stop climbing the concurrency levels of a sweep. The levels of
+    each climb, i.e. the runs that only differ in concurrency, run in
+    ascending order until a level
+      - raises the output throughput by less than `min_throughput_gain`
+        (a fraction of the throughput of the previous level) `patience`
+        times in a row, or
+      - has a p99 latency above `slo_breach_factor` times its SLO in
+        `p99_slo_ms`, e.g. {"ttft": 2000, "tpot": 100}. The metric must be
+        in the --percentile-metrics of the runs.
+    The higher levels of the climb are then skipped as saturated.
+    """
+    min_throughput_gain: float = 0.05
+    patience: int = 1
+    p99_slo_ms: dict[str, float] = field(default_factory=dict)
+    slo_breach_factor: float = 2.0
+
+    def validate(self) -> None:
+        if self.patience < 1:
+            raise ValueError("early_stop.patience must be at least 1.")
+        if self.slo_breach_factor <= 0:
+            raise ValueError("early_stop.slo_breach_factor must be positive.")
+        for metric, slo in self.p99_slo_ms.items():
+            if slo <= 0:
+                raise ValueError(
+                    f"early_stop.p99_slo_ms.{metric} must be positive.")
+
+
+@dataclass
+class AdaptiveConcurrency:
+    """
+    Adaptive choice of the concurrency levels of each climb. The
+    `concurrency` levels of the spec are run as anchors, then levels are
+    added between the neighbours of the level with the largest change in
+    slope of the `metrics` curves, until a climb has `max_runs` runs or
+    every interval around the knee is narrower than `resolution` (a
+    fraction of its lower level).
+    """
+    max_runs: int = 12
+    metrics: list[str] = field(default_factory=lambda: list(KNEE_METRICS))
+    resolution: float = 0.1
+
+    def validate(self) -> None:
+        unknown_metrics = set(self.metrics) - set(KNEE_METRICS)
+        if not self.metrics or unknown_metrics:
+            raise ValueError(
+                f"adaptive.metrics must be a non-empty subset of "
+                f"{KNEE_METRICS}, got {self.metrics}.")
+        if self.resolution <= 0:
+            raise ValueError("adaptive.resolution must be positive.")
+
+
+@dataclass
+class ServerLaunch:
+    """
+    How the sweep launches the server under test, see server_manager.py.
+    `command` is a shell command formatted with the {model}, {model_name},
+    {host} and {port} of each run; a model may set its own
+    "launch_command". The server is restarted whenever the command changes,
+    and before every run with `restart_between_configs`, e.g. to start
+    each run with empty prefix and KV caches.
+    """
+    command: str
+    health_path: str = "/v1/models"
+    ready_timeout_seconds: float = 1800.0
+    poll_interval_seconds: float = 2.0
+    shutdown_timeout_seconds: float = 60.0
+    restart_between_configs: bool = False
+    # Relative to the results directory of the first run of the server.
+    log_file: str = "server.log"
+    env: dict[str, str] = field(default_factory=dict)
+
+    def validate(self) -> None:
+        if not self.command.strip():
+            raise ValueError("launch.command must not be empty.")
+        if self.ready_timeout_seconds <= 0 or self.poll_interval_seconds <= 0:
+            raise ValueError(
+                "launch timeouts and intervals must be positive.")
+
+
+@dataclass
+class SweepConfig:
+    model_name: str
+    model: str
+    tokenizer: Optional[str]
+    server: dict[str, Any]
+    dataset: dict[str, Any]
+    input_len: Optional[int]
+    output_len: Optional[int]
+    request_rate: float
+    concurrency: Optional[int]
+    num_prompts: int
+    repetition: int
+    results_dir: str
+    result_filename: str
+    extra_args: list[str] = field(default_factory=list)
+    launch_command: Optional[str] = None
+
+    @property
+    def request_rate_str(self) -> str:
+        return "inf" if self.request_rate == float("inf") else str(
+            self.request_rate)
+
+    def format_fields(self) -> dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "model_id": self.model.split("/")[-1],
+            "backend": self.server.get("backend", "vllm"),
+            "dataset": self.dataset.get("name"),
+            "input_len": self.input_len,
+            "output_len": self.output_len,
+            "request_rate": self.request_rate_str,
+            "concurrency": self.concurrency,
+            "num_prompts": self.num_prompts,
+            "repetition": self.repetition,
+        }
+
+    def config_hash(self) -> str:
+        """
+        Hash of the parameters of the run, which identifies it across
+        invocations of a sweep regardless of the output layout, the order
+        and how the server is launched.
+        """
+        params = asdict(self)
+        del params["results_dir"], params["result_filename"]
+        del params["launch_command"]
+        params["request_rate"] = self.request_rate_str
+        return hashlib.sha256(
+            json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+    def climb_key(self) -> str:
+        """
+        Hash of the parameters of the run except its concurrency, shared by
+        the runs of one concurrency climb.
+        """
+        return dataclasses.replace(self, concurrency=None).config_hash()
+
+    def to_args(self) -> list[str]:
+        """The benchmark_serving.py command line arguments of the run."""
+        args = []
+        for key in SERVER_KEYS:
+            if self.server.get(key) is not None:
+                args += [f"--{key.replace('_', '-')}", str(self.server[key])]
+        args += ["--model", self.model]
+        if self.tokenizer is not None:
+            args += ["--tokenizer", self.tokenizer]
+        args += ["--dataset-name", self.dataset["name"]]
+        if self.dataset.get("path") is not None:
+            args += ["--dataset-path", self.dataset["path"]]
+        if self.input_len is not None:
+            input_arg, output_arg = DATASET_LENGTH_ARGS[self.dataset["name"]]
+            args += [
+                input_arg,
+                str(self.input_len), output_arg,
+                str(self.output_len)
+            ]
+        args += ["--request-rate", self.request_rate_str]
+        if self.concurrency is not None:
+            args += ["--max-concurrency", str(self.concurrency)]
+        args += [
+            "--num-prompts",
+            str(self.num_prompts),
+            "--save-result",
+            "--result-dir",
+            self.results_dir,
+            "--result-filename",
+            self.result_filename,
+        ]
+        return args + self.extra_args
+
+    def estimate_seconds(self, estimate: CostEstimate) -> float:
+        request_seconds = (
+            (self.input_len or 0) * estimate.prefill_seconds_per_token +
+            (self.output_len or 0) * estimate.decode_seconds_per_token)
+        waves = math.ceil(self.num_prompts / (self.concurrency or
+                                              self.num_prompts))
+        seconds = waves * request_seconds
+        if self.request_rate != float("inf"):
+            # The run takes at least as long as sending the requests.
+            seconds = max(seconds, self.num_prompts / self.request_rate)
+        return seconds + estimate.overhead_seconds
+
+
+@dataclass
+class SweepSpec:
+    models: list[dict[str, Any]]
+    dataset: dict[str, Any]
+    server: dict[str, Any] = field(default_factory=dict)
+    length_pairs: list[tuple[int, int]] = field(default_factory=list)
+    concurrency: list[Optional[int]] = field(default_factory=lambda: [None])
+    request_rates: list[float] = field(
+        default_factory=lambda: [float("inf")])
+    num_prompts: list[int] = field(default_factory=lambda: [1000])
+    repetitions: int = 1
+    results_dir: str = "./results-{model}-qps-{request_rate}-{date}"
+    result_filename: str = (
+        "{backend}-{request_rate}qps-itkns-{input_len}-otkns-{output_len}"
+        "-concurrency{concurrency}-{model_id}-{datetime}.json")
+    order: str = "spec"
+    retries: int = 2
+    retry_backoff_seconds: float = 30.0
+    serving_module: str = "benchmark_serving"
+    args: dict[str, Any] = field(default_factory=dict)
+    estimate: CostEstimate = field(default_factory=CostEstimate)
+    early_stop: Optional[EarlyStop] = None
+    adaptive: Optional[AdaptiveConcurrency] = None
+    launch: Optional[ServerLaunch] = None
+
+    @classmethod
+    def from_dict(cls, spec: dict[str, Any]) -> "SweepSpec":
+        spec = copy.deepcopy(spec)
+        sweep = spec.pop("sweep", {})
+        estimate = CostEstimate(**spec.pop("estimate", {}))
+        early_stop = spec.pop("early_stop", None)
+        if early_stop is not None:
+            early_stop = EarlyStop(**early_stop)
+        adaptive = spec.pop("adaptive", None)
+        if adaptive is not None:
+            adaptive = AdaptiveConcurrency(**adaptive)
+        launch = spec.pop("launch", None)
+        if launch is not None:
+            launch = ServerLaunch(**launch)
+        unknown_keys = (set(spec) | set(sweep)) - set(
+            cls.__dataclass_fields__)
+        if unknown_keys:
+            raise ValueError(
+                f"Unknown keys in sweep spec: {sorted(unknown_keys)}")
+        sweep_spec = cls(**spec,
+                         **sweep,
+                         estimate=estimate,
+                         early_stop=early_stop,
+                         adaptive=adaptive,
+                         launch=launch)
+        sweep_spec.request_rates = [
+            float(rate) for rate in sweep_spec.request_rates
+        ]
+        sweep_spec.length_pairs = [
+            tuple(pair) for pair in sweep_spec.length_pairs
+        ]
+        sweep_spec.validate()
+        return sweep_spec
+
+    def validate(self) -> None:
+        if not self.models:
+            raise ValueError("A sweep spec needs at least one model.")
+        for model in self.models:
+            if "model" not in model:
+                raise ValueError(f"Model entry {model} has no 'model' key.")
+        if "name" not in self.dataset:
+            raise ValueError("The [dataset] table needs a 'name'.")
+        if (self.length_pairs
+                and self.dataset["name"] not in DATASET_LENGTH_ARGS):
+            raise ValueError(
+                f"Length pairs are not supported for the "
+                f"'{self.dataset['name']}' dataset, only for "
+                f"{sorted(DATASET_LENGTH_ARGS)}.")
+        if self.order not in ORDERS:
+            raise ValueError(
+                f"Unknown order '{self.order}', expected one of {ORDERS}.")
+        if self.repetitions < 1:
+            raise ValueError("repetitions must be at least 1.")
+        if self.retries < 0:
+            raise ValueError("retries must not be negative.")
+        if self.early_stop is not None:
+            self.early_stop.validate()
+        if self.adaptive is not None:
+            self.adaptive.validate()
+            if None in self.concurrency or len(self.concurrency) < 2:
+                raise ValueError(
+                    "Adaptive sweeps need at least two concurrency levels "
+                    "as anchors, all of them bounded.")
+            if self.adaptive.max_runs < len(self.concurrency):
+                raise ValueError(
+                    "adaptive.max_runs must cover the anchor levels.")
+        if self.launch is not None:
+            self.launch.validate()
+
+    def extra_args(self) -> list[str]:
+        # [args] holds additional benchmark_serving.py options, e.g.
+        # "--goodput" = ["ttft:500", "tpot:50"] or "--ignore-eos" = true.
+        args = []
+        for key, value in self.args.items():
+            if value is True:
+                args.append(key)
+            elif isinstance(value, list):
+                args += [key, *map(str, value)]
+            elif value is not False and value is not None:
+                args += [key, str(value)]
+        return args
+
+    def _apply_layout(self, config: SweepConfig, date: str) -> SweepConfig:
+        # {datetime} is filled in by benchmark_serving.py with the time the
+        # result is saved, like the file names it picks by default.
+        layout_fields = {
+            **config.format_fields(), "date": date,
+            "datetime": "{datetime}"
+        }
+        config.results_dir = self.results_dir.format(**layout_fields)
+        config.result_filename = self.result_filename.format(**layout_fields)
+        return config
+
+    def with_concurrency(self, config: SweepConfig, concurrency: int,
+                         date: str) -> SweepConfig:
+        """A run of the climb of `config` at another concurrency level."""
+        return self._apply_layout(
+            dataclasses.replace(config, concurrency=concurrency), date)
+
+    def expand(self, date: Optional[str] = None) -> list[SweepConfig]:
+        """Expand the spec into its runs, in the configured order."""
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        extra_args = self.extra_args()
+        configs = []
+        for (model, (input_len, output_len), request_rate, concurrency,
+             num_prompts, repetition) in product(
+                 self.models, self.length_pairs or [(None, None)],
+                 self.request_rates, self.concurrency, self.num_prompts,
+                 range(self.repetitions)):
+            server = {**self.server}
+            server.update(
+                (key, model[key]) for key in SERVER_KEYS if key in model)
+            config = SweepConfig(
+                model_name=model.get("name", model["model"].split("/")[-1]),
+                model=model["model"],
+                tokenizer=model.get("tokenizer"),
+                server=server,
+                dataset=self.dataset,
+                input_len=input_len,
+                output_len=output_len,
+                request_rate=request_rate,
+                concurrency=concurrency,
+                num_prompts=num_prompts,
+                repetition=repetition,
+                results_dir="",
+                result_filename="",
+                extra_args=extra_args,
+            )
+            if self.launch is not None:
+                config.launch_command = model.get(
+                    "launch_command", self.launch.command).format(
+                        model=config.model,
+                        model_name=config.model_name,
+                        host=server.get("host", "127.0.0.1"),
+                        port=server.get("port", 8000))
+            configs.append(self._apply_layout(config, date))
+
+        if self.order == "cheapest-first":
+            # Stable, so equal estimates keep the spec order.
+            configs.sort(key=lambda c: c.estimate_seconds(self.estimate))
+        return configs
+
+
+def load_sweep_spec(path: str) -> SweepSpec:
+    """Load a sweep spec from a TOML, YAML or JSON file."""
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError as e:
+                raise ImportError(
+                    "Please install tomli to load TOML sweep specs on "
+                    "Python < 3.11: pip install tomli") from e
+        with open(path, "rb") as f:
+            spec = tomllib.load(f)
+    elif path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError(
+                "Please install PyYAML to load YAML sweep specs: "
+                "pip install pyyaml") from e
+        with open(path) as f:
+            spec = yaml.safe_load(f)
+    else:
+        with open(path) as f:
+            spec = json.load(f)
+    return SweepSpec.from_dict(spec)
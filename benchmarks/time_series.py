@@ -0,0 +1,239 @@
+# SPDX-License-Identifier: Apache-2.0
+r"""Bin the per-request timestamps of a benchmark result into a time series.
+
+The "timeline" of the result JSON of `benchmark_serving.py` holds, for
+every request sent, including those outside the measurement window, its
+start, first token and end time in seconds from the start of the run (the
+wall-clock start being "benchmark_start_unix"), whether it succeeded and
+its output length. The measured requests also have their inter-token
+latencies ("itls"): the arrival offset of token k after the first is the
+sum of its first k ITLs. `build_time_series` bins them into, per bin of
+`bin_seconds`:
+    in_flight:              the mean number of requests in flight,
+    started_per_s:          the requests sent,
+    completed_per_s:        the successful requests that finished,
+    failed_per_s:           the failed requests that finished,
+    output_tokens_per_s:    the output tokens that arrived,
+    p<q>_ttft_ms:           the TTFT percentiles of the requests whose
+                            first token arrived in the bin,
+    p<q>_itl_ms:            the ITL percentiles of the tokens that arrived,
+    p<q>_e2el_ms:           the E2EL percentiles of the requests that
+                            finished,
+    measured_fraction:      the fraction of the bin within the measurement
+                            window, 0 during warmup and cooldown,
+which show throughput dips, warmup effects or throttling that the run
+aggregates hide. A chunk of several tokens counts as its share of the
+request's output length. Without ITLs (outside the measurement window or
+with --metrics-mode sketch), the output tokens of a request are spread
+evenly between its first token and its end, and do not count in the ITL
+percentiles.
+
+`benchmark_serving.py` saves the time series next to the result JSON as
+<result>.timeseries.csv. To rebin a saved result and plot it:
+    python benchmarks/time_series.py result.json --bin-seconds 5 \
+        --plot result.timeseries.png
+"""
+import argparse
+import json
+import os
+from collections.abc import Sequence
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+TIME_SERIES_PERCENTILES = (50, 99)
+
+
+def _integrate_intervals(starts: np.ndarray, ends: np.ndarray,
+                         rates: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    The integral over each bin of `edges` of the sum of `rates[i]` over the
+    intervals `[starts[i], ends[i])` that cover each point in time.
+    """
+    if not len(starts):
+        return np.zeros(len(edges) - 1)
+    times = np.concatenate([starts, ends])
+    order = np.argsort(times, kind="stable")
+    times = times[order]
+    level = np.cumsum(np.concatenate([rates, -rates])[order])
+    # The integral is piecewise linear between events.
+    area = np.concatenate([[0.0], np.cumsum(level[:-1] * np.diff(times))])
+    last_event = np.searchsorted(times, edges, side="right") - 1
+    index = np.maximum(last_event, 0)
+    area_at_edges = np.where(
+        last_event >= 0, area[index] + level[index] * (edges - times[index]),
+        0.0)
+    return np.diff(area_at_edges)
+
+
+def _binned_percentiles(times: np.ndarray, values: np.ndarray,
+                        num_bins: int, bin_seconds: float,
+                        percentiles: Sequence[float]) -> np.ndarray:
+    """The `percentiles` of the `values` that fall in each bin, NaN for
+    empty bins, as a (num_bins, len(percentiles)) array."""
+    result = np.full((num_bins, len(percentiles)), np.nan)
+    bins = np.clip((times // bin_seconds).astype(np.int64), 0, num_bins - 1)
+    order = np.argsort(bins, kind="stable")
+    bins, values = bins[order], values[order]
+    boundaries = np.flatnonzero(np.diff(bins)) + 1
+    for group_bins, group in zip(np.split(bins, boundaries),
+                                 np.split(values, boundaries)):
+        if len(group):
+            result[group_bins[0]] = np.percentile(group, percentiles)
+    return result
+
+
+def build_time_series(
+    start_times: Sequence[float],
+    first_token_times: Sequence[Optional[float]],
+    end_times: Sequence[float],
+    successes: Sequence[bool],
+    output_lens: Sequence[int],
+    itls: Optional[Sequence[Optional[Sequence[float]]]] = None,
+    bin_seconds: float = 1.0,
+    percentiles: Sequence[float] = TIME_SERIES_PERCENTILES,
+    window: Optional[tuple[float, float]] = None,
+) -> pd.DataFrame:
+    """
+    Bin per-request timestamps in seconds from the start of the run, see
+    the module docstring. `first_token_times` is None for failed requests
+    and `itls`, if given, None for requests without ITLs. `window` is the
+    `(start, end)` of the measurement window, the whole run by default.
+    """
+    starts = np.asarray(start_times, dtype=np.float64)
+    firsts = np.asarray(first_token_times, dtype=np.float64)
+    ends = np.asarray(end_times, dtype=np.float64)
+    success = np.asarray(successes, dtype=bool)
+    output_lens = np.asarray(output_lens, dtype=np.float64)
+
+    end = ends.max() if len(ends) else 0.0
+    num_bins = max(int(np.ceil(end / bin_seconds)), 1)
+    edges = np.arange(num_bins + 1) * bin_seconds
+    series: dict[str, Any] = {"time_s": edges[:-1]}
+
+    series["in_flight"] = _integrate_intervals(
+        starts, ends, np.ones(len(starts)), edges) / bin_seconds
+    series["started_per_s"] = np.histogram(starts,
+                                           edges)[0] / bin_seconds
+    series["completed_per_s"] = np.histogram(ends[success],
+                                             edges)[0] / bin_seconds
+    series["failed_per_s"] = np.histogram(ends[~success],
+                                          edges)[0] / bin_seconds
+
+    ok = np.flatnonzero(success & (output_lens > 0))
+    has_itls = np.array([itls is not None and itls[i] is not None for i in ok],
+                        dtype=bool)
+    timed, spread = ok[has_itls], ok[~has_itls]
+    # Token arrival times: the first token, then the cumulative ITLs.
+    output_tokens = np.zeros(num_bins)
+    if len(timed):
+        num_chunks = np.array([len(itls[i]) for i in timed]) + 1
+        flat_itls = np.concatenate(
+            [np.asarray(itls[i], dtype=np.float64) for i in timed])
+        owner = np.repeat(np.arange(len(timed)), num_chunks - 1)
+        # Cumulative ITLs restarting at each request.
+        cumulative = np.cumsum(flat_itls)
+        group_start = np.concatenate([[0], np.cumsum(num_chunks - 1)[:-1]])
+        before_group = np.concatenate([[0.0], cumulative])[group_start]
+        offsets = cumulative - np.repeat(before_group, num_chunks - 1)
+        itl_times = firsts[timed][owner] + offsets
+        # Each chunk counts as its share of the output length.
+        chunk_tokens = output_lens[timed] / num_chunks
+        output_tokens += np.histogram(
+            np.concatenate([firsts[timed], itl_times]),
+            edges,
+            weights=np.concatenate([chunk_tokens, chunk_tokens[owner]]))[0]
+    decode = np.maximum(ends[spread] - firsts[spread], 1e-9)
+    output_tokens += np.histogram(firsts[spread], edges)[0]
+    output_tokens += _integrate_intervals(
+        firsts[spread], ends[spread], (output_lens[spread] - 1) / decode,
+        edges)
+    series["output_tokens_per_s"] = output_tokens / bin_seconds
+
+    metrics = [("ttft", firsts[ok], (firsts - starts)[ok]),
+               ("e2el", ends[success], (ends - starts)[success])]
+    if len(timed):
+        metrics.append(("itl", itl_times, flat_itls))
+    for name, times, values in metrics:
+        binned = _binned_percentiles(times, values, num_bins, bin_seconds,
+                                     percentiles)
+        for column, p in enumerate(percentiles):
+            series[f"p{p:g}_{name}_ms"] = binned[:, column] * 1000
+
+    window_start, window_end = window if window is not None else (0.0, end)
+    if window_end >= end:
+        # The window lasts until the end of the run, and of its last bin.
+        window_end = edges[-1]
+    series["measured_fraction"] = (
+        np.clip(window_end, edges[:-1], edges[1:]) -
+        np.clip(window_start, edges[:-1], edges[1:])) / bin_seconds
+    return pd.DataFrame(series)
+
+
+def time_series_from_result(result: dict[str, Any],
+                            bin_seconds: float = 1.0,
+                            percentiles: Sequence[float] = (
+                                TIME_SERIES_PERCENTILES)
+                            ) -> pd.DataFrame:
+    timeline = result["timeline"]
+    itls = None
+    if "itls" in result:
+        # The ITLs of the measured requests, in order.
+        itls = [None] * len(timeline["measured"])
+        measured = np.flatnonzero(timeline["measured"])
+        for index, itl in zip(measured, result["itls"]):
+            itls[index] = itl
+    return build_time_series(timeline["start_times"],
+                             timeline["first_token_times"],
+                             timeline["end_times"],
+                             timeline["successes"],
+                             timeline["output_lens"],
+                             itls=itls,
+                             bin_seconds=bin_seconds,
+                             percentiles=percentiles,
+                             window=(timeline["window_start_s"],
+                                     timeline["window_end_s"]))
+
+
+def time_series_path(result_file: str) -> str:
+    return os.path.splitext(result_file)[0] + ".timeseries.csv"
+
+
+def main(args: argparse.Namespace):
+    with open(args.result_file) as f:
+        result = json.load(f)
+    time_series = time_series_from_result(
+        result, args.bin_seconds,
+        [float(p) for p in args.percentiles.split(",")])
+    output_file = args.output or time_series_path(args.result_file)
+    time_series.to_csv(output_file, index=False)
+    print(f"Saved time series to {output_file}")
+    if args.plot:
+        from utils.plot_utils import plot_time_series
+        plot_time_series(time_series, args.plot)
+        print(f"Saved plot to {args.plot}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bin the requests of a benchmark result into a time "
+        "series of throughput, concurrency and latency.")
+    parser.add_argument("result_file",
+                        type=str,
+                        help="Result JSON of benchmark_serving.py.")
+    parser.add_argument("--bin-seconds", type=float, default=1.0)
+    parser.add_argument("--percentiles",
+                        type=str,
+                        default=",".join(
+                            str(p) for p in TIME_SERIES_PERCENTILES),
+                        help="Comma-separated latency percentiles per bin.")
+    parser.add_argument("--output",
+                        type=str,
+                        default=None,
+                        help="CSV file, <result>.timeseries.csv by default.")
+    parser.add_argument("--plot",
+                        type=str,
+                        default=None,
+                        help="Also plot the time series to this image file.")
+    main(parser.parse_args())
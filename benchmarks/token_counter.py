@@ -0,0 +1,103 @@
+# SPDX-License-Identifier: Apache-2.0
+"""Count the output tokens of backends that do not report usage.
+
+DeepSpeed-MII and TGI do not return the number of generated tokens, so
+`calculate_metrics` tokenizes the generated texts. `count_tokens`
+    - looks each text up in a per-tokenizer cache keyed by the hash of the
+      text, so that the segments of a load profile, the probes of an SLO
+      search or runs generating the same text do not tokenize it again,
+    - counts every distinct text once,
+    - tokenizes the rest in batches of `chunk_size` texts, which fast
+      tokenizers encode in parallel in Rust,
+    - with `num_processes` > 1, spreads the batches over a process pool,
+      for slow (Python) tokenizers and very large runs.
+"""
+import hashlib
+import multiprocessing
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+from transformers import PreTrainedTokenizerBase
+
+DEFAULT_CHUNK_SIZE = 1024
+# Entries per tokenizer after which the cache starts over.
+MAX_CACHE_ENTRIES = 1 << 20
+
+_caches: dict[str, dict[bytes, int]] = {}
+
+# The tokenizer of a pool process, see _init_worker.
+_worker_tokenizer: Optional[PreTrainedTokenizerBase] = None
+
+
+def _text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"),
+                           digest_size=16).digest()
+
+
+def _encode_lengths(tokenizer: PreTrainedTokenizerBase,
+                    texts: list[str]) -> list[int]:
+    encoded = tokenizer(texts,
+                        add_special_tokens=False,
+                        return_attention_mask=False,
+                        return_token_type_ids=False)
+    return [len(ids) for ids in encoded.input_ids]
+
+
+def _init_worker(tokenizer: PreTrainedTokenizerBase) -> None:
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _worker_encode_lengths(texts: list[str]) -> list[int]:
+    return _encode_lengths(_worker_tokenizer, texts)
+
+
+def _chunks(texts: list[str], chunk_size: int) -> Iterator[list[str]]:
+    for start in range(0, len(texts), chunk_size):
+        yield texts[start:start + chunk_size]
+
+
+def count_tokens(tokenizer: PreTrainedTokenizerBase,
+                 texts: list[str],
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 num_processes: int = 1) -> np.ndarray:
+    """The number of tokens of each text, without special tokens."""
+    cache = _caches.setdefault(
+        getattr(tokenizer, "name_or_path", None) or str(id(tokenizer)), {})
+    hashes = [_text_hash(text) for text in texts]
+    counts: dict[bytes, int] = {}
+    missing: dict[bytes, str] = {}
+    for text_hash, text in zip(hashes, texts):
+        if text_hash in cache:
+            counts[text_hash] = cache[text_hash]
+        else:
+            missing[text_hash] = text
+
+    if missing:
+        missing_texts = list(missing.values())
+        chunks = _chunks(missing_texts, chunk_size)
+        if num_processes > 1 and len(missing_texts) > chunk_size:
+            with ProcessPoolExecutor(
+                    max_workers=num_processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(tokenizer, )) as pool:
+                chunk_lengths = list(pool.map(_worker_encode_lengths,
+                                              chunks))
+        else:
+            chunk_lengths = [
+                _encode_lengths(tokenizer, chunk) for chunk in chunks
+            ]
+        new_counts = dict(
+            zip(missing, (length for lengths in chunk_lengths
+                          for length in lengths)))
+        if len(cache) + len(new_counts) > MAX_CACHE_ENTRIES:
+            cache.clear()
+        cache.update(new_counts)
+        counts.update(new_counts)
+
+    return np.fromiter((counts[text_hash] for text_hash in hashes),
+                       dtype=np.int64,
+                       count=len(hashes))
@@ -106,4 +106,51 @@ def plot_mean_ttft(dataframes, output_file):
     
     # Save the plot to a file
     plt.savefig(output_file, bbox_inches='tight', dpi=300)
-    plt.close() 
\ No newline at end of file
+    plt.close() 
+
+def plot_time_series(time_series, output_file):
+    # One panel each for the load, the throughput and the latencies of a
+    # run, from time_series.build_time_series
+    fig, (ax_load, ax_throughput, ax_latency) = plt.subplots(
+        3, 1, figsize=(12, 12), sharex=True)
+    t = time_series['time_s']
+
+    ax_load.plot(t, time_series['in_flight'], label='In-flight requests')
+    ax_load.plot(t, time_series['completed_per_s'], label='Completed (req/s)')
+    if time_series['failed_per_s'].any():
+        ax_load.plot(t, time_series['failed_per_s'], label='Failed (req/s)')
+    ax_load.set_ylabel('Requests')
+    ax_load.set_title('Load')
+
+    ax_throughput.plot(t, time_series['output_tokens_per_s'],
+                       label='Output tokens/s')
+    ax_throughput.set_ylabel('Output Throughput (tok/s)')
+    ax_throughput.set_title('Output Throughput')
+
+    # Latency percentile columns are named like p99_ttft_ms
+    for column in time_series.columns:
+        if column.startswith('p') and column.endswith('_ms'):
+            percentile, metric, _ = column.split('_')
+            ax_latency.plot(t, time_series[column], marker='.',
+                            label=f'{metric.upper()} {percentile.upper()}')
+    ax_latency.set_yscale('log')
+    ax_latency.set_ylabel('Latency (ms)')
+    ax_latency.set_title('Latency per Bin')
+    ax_latency.set_xlabel('Time since start (s)')
+
+    for ax in (ax_load, ax_throughput, ax_latency):
+        # Shade the warmup and cooldown, outside the measurement window
+        if 'measured_fraction' in time_series:
+            ax.fill_between(t, 0, 1,
+                            where=time_series['measured_fraction'] < 1,
+                            step='post', color='grey', alpha=0.2,
+                            transform=ax.get_xaxis_transform(),
+                            label='Not measured')
+        ax.set_ylim(bottom=0 if ax is not ax_latency else None)
+        ax.grid(True, which='both', linestyle='--', alpha=0.7)
+        ax.legend(bbox_to_anchor=(1.02, 1), loc='upper left')
+    plt.tight_layout()
+
+    # Save the plot to a file
+    plt.savefig(output_file, bbox_inches='tight', dpi=300)
+    plt.close(fig)